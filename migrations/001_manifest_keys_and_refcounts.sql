@@ -0,0 +1,97 @@
+-- Upgrades a database created by the first release, where a file was only a
+-- "file" row plus "chunkperfile" rows naming its chunks' hashes, to the current schema:
+--   * chunk: a row per stored chunk object, with its reference count
+--   * chunkperfile: (file_id, index) primary key, binary hashes, cascade delete
+--   * file: size, directory tree (uuid parent_id, path), versions, created_at,
+--     inline content
+--   * uploadsession: resumable uploads
+--
+-- Chunk sizes were never recorded; chunks get a size of 0 here, and the sizes
+-- of chunks and files are read from S3 afterwards by app.migrations.backfill_chunk_sizes
+-- in the writer (see README). Stop the writer and reader first. The script
+-- runs in one transaction, so a failure, or running it a second time, leaves
+-- the database unchanged.
+--
+--   docker-compose exec -T db sh -c 'psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" "$POSTGRES_DB"' \
+--       < migrations/001_manifest_keys_and_refcounts.sql
+
+BEGIN;
+
+-- file --------------------------------------------------------------------
+
+-- parent_id was an unused integer (-1); every existing entry is in the root directory.
+ALTER TABLE file ALTER COLUMN parent_id DROP NOT NULL;
+ALTER TABLE file ALTER COLUMN parent_id DROP DEFAULT;
+ALTER TABLE file ALTER COLUMN parent_id TYPE uuid USING NULL;
+ALTER TABLE file ADD CONSTRAINT file_parent_id_fkey FOREIGN KEY (parent_id) REFERENCES file (id);
+
+ALTER TABLE file ADD COLUMN size integer NOT NULL DEFAULT 0;
+ALTER TABLE file ADD COLUMN path varchar NOT NULL DEFAULT '/';
+ALTER TABLE file ADD COLUMN origin_id uuid;
+ALTER TABLE file ADD COLUMN version integer NOT NULL DEFAULT 1;
+ALTER TABLE file ADD COLUMN content bytea;
+ALTER TABLE file ADD COLUMN created_at timestamp with time zone NOT NULL DEFAULT now();
+-- The application sets these itself, like on a freshly created table.
+ALTER TABLE file ALTER COLUMN size DROP DEFAULT;
+ALTER TABLE file ALTER COLUMN path DROP DEFAULT;
+ALTER TABLE file ALTER COLUMN version DROP DEFAULT;
+ALTER TABLE file ALTER COLUMN created_at DROP DEFAULT;
+
+-- Versions of a file share the id of their first version.
+UPDATE file SET origin_id = id;
+
+ALTER TABLE file ADD CONSTRAINT uq_file_origin_id_version UNIQUE (origin_id, version);
+CREATE INDEX ix_file_origin_id ON file (origin_id);
+CREATE INDEX ix_file_parent_id_name ON file (parent_id, name);
+CREATE INDEX ix_file_path ON file (path text_pattern_ops);
+
+-- chunkperfile ------------------------------------------------------------
+
+-- Rows of deleted files were kept with a NULL file_id; they reference nothing.
+DELETE FROM chunkperfile WHERE file_id IS NULL;
+-- A retried upload could leave two rows for the same index; keep one.
+DELETE FROM chunkperfile a
+    USING chunkperfile b
+    WHERE a.file_id = b.file_id AND a.index = b.index AND a.ctid > b.ctid;
+
+ALTER TABLE chunkperfile DROP CONSTRAINT chunkperfile_pkey;
+ALTER TABLE chunkperfile DROP COLUMN id;
+ALTER TABLE chunkperfile DROP CONSTRAINT chunkperfile_file_id_fkey;
+ALTER TABLE chunkperfile ALTER COLUMN file_id SET NOT NULL;
+ALTER TABLE chunkperfile ADD PRIMARY KEY (file_id, index);
+ALTER TABLE chunkperfile ADD CONSTRAINT chunkperfile_file_id_fkey
+    FOREIGN KEY (file_id) REFERENCES file (id) ON DELETE CASCADE;
+ALTER TABLE chunkperfile ALTER COLUMN chunk_hash TYPE bytea USING decode(chunk_hash, 'hex');
+
+-- chunk -------------------------------------------------------------------
+
+-- Writer and reader create missing tables on startup, so it may exist already, empty.
+CREATE TABLE IF NOT EXISTS chunk (
+    hash bytea NOT NULL,
+    size integer NOT NULL,
+    pack_key varchar,
+    pack_offset integer,
+    codec varchar,
+    stored_size integer,
+    refcount integer NOT NULL,
+    touched_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (hash)
+);
+CREATE INDEX IF NOT EXISTS ix_chunk_refcount ON chunk (refcount);
+
+-- Every chunk was stored on its own, uncompressed, under its hash as the key.
+INSERT INTO chunk (hash, size, refcount, touched_at)
+    SELECT chunk_hash, 0, count(*), now() FROM chunkperfile GROUP BY chunk_hash
+    ON CONFLICT (hash) DO NOTHING;
+
+-- uploadsession -----------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS uploadsession (
+    file_id uuid NOT NULL,
+    chunk_count integer NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (file_id),
+    FOREIGN KEY (file_id) REFERENCES file (id) ON DELETE CASCADE
+);
+
+COMMIT;
@@ -1,15 +1,17 @@
 from typing import Annotated
 from fastapi import Depends, Request
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.services.ports import Database, S3
+from app.services.cache import CachedFileStreamer, ChunkCache
 from app.services.cas import FileStorageService
 from app.services.db import FileRepository
+from app.services.manifests import ManifestCache
 from app.services.s3 import FileStreamer
 from app.core.db import get_db_session
 
 
-SessionDependency = Annotated[Session, Depends(get_db_session)]
+SessionDependency = Annotated[AsyncSession, Depends(get_db_session)]
 
 
 def get_repository(session: SessionDependency) -> Database:
@@ -18,15 +20,38 @@ def get_repository(session: SessionDependency) -> Database:
 
 def get_streamer(request: Request) -> S3:
     client_manager = request.app.state.s3_manager
-    return FileStreamer(manager=client_manager)
+    streamer = FileStreamer(manager=client_manager)
+    cache = getattr(request.app.state, "chunk_cache", None)
+    if cache is not None:
+        return CachedFileStreamer(streamer=streamer, cache=cache)
+    return streamer
 
 
 RepositoryDependency = Annotated[Database, Depends(get_repository)]
 StreamerDependency = Annotated[S3, Depends(get_streamer)]
 
 
-def get_storage(db: RepositoryDependency, s3: StreamerDependency) -> FileStorageService:
-    return FileStorageService(db=db, s3=s3)
+def get_manifest_cache(request: Request) -> ManifestCache | None:
+    return getattr(request.app.state, "manifest_cache", None)
+
+
+ManifestCacheDependency = Annotated[ManifestCache | None, Depends(get_manifest_cache)]
+
+
+def get_chunk_cache(request: Request) -> ChunkCache | None:
+    return getattr(request.app.state, "chunk_cache", None)
+
+
+ChunkCacheDependency = Annotated[ChunkCache | None, Depends(get_chunk_cache)]
+
+
+def get_storage(
+    db: RepositoryDependency,
+    s3: StreamerDependency,
+    manifests: ManifestCacheDependency,
+    cache: ChunkCacheDependency,
+) -> FileStorageService:
+    return FileStorageService(db=db, s3=s3, manifests=manifests, cache=cache)
 
 
 CASDependency = Annotated[FileStorageService, Depends(get_storage)]
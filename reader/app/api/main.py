@@ -1,29 +1,212 @@
+import secrets
 import uuid
+from functools import partial
+from typing import Annotated
 from fastapi import (
     APIRouter,
     HTTPException,
+    Query,
     status,
     Request,
 )
-from fastapi.responses import StreamingResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 
 from app.api.deps import CASDependency
+from app.api.ranges import (
+    RangeNotSatisfiable,
+    content_range,
+    etag_matches,
+    iter_multipart,
+    multipart_length,
+    parse_range,
+)
+from app.core.config import settings
+from app.schemas.models import (
+    ArchiveFormat,
+    ArchiveRequest,
+    ChunkBase,
+    DirectoryListing,
+    DirectoryUsage,
+    FileBase,
+    FileVersion,
+    PresignedDownload,
+    PresignedPart,
+)
+from app.services.archives import get_archive
+from app.services.cas import ArchiveEntry, FileStorageService
 
 
 api_router = APIRouter(tags=["reader"])
 
 
-@api_router.get("/download/{file_id}", name="download_file")
-async def download(*, request: Request, file_id: uuid.UUID, fs: CASDependency):
-    media_type = "application/octet-stream"
-    file = fs.get_file_object(file_id)
-    filename = file.name
+@api_router.get("/files", name="list_directory")
+async def list_directory(
+    *,
+    fs: CASDependency,
+    parent_id: uuid.UUID | None = None,
+    cursor: uuid.UUID | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> DirectoryListing:
+    """List directory ``parent_id``, or the root directory, one page at a time."""
+    try:
+        return await fs.list_directory(parent_id, cursor=cursor, limit=limit)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except (NotADirectoryError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@api_router.get("/directories/{directory_id}/usage", name="get_directory_usage")
+async def get_directory_usage(*, directory_id: uuid.UUID, fs: CASDependency) -> DirectoryUsage:
+    try:
+        return await fs.get_directory_usage(directory_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def archive_response(
+    fs: FileStorageService, entries: list[ArchiveEntry], name: str, format: ArchiveFormat
+) -> StreamingResponse:
+    archive = get_archive(format, [entry.member for entry in entries])
+    headers = {
+        "Content-Disposition": f"attachment; filename={name}.{archive.extension}",
+        "Content-Length": str(archive.length()),
+    }
+    return StreamingResponse(
+        fs.stream_archive(archive, entries), media_type=archive.media_type, headers=headers
+    )
+
+
+@api_router.post("/archive", name="download_archive")
+async def download_archive(*, request: ArchiveRequest, fs: CASDependency) -> StreamingResponse:
+    """Download many files as one uncompressed zip or tar archive, built as it is sent."""
+    if not 0 < len(request.file_ids) <= settings.ARCHIVE_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"An archive holds 1 to {settings.ARCHIVE_MAX_FILES} files",
+        )
+    try:
+        entries = await fs.get_files_archive(request.file_ids)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except (IsADirectoryError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return archive_response(fs, entries, "files", request.format)
+
+
+@api_router.get("/directories/{directory_id}/archive", name="download_directory")
+async def download_directory(
+    *, directory_id: uuid.UUID, fs: CASDependency, format: ArchiveFormat = "zip"
+) -> StreamingResponse:
+    """Download a directory's whole subtree as one uncompressed zip or tar archive."""
+    try:
+        name, entries = await fs.get_directory_archive(directory_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return archive_response(fs, entries, name, format)
+
+
+@api_router.get("/files/{file_id}/versions", name="list_file_versions")
+async def list_versions(*, file_id: uuid.UUID, fs: CASDependency) -> list[FileVersion]:
+    try:
+        return await fs.get_versions(file_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+async def get_ready_file(
+    fs: FileStorageService, file_id: uuid.UUID, version: int | None
+) -> tuple[uuid.UUID, FileBase]:
+    """Resolve ``version`` of a file, if given, and check it can be downloaded."""
+    try:
+        if version is not None:
+            file_id = await fs.get_version_id(file_id, version)
+        file = await fs.get_file_object(file_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
     if not file.is_ready:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File is not ready for downloading"
         )
+    return file_id, file
+
+
+async def get_file_manifest(fs: FileStorageService, file_id: uuid.UUID) -> list[ChunkBase]:
+    try:
+        return await fs.get_manifest(file_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@api_router.get("/download/{file_id}/presigned", name="presign_download")
+async def presign_download(
+    *,
+    request: Request,
+    file_id: uuid.UUID,
+    fs: CASDependency,
+    version: int | None = None,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 1000,
+) -> PresignedDownload:
+    """
+    Presigned URLs to download a file straight from S3, one per chunk, for
+    clients that fetch and reassemble the parts themselves.
+
+    Parts come ``limit`` at a time from part ``offset`` on, so a large file
+    is signed a page per request rather than all at once.
+    A file stored inline has no object of its own; its single part is a
+    regular download URL.
+    """
+    if not settings.PRESIGNED_URLS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Presigned downloads are disabled"
+        )
+    file_id, file = await get_ready_file(fs, file_id, version)
+
+    if file.content is not None:
+        url = str(request.url_for("download_file", file_id=str(file_id)))
+        parts = [PresignedPart(url=url, size=len(file.content))][offset : offset + limit]
+        size, count = len(file.content), 1
+        etag = fs.get_content_etag(file.content)
+    else:
+        manifest = await get_file_manifest(fs, file_id)
+        parts = await fs.presign_manifest(manifest[offset : offset + limit])
+        size, count = sum(c.size for c in manifest), len(manifest)
+        etag = fs.get_etag(manifest)
+    return PresignedDownload(
+        file_id=file_id,
+        name=file.name,
+        size=size,
+        etag=etag,
+        expires_in=settings.PRESIGNED_URL_TTL_S,
+        parts=parts,
+        next_offset=offset + limit if offset + limit < count else None,
+    )
+
+
+@api_router.get("/download/{file_id}", name="download_file")
+async def download(
+    *, request: Request, file_id: uuid.UUID, fs: CASDependency, version: int | None = None
+):
+    """
+    Download a file; ``version`` selects another version of the same file.
+
+    With ``PRESIGNED_URLS`` a file stored as a single plain object is
+    redirected to a presigned S3 URL instead of being streamed. With
+    ``ACCEL_REDIRECT_PREFIX``, nginx sends files kept in one piece in the
+    local chunk cache straight from disk, ranges included. A full download
+    of a file of several chunks keeps it whole for the next one.
+    """
+    media_type = "application/octet-stream"
+    file_id, file = await get_ready_file(fs, file_id, version)
+    filename = file.name
+    content_disposition = f"attachment; filename={filename}"
 
     accept = (request.headers.get("accept") or "").lower()
     if "application/octet-stream" not in accept and "*/*" not in accept:
@@ -34,13 +217,96 @@ async def download(*, request: Request, file_id: uuid.UUID, fs: CASDependency):
             "download_url": download_url,
         }
 
+    if file.content is not None:
+        content = file.content
+        size = len(content)
+        etag = fs.get_content_etag(content)
+        read_range = partial(fs.stream_content, content)
+    else:
+        manifest = await get_file_manifest(fs, file_id)
+        size = sum(c.size for c in manifest)
+        etag = fs.get_etag(manifest)
+        read_range = partial(fs.stream_range, manifest)
+        # S3 serves ranges itself but has its own ETags, so conditional
+        # requests are still answered here.
+        if (
+            settings.PRESIGNED_URLS
+            and len(manifest) == 1
+            and manifest[0].pack_key is None
+            and manifest[0].codec is None
+            and "if-none-match" not in request.headers
+            and "if-range" not in request.headers
+        ):
+            [part] = await fs.presign_manifest(
+                manifest, content_disposition=content_disposition, content_type=media_type
+            )
+            return RedirectResponse(
+                part.url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={"ETag": etag}
+            )
     headers = {
-        "Content-Disposition": f"attachment; filename={filename}",
-        "Accept-Ranges": "none",
+        "Content-Disposition": content_disposition,
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
     }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # nginx answers ranges and If-Range itself, against the ETag passed on here.
+    if file.content is None and (location := fs.get_accel_redirect(manifest, etag)):
+        return Response(
+            media_type=media_type,
+            headers={**headers, "X-Accel-Redirect": location},
+        )
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    ranges = None
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            ranges = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        stream = read_range(0, size - 1)
+        if file.content is None:
+            stream = fs.cache_file(manifest, etag, stream)
+        return StreamingResponse(
+            stream,
+            media_type=media_type,
+            headers=headers,
+            status_code=status.HTTP_200_OK,
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = content_range(start, end, size)
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            read_range(start, end),
+            media_type=media_type,
+            headers=headers,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+        )
+
+    boundary = secrets.token_hex(16)
+    headers["Content-Length"] = str(multipart_length(ranges, size, boundary, media_type))
     return StreamingResponse(
-        fs.stream_file(file_id=file_id),
-        media_type=media_type,
+        iter_multipart(
+            read_range,
+            ranges,
+            size,
+            boundary,
+            media_type,
+        ),
+        media_type=f"multipart/byteranges; boundary={boundary}",
         headers=headers,
-        status_code=status.HTTP_200_OK,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
     )
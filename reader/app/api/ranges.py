@@ -0,0 +1,106 @@
+"""HTTP range request helpers (RFC 9110, sections 13 and 14)."""
+
+from typing import AsyncIterator, Callable
+
+
+# More ranges than this are answered with the full representation.
+MAX_RANGES = 32
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    Parse a ``Range`` header into inclusive ``(start, end)`` byte pairs.
+
+    Returns None when the header must be ignored (other unit, bad syntax, too
+    many ranges) and raises RangeNotSatisfiable when no range overlaps the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                ranges.append((max(size - suffix, 0), size - 1))
+                continue
+
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+
+        if end < start and last:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(f"No satisfiable range in {header!r}")
+    return ranges
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an ``If-None-Match`` header against an ETag."""
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end}/{size}"
+
+
+def _part_header(boundary: str, media_type: str, start: int, end: int, size: int) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {media_type}\r\n"
+        f"Content-Range: {content_range(start, end, size)}\r\n\r\n"
+    ).encode()
+
+
+def _closing(boundary: str) -> bytes:
+    return f"--{boundary}--\r\n".encode()
+
+
+def multipart_length(
+    ranges: list[tuple[int, int]], size: int, boundary: str, media_type: str
+) -> int:
+    """Exact byte length of a ``multipart/byteranges`` body, for Content-Length."""
+    length = len(_closing(boundary))
+    for start, end in ranges:
+        length += len(_part_header(boundary, media_type, start, end, size))
+        length += end - start + 1 + len(b"\r\n")
+    return length
+
+
+async def iter_multipart(
+    stream_range: Callable[[int, int], AsyncIterator[bytes]],
+    ranges: list[tuple[int, int]],
+    size: int,
+    boundary: str,
+    media_type: str,
+) -> AsyncIterator[bytes]:
+    """Yield a ``multipart/byteranges`` body, reading each range from storage."""
+    for start, end in ranges:
+        yield _part_header(boundary, media_type, start, end, size)
+        async for chunk in stream_range(start, end):
+            yield chunk
+        yield b"\r\n"
+    yield _closing(boundary)
@@ -51,17 +51,21 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100  # prepared statements per connection, 0 disables
 
     @computed_field
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
         return MultiHostUrl.build(
-            scheme="postgresql+psycopg2",
+            scheme="postgresql+asyncpg",
             username=self.POSTGRES_USER,
             password=self.POSTGRES_PASSWORD,
             host=self.POSTGRES_SERVER,
             port=self.POSTGRES_PORT,
             path=self.POSTGRES_DB,
+            query=f"prepared_statement_cache_size={self.POSTGRES_STATEMENT_CACHE_SIZE}",
         )  # type: ignore
 
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
@@ -88,6 +92,16 @@ class Settings(BaseSettings):
 
     CHUNK_SIZE: int = 1024 * 1024  # 1MB
     READ_CHUNK: int = 256 * 1024
+    READ_AHEAD_CHUNKS: int = 4  # chunks fetched ahead of the one being streamed, 0 disables
+    READ_AHEAD_MAX_BYTES: int = 8 * 1024 * 1024  # per-download cap on prefetched data
+    CHUNK_CACHE_DIR: str | None = None  # local chunk cache directory, unset disables it
+    CHUNK_CACHE_MAX_BYTES: int = 16 * 1024 * 1024 * 1024  # 16GB
+    ACCEL_REDIRECT_PREFIX: str | None = None  # nginx location serving cached chunks, unset disables
+    ACCEL_FILE_MAX_BYTES: int = 1024 * 1024 * 1024  # larger files of several chunks aren't kept whole
+    MANIFEST_CACHE_MAX_CHUNKS: int = 1_000_000  # chunk entries in process; inline content by size
+    MANIFEST_CACHE_TTL_S: int = 300  # bounds how long renamed or deleted files are served stale
+    MANIFEST_CACHE_REDIS: bool = False  # share cached manifests between readers via REDIS_URI
+    ARCHIVE_MAX_FILES: int = 10_000  # files per archive request, directory archives are unbounded
 
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
@@ -96,6 +110,10 @@ class Settings(BaseSettings):
     AWS_SIGNATURE_VERSION: str = "s3v4"
     AWS_SERVICE_NAME: str = "s3"
     AWS_BUCKET_NAME: str = "yop-cloud-bucket"
+    AWS_PUBLIC_ENDPOINT_URL: str | None = None  # S3 endpoint as clients reach it, for presigning
+
+    PRESIGNED_URLS: bool = False  # let clients download chunk objects from S3 directly
+    PRESIGNED_URL_TTL_S: int = 3600
 
 
 settings = Settings()  # type: ignore
@@ -3,9 +3,13 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
+from redis.asyncio import Redis
 
 from app.core.config import settings
+from app.core.db import init_db
 from app.api.main import api_router
+from app.services.cache import ChunkCache
+from app.services.manifests import ManifestCache
 from app.services.s3 import S3ClientManager
 
 
@@ -23,12 +27,27 @@ if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await init_db()
     s3_manager = S3ClientManager()
     await s3_manager.start()
     app.state.s3_manager = s3_manager
+    app.state.chunk_cache = None
+    if settings.CHUNK_CACHE_DIR:
+        app.state.chunk_cache = ChunkCache(
+            settings.CHUNK_CACHE_DIR, settings.CHUNK_CACHE_MAX_BYTES
+        )
+        await app.state.chunk_cache.load()
+    redis = Redis.from_url(settings.REDIS_URI) if settings.MANIFEST_CACHE_REDIS else None
+    app.state.manifest_cache = None
+    if settings.MANIFEST_CACHE_MAX_CHUNKS or redis is not None:
+        app.state.manifest_cache = ManifestCache(
+            settings.MANIFEST_CACHE_MAX_CHUNKS, settings.MANIFEST_CACHE_TTL_S, redis=redis
+        )
     try:
         yield
     finally:
+        if redis is not None:
+            await redis.aclose()
         await s3_manager.close()
 
 
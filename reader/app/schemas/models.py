@@ -1,6 +1,9 @@
+from datetime import datetime
 from enum import StrEnum
+from typing import Literal
 import uuid
 
+from pydantic import ConfigDict
 from sqlmodel import SQLModel
 
 
@@ -14,12 +17,109 @@ class FileCreate(SQLModel):
 
 
 class FileBase(FileCreate):
-    parent_id: int = -1
+    # ``content`` goes through JSON in the shared manifest cache.
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
+    # Directory the entry is in; ``None`` is the root directory.
+    parent_id: uuid.UUID | None = None
     file_type: FileType = FileType.FILE
     is_ready: bool = False
+    size: int = 0
+    # Versions of a file share the id of their first version as ``origin_id``.
+    origin_id: uuid.UUID | None = None
+    version: int = 1
+    # Small files are stored inline here rather than as chunks.
+    content: bytes | None = None
+
+
+class FileVersion(SQLModel):
+    id: uuid.UUID
+    name: str
+    version: int
+    size: int
+    is_ready: bool
+    created_at: datetime
+
+
+class FileEntry(SQLModel):
+    id: uuid.UUID
+    name: str
+    file_type: FileType
+    parent_id: uuid.UUID | None
+    size: int
+    version: int
+    created_at: datetime
+
+
+class DirectoryListing(SQLModel):
+    entries: list[FileEntry]
+    # Pass as ``cursor`` to get the next page; ``None`` on the last page.
+    next_cursor: uuid.UUID | None = None
+
+
+class DirectoryUsage(SQLModel):
+    """Totals over a directory's whole subtree, counting current file versions."""
+
+    size: int
+    files: int
+    directories: int
+
+
+ArchiveFormat = Literal["zip", "tar"]
+
+
+class ArchiveRequest(SQLModel):
+    file_ids: list[uuid.UUID]
+    format: ArchiveFormat = "zip"
 
 
 class ChunkPerFileBase(SQLModel):
     file_id: uuid.UUID
     chunk_hash: str
     index: int
+
+
+class ChunkBase(SQLModel):
+    hash: str
+    size: int
+    # Set when the chunk is stored inside a pack object rather than on its own.
+    pack_key: str | None = None
+    pack_offset: int | None = None
+    # Set when the stored bytes are compressed; ``size`` is always the plaintext size.
+    codec: str | None = None
+    stored_size: int | None = None
+
+
+class PresignedPart(SQLModel):
+    """A consecutive part of a file, to be fetched with a GET of ``url``."""
+
+    url: str
+    # Bytes of the file in this part, after decompression.
+    size: int
+    # Send as the ``Range`` header when set.
+    range: str | None = None
+    # Compression codec of the response body when set, see ``ChunkBase.codec``.
+    codec: str | None = None
+
+
+class PresignedDownload(SQLModel):
+    """
+    A file as presigned URLs: its content is the parts' content in order,
+    over all pages. The URLs expire after ``expires_in`` seconds.
+    """
+
+    file_id: uuid.UUID
+    name: str
+    size: int
+    etag: str
+    expires_in: int
+    parts: list[PresignedPart]
+    # Pass as ``offset`` to get the next page of parts; ``None`` on the last page.
+    next_offset: int | None = None
+
+
+class FileManifest(SQLModel):
+    """A ready file's metadata together with its chunks in file order."""
+
+    file: FileBase
+    chunks: list[ChunkBase]
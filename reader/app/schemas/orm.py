@@ -1,19 +1,73 @@
 import uuid
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, Index, LargeBinary, TypeDecorator, UniqueConstraint
 from sqlmodel import Field, Relationship
 
-from app.schemas.models import FileBase, ChunkPerFileBase
+from app.schemas.models import FileBase, ChunkPerFileBase, ChunkBase
+
+
+class HashDigest(TypeDecorator):
+    """A SHA-256 digest stored as 32 raw bytes and handled as its hex string."""
+
+    impl = LargeBinary(32)
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect) -> bytes | None:
+        return None if value is None else bytes.fromhex(value)
+
+    def process_result_value(self, value: bytes | None, dialect) -> str | None:
+        return None if value is None else value.hex()
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
 
 
 class File(FileBase, table=True):
+    __table_args__ = (
+        Index("ix_file_parent_id_name", "parent_id", "name"),
+        Index("ix_file_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+        # Concurrent uploads of a new version race for the same number.
+        UniqueConstraint("origin_id", "version", name="uq_file_origin_id_version"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    parent_id: uuid.UUID | None = Field(default=None, foreign_key="file.id")
+    # Materialized path: ids of the enclosing directories, e.g. "/<id>/<id>/";
+    # a subtree is a prefix range of the index instead of a recursive query.
+    path: str = "/"
+    origin_id: uuid.UUID | None = Field(default=None, index=True)
+    created_at: datetime = Field(default_factory=utcnow, sa_type=DateTime(timezone=True))
     chunks: list["ChunkPerFile"] = Relationship(
         back_populates="file", cascade_delete=False
     )
 
+    @property
+    def subtree_path(self) -> str:
+        """``path`` of the entries inside this directory."""
+        return f"{self.path}{self.id}/"
+
 
 class ChunkPerFile(ChunkPerFileBase, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    file_id: uuid.UUID = Field(
-        foreign_key="file.id", nullable=True, ondelete="SET NULL"
-    )
+    """
+    One entry of a file's chunk manifest.
+
+    The (file_id, index) primary key is the clustered order manifests are
+    read in, so loading a manifest is a single index range scan.
+    """
+
+    file_id: uuid.UUID = Field(foreign_key="file.id", primary_key=True, ondelete="CASCADE")
+    index: int = Field(primary_key=True)
+    chunk_hash: str = Field(sa_type=HashDigest)
     file: File = Relationship(back_populates="chunks")
+
+
+class Chunk(ChunkBase, table=True):
+    """Unique chunk objects known to be stored in S3, keyed by content hash."""
+
+    hash: str = Field(primary_key=True, sa_type=HashDigest)
+    # Number of ChunkPerFile rows pointing at the chunk.
+    refcount: int = Field(default=0, index=True)
+    # Last time the chunk was referenced, released or picked for deduplication;
+    # unreferenced chunks are garbage collected a grace period after it.
+    touched_at: datetime = Field(default_factory=utcnow, sa_type=DateTime(timezone=True))
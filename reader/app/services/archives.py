@@ -0,0 +1,239 @@
+"""
+Streaming tar and zip archives of stored files.
+
+Archives are written on the fly without temporary files. Members are stored
+uncompressed and their sizes are known up front, so the exact archive length,
+and with it ``Content-Length``, is computed before the first byte is sent.
+"""
+
+import struct
+import tarfile
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Callable, NamedTuple, Protocol
+
+
+class ArchiveMember(NamedTuple):
+    # Path inside the archive, "/"-separated.
+    name: str
+    size: int
+    mtime: datetime
+    is_dir: bool = False
+
+
+ReadMember = Callable[[ArchiveMember], AsyncIterator[bytes | memoryview]]
+
+
+class Archive(Protocol):
+    media_type: str
+    extension: str
+
+    def length(self) -> int: ...
+
+    def stream(self, read: ReadMember) -> AsyncIterator[bytes | memoryview]:
+        """Yield the archive; ``read`` yields exactly ``member.size`` bytes of a member."""
+        ...
+
+
+class TarArchive:
+    """POSIX (pax) tar: a header block per member and data padded to 512 bytes."""
+
+    media_type = "application/x-tar"
+    extension = "tar"
+    BLOCK_SIZE = tarfile.BLOCKSIZE
+
+    def __init__(self, members: list[ArchiveMember]):
+        self.members = members
+
+    @staticmethod
+    def _header(member: ArchiveMember) -> bytes:
+        info = tarfile.TarInfo(member.name)
+        info.mtime = int(member.mtime.timestamp())
+        if member.is_dir:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+        else:
+            info.size = member.size
+            info.mode = 0o644
+        # Long or non-ASCII names get an extra pax header, so the length varies.
+        return info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="strict")
+
+    def _padding(self, size: int) -> int:
+        return -size % self.BLOCK_SIZE
+
+    def length(self) -> int:
+        return sum(
+            len(self._header(m)) + m.size + self._padding(m.size) for m in self.members
+        ) + 2 * self.BLOCK_SIZE
+
+    async def stream(self, read: ReadMember) -> AsyncIterator[bytes | memoryview]:
+        for member in self.members:
+            yield self._header(member)
+            if member.is_dir:
+                continue
+            async for part in read(member):
+                yield part
+            if padding := self._padding(member.size):
+                yield bytes(padding)
+        yield bytes(2 * self.BLOCK_SIZE)
+
+
+# Stands in for sizes and offsets that are in zip64 records instead.
+ZIP_MAX32 = 0xFFFFFFFF
+# Sizes and offsets from this value on need zip64 records.
+ZIP64_LIMIT = ZIP_MAX32
+# Sizes and CRC follow the data in a data descriptor; names are UTF-8.
+ZIP_FLAGS = 0x0008 | 0x0800
+
+
+class ZipArchive:
+    """
+    Zip with stored (uncompressed) members, switching to zip64 records where needed.
+
+    The CRC-32 of a member is only known once it has been sent, so it goes
+    into a data descriptor after the member's data and the central directory.
+    """
+
+    media_type = "application/zip"
+    extension = "zip"
+
+    def __init__(self, members: list[ArchiveMember]):
+        self.members = members
+
+    @staticmethod
+    def _dos_datetime(mtime: datetime) -> tuple[int, int]:
+        if mtime.year < 1980:
+            return 0, (1 << 5) | 1
+        time = (mtime.hour << 11) | (mtime.minute << 5) | (mtime.second // 2)
+        date = ((mtime.year - 1980) << 9) | (mtime.month << 5) | mtime.day
+        return time, date
+
+    @staticmethod
+    def _is_zip64(member: ArchiveMember, offset: int) -> bool:
+        return member.size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+
+    def _local_header(self, member: ArchiveMember, zip64: bool) -> bytes:
+        name = member.name.encode() + (b"/" if member.is_dir else b"")
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if zip64 else b""
+        sizes = ZIP_MAX32 if zip64 else 0
+        time, date = self._dos_datetime(member.mtime)
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            45 if zip64 else 20,
+            ZIP_FLAGS,
+            0,
+            time,
+            date,
+            0,
+            sizes,
+            sizes,
+            len(name),
+            len(extra),
+        ) + name + extra
+
+    @staticmethod
+    def _data_descriptor(member: ArchiveMember, crc: int, zip64: bool) -> bytes:
+        if zip64:
+            return struct.pack("<IIQQ", 0x08074B50, crc, member.size, member.size)
+        return struct.pack("<IIII", 0x08074B50, crc, member.size, member.size)
+
+    def _central_header(self, member: ArchiveMember, crc: int, offset: int, zip64: bool) -> bytes:
+        name = member.name.encode() + (b"/" if member.is_dir else b"")
+        if zip64:
+            extra = struct.pack("<HHQQQ", 1, 24, member.size, member.size, offset)
+            size, offset = ZIP_MAX32, ZIP_MAX32
+        else:
+            extra, size = b"", member.size
+        version = 45 if zip64 else 20
+        mode = (0o40755 << 16) | 0x10 if member.is_dir else 0o100644 << 16
+        time, date = self._dos_datetime(member.mtime)
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            (3 << 8) | version,  # made by: Unix
+            version,
+            ZIP_FLAGS,
+            0,
+            time,
+            date,
+            crc,
+            size,
+            size,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            mode,
+            offset,
+        ) + name + extra
+
+    @staticmethod
+    def _end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+        records = b""
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            zip64_end_offset = cd_offset + cd_size
+            records += struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset
+            )
+            records += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+            count = min(count, 0xFFFF)
+            cd_offset, cd_size = ZIP_MAX32, ZIP_MAX32
+        return records + struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0
+        )
+
+    def length(self) -> int:
+        offset = 0
+        cd_size = 0
+        for member in self.members:
+            zip64 = self._is_zip64(member, offset)
+            cd_size += len(self._central_header(member, 0, offset, zip64))
+            offset += len(self._local_header(member, zip64)) + member.size
+            offset += len(self._data_descriptor(member, 0, zip64))
+        return offset + cd_size + len(self._end_records(len(self.members), offset, cd_size))
+
+    async def stream(self, read: ReadMember) -> AsyncIterator[bytes | memoryview]:
+        offset = 0
+        central = []
+        for member in self.members:
+            zip64 = self._is_zip64(member, offset)
+            header = self._local_header(member, zip64)
+            yield header
+            crc = 0
+            if not member.is_dir:
+                async for part in read(member):
+                    crc = zlib.crc32(part, crc)
+                    yield part
+            descriptor = self._data_descriptor(member, crc, zip64)
+            yield descriptor
+            central.append(self._central_header(member, crc, offset, zip64))
+            offset += len(header) + member.size + len(descriptor)
+
+        cd_size = sum(len(header) for header in central)
+        yield b"".join(central)
+        yield self._end_records(len(self.members), offset, cd_size)
+
+
+def get_archive(format: str, members: list[ArchiveMember]) -> Archive:
+    if format == "tar":
+        return TarArchive(members)
+    return ZipArchive(members)
+
+
+class StreamSplitter:
+    """Reads consecutive runs of bytes, e.g. files, from one concatenated stream."""
+
+    def __init__(self, stream: AsyncIterator[bytes | memoryview]):
+        self._stream = stream
+        self._pending = memoryview(b"")
+
+    async def take(self, size: int) -> AsyncIterator[memoryview]:
+        while size:
+            if not self._pending:
+                self._pending = memoryview(await anext(self._stream))
+            part = self._pending[:size]
+            self._pending = self._pending[len(part) :]
+            size -= len(part)
+            yield part
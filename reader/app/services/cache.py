@@ -0,0 +1,206 @@
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from logging import getLogger
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator
+
+from app.core.config import settings
+from app.services.ports import S3
+
+
+log = getLogger(__name__)
+
+
+class ChunkCache:
+    """
+    Content-addressed on-disk cache of chunk objects, keyed by chunk hash.
+    Whole files of several chunks are kept alongside, keyed by their ETag,
+    so that nginx can send them as one file (see ``tee``).
+
+    Entries are immutable by key, so they never need invalidation; the
+    cache only has to stay within ``max_bytes``, evicting least recently used
+    entries. Fills are atomic (write to a temp file, then rename), so readers
+    never observe a partial chunk. Reads run in a worker thread, so waiting for
+    the disk never blocks the event loop. A read returns one ``bytes``
+    object: downloads buffer whole segments for read-ahead, and parts would
+    only be copied again when they are joined.
+
+    The LRU order lives in memory and is rebuilt from file access times by
+    ``load()`` on startup.
+    """
+
+    TMP_DIR = "tmp"
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+
+    @staticmethod
+    def relative_path(key: str) -> str:
+        return f"{key[:2]}/{key}"
+
+    def path(self, key: str) -> Path:
+        return self.directory / self.relative_path(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    async def load(self) -> None:
+        await asyncio.to_thread(self._load)
+        log.info(f"Chunk cache loaded: entries={len(self._entries)}, size={self.size}")
+
+    def _load(self) -> None:
+        tmp = self.directory / self.TMP_DIR
+        tmp.mkdir(parents=True, exist_ok=True)
+        for leftover in tmp.iterdir():
+            leftover.unlink(missing_ok=True)
+
+        found = []
+        for shard in self.directory.iterdir():
+            if not shard.is_dir() or shard.name == self.TMP_DIR:
+                continue
+            for entry in shard.iterdir():
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.size += size
+        self._evict(0)
+
+    def touch(self, key: str) -> bool:
+        """Mark a chunk as recently used; returns False if it is not cached."""
+        if key not in self._entries:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    async def put(self, key: str, data: bytes) -> None:
+        if key in self._entries or len(data) > self.max_bytes:
+            return
+        await asyncio.to_thread(self._write, key, data)
+        self._add(key, len(data))
+
+    async def tee(
+        self, key: str, size: int, stream: AsyncIterator[bytes | memoryview]
+    ) -> AsyncGenerator[bytes | memoryview, None]:
+        """
+        Pass ``stream`` through unchanged while writing it to the cache as
+        ``key``. The entry is only added once all ``size`` bytes went through;
+        a stream that fails or is closed early leaves nothing behind.
+        """
+        if key in self._entries or size > self.max_bytes:
+            async for part in stream:
+                yield part
+            return
+
+        tmp = self._tmp_path(key)
+        f = await asyncio.to_thread(open, tmp, "wb")
+        written = 0
+        try:
+            async for part in stream:
+                await asyncio.to_thread(f.write, part)
+                written += len(part)
+                yield part
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(f.close)
+        if written != size:
+            tmp.unlink(missing_ok=True)
+            return
+        await asyncio.to_thread(self._commit, tmp, key)
+        self._add(key, size)
+
+    def _tmp_path(self, key: str) -> Path:
+        return self.directory / self.TMP_DIR / f"{key}.{uuid.uuid4().hex}"
+
+    def _write(self, key: str, data: bytes) -> None:
+        tmp = self._tmp_path(key)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        self._commit(tmp, key)
+
+    def _commit(self, tmp: Path, key: str) -> None:
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, target)
+
+    def _add(self, key: str, size: int) -> None:
+        if key in self._entries:
+            return
+        self._evict(size)
+        self._entries[key] = size
+        self.size += size
+
+    def _evict(self, incoming: int) -> None:
+        while self._entries and self.size + incoming > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.path(key).unlink(missing_ok=True)
+
+    async def read(
+        self, key: str, start: int | None = None, end: int | None = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Yield bytes ``start..end`` (inclusive) of a cached chunk, read in one piece."""
+        yield await asyncio.to_thread(self._read, key, start or 0, end)
+
+    def _read(self, key: str, start: int, end: int | None) -> bytes:
+        with open(self.path(key), "rb") as f:
+            f.seek(start)
+            return f.read(-1 if end is None else end - start + 1)
+
+
+class CachedFileStreamer:
+    """
+    S3 adapter serving chunks from a local ChunkCache before going to S3.
+
+    Whole-chunk reads that miss are streamed from S3 and stored in the cache
+    afterwards; ranged reads that miss are passed through, so a partial read
+    still only fetches the bytes requested.
+    """
+
+    def __init__(self, streamer: S3, cache: ChunkCache):
+        self.streamer = streamer
+        self.cache = cache
+
+    async def upload_chunk(self, chunk: bytes, key: str) -> None:
+        await self.streamer.upload_chunk(chunk=chunk, key=key)
+
+    async def presign_chunk(
+        self,
+        key: str,
+        expires_in: int,
+        content_disposition: str | None = None,
+        content_type: str | None = None,
+    ) -> str:
+        return await self.streamer.presign_chunk(
+            key, expires_in, content_disposition=content_disposition, content_type=content_type
+        )
+
+    async def get_chunk_stream(
+        self, *, key: str, start: int | None = None, end: int | None = None
+    ) -> AsyncGenerator[bytes | memoryview, None]:
+        if self.cache.touch(key):
+            try:
+                async for chunk in self.cache.read(key, start=start, end=end):
+                    yield chunk
+                return
+            except FileNotFoundError:
+                log.warning(f"Cached chunk vanished, reading from S3: key={key}")
+
+        if start is not None or end is not None:
+            async for chunk in self.streamer.get_chunk_stream(key=key, start=start, end=end):
+                yield chunk
+            return
+
+        parts = []
+        async for chunk in self.streamer.get_chunk_stream(key=key):
+            parts.append(chunk)
+            yield chunk
+        await self.cache.put(key, b"".join(parts))
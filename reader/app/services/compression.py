@@ -0,0 +1,17 @@
+from typing import Protocol
+
+import lz4.frame
+import zstandard
+
+
+class Decompressor(Protocol):
+    def decompress(self, data: bytes) -> bytes: ...
+
+
+def get_decompressor(codec: str) -> Decompressor:
+    """Incremental decompressor for chunks stored with ``codec``."""
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == "lz4":
+        return lz4.frame.LZ4FrameDecompressor()
+    raise ValueError(f"Unknown chunk codec: {codec}")
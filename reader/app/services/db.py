@@ -1,55 +1,188 @@
 import logging
 from typing import Sequence
 import uuid
-from sqlmodel import Session, select, col
+from sqlalchemy import case, func
+from sqlalchemy.orm import aliased, defer
+from sqlmodel import and_, col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.schemas.models import FileCreate, ChunkPerFileBase
-from app.schemas.orm import File, ChunkPerFile
+from app.schemas.models import FileCreate, FileType, ChunkPerFileBase, ChunkBase
+from app.schemas.orm import File, ChunkPerFile, Chunk
 
 
 log = logging.getLogger(__name__)
 
+# Keeps ``IN (...)`` lists well below the drivers' bind parameter limits.
+MAX_IN_IDS = 1000
+
+# Inline content is only loaded where it is served; listings and lookups skip it.
+WITHOUT_CONTENT = defer(col(File.content))
+
+
+def _is_current_version():
+    """Entries that no newer, ready version of the same file supersedes."""
+    newer = aliased(File)
+    return ~(
+        select(newer.id)
+        .where(
+            col(newer.origin_id) == col(File.origin_id),
+            col(newer.version) > col(File.version),
+            col(newer.is_ready),
+        )
+        .exists()
+    )
+
 
 class FileRepository:
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    def save_file(self, file_create: FileCreate) -> File:
+    async def save_file(self, file_create: FileCreate) -> File:
         file_obj = File.model_validate(file_create)
+        file_obj.origin_id = file_obj.origin_id or file_obj.id
+        if file_obj.parent_id is not None:
+            parent = await self.session.get(File, file_obj.parent_id)
+            file_obj.path = parent.subtree_path
         self.session.add(file_obj)
-        self.session.commit()
-        self.session.refresh(file_obj)
+        await self.session.commit()
+        await self.session.refresh(file_obj)
         return file_obj
 
-    def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None:
+    async def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None:
         chunk_create = ChunkPerFileBase(
             file_id=file_id, chunk_hash=chunk_hash, index=index
         )
         chunk_obj = ChunkPerFile.model_validate(chunk_create)
         self.session.add(chunk_obj)
-        self.session.commit()
+        await self.session.commit()
 
-    def get_file_by_id(self, file_id: uuid.UUID) -> File | None:
+    async def get_file_by_id(
+        self, file_id: uuid.UUID, with_content: bool = False
+    ) -> File | None:
         statement = select(File).where(File.id == file_id)
-        file_obj = self.session.exec(statement).first()
+        if not with_content:
+            statement = statement.options(WITHOUT_CONTENT)
+        file_obj = (await self.session.exec(statement)).first()
         return file_obj
 
-    def get_filename_by_id(self, file_id: uuid.UUID) -> str:
+    async def get_file_versions(self, origin_id: uuid.UUID) -> Sequence[File]:
+        statement = (
+            select(File)
+            .options(WITHOUT_CONTENT)
+            # Files stored before versioning have no ``origin_id``.
+            .where(or_(col(File.origin_id) == origin_id, col(File.id) == origin_id))
+            .order_by(col(File.version).asc())
+        )
+        return (await self.session.exec(statement)).all()
+
+    async def list_directory(
+        self, parent_id: uuid.UUID | None, after: File | None, limit: int
+    ) -> Sequence[File]:
+        """
+        Return a page of a directory's entries ordered by (name, id), starting after ``after``.
+
+        Keyset pagination over the (parent_id, name) index: every page costs
+        the same, however deep into a large directory it is.
+        """
+        statement = select(File).options(WITHOUT_CONTENT).where(
+            col(File.parent_id).is_(None) if parent_id is None else File.parent_id == parent_id,
+            col(File.is_ready),
+            _is_current_version(),
+        )
+        if after is not None:
+            statement = statement.where(
+                or_(
+                    col(File.name) > after.name,
+                    and_(col(File.name) == after.name, col(File.id) > after.id),
+                )
+            )
+        statement = statement.order_by(col(File.name).asc(), col(File.id).asc()).limit(limit)
+        return (await self.session.exec(statement)).all()
+
+    async def get_subtree_usage(self, path: str) -> tuple[int, int, int]:
+        """Return (size, files, directories) of the entries whose path starts with ``path``."""
+        is_file = col(File.file_type) == FileType.FILE
+        statement = select(
+            func.coalesce(func.sum(case((is_file, File.size), else_=0)), 0),
+            func.coalesce(func.sum(case((is_file, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_file, 0), else_=1)), 0),
+        ).where(
+            col(File.path).startswith(path),
+            col(File.is_ready),
+            _is_current_version(),
+        )
+        size, files, directories = (await self.session.exec(statement)).one()
+        return size, files, directories
+
+    async def get_files_by_ids(self, file_ids: Sequence[uuid.UUID]) -> Sequence[File]:
+        statement = select(File).options(WITHOUT_CONTENT).where(col(File.id).in_(file_ids))
+        return (await self.session.exec(statement)).all()
+
+    async def get_file_contents(self, file_ids: Sequence[uuid.UUID]) -> dict[uuid.UUID, bytes]:
+        """Return the inline content of those of the files that have one."""
+        contents: dict[uuid.UUID, bytes] = {}
+        for start in range(0, len(file_ids), MAX_IN_IDS):
+            statement = select(File.id, File.content).where(
+                col(File.id).in_(file_ids[start : start + MAX_IN_IDS]),
+                col(File.content).is_not(None),
+            )
+            for file_id, content in (await self.session.exec(statement)).all():
+                contents[file_id] = content
+        return contents
+
+    async def get_subtree(self, path: str) -> Sequence[File]:
+        """Return the current, ready entries whose path starts with ``path``, parents first."""
+        statement = (
+            select(File)
+            .options(WITHOUT_CONTENT)
+            .where(col(File.path).startswith(path), col(File.is_ready), _is_current_version())
+            .order_by(col(File.path).asc(), col(File.name).asc(), col(File.id).asc())
+        )
+        return (await self.session.exec(statement)).all()
+
+    async def get_filename_by_id(self, file_id: uuid.UUID) -> str:
         statement = select(File.name).where(File.id == file_id)
-        filename = self.session.exec(statement).one()
+        filename = (await self.session.exec(statement)).one()
         return filename
 
-    def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]:
+    async def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]:
         statement = (
             select(ChunkPerFile)
             .where(ChunkPerFile.file_id == file_id)
             .order_by(col(ChunkPerFile.index).asc())
         )
-        chunks = self.session.exec(statement).all()
+        chunks = (await self.session.exec(statement)).all()
         return chunks
 
-    def set_file_failed(self, file_id: uuid.UUID) -> None:
-        file_obj = self.session.get(File, file_id)
+    async def get_file_manifest(self, file_id: uuid.UUID) -> list[ChunkBase]:
+        """Return the file's chunks (hash, size, location), in file order."""
+        statement = (
+            select(Chunk)
+            .join(ChunkPerFile, col(ChunkPerFile.chunk_hash) == col(Chunk.hash))
+            .where(ChunkPerFile.file_id == file_id)
+            .order_by(col(ChunkPerFile.index).asc())
+        )
+        chunks = (await self.session.exec(statement)).all()
+        return [ChunkBase.model_validate(chunk) for chunk in chunks]
+
+    async def get_file_manifests(
+        self, file_ids: Sequence[uuid.UUID]
+    ) -> dict[uuid.UUID, list[ChunkBase]]:
+        """Return the chunks of many files, in file order; one query per ``MAX_IN_IDS`` files."""
+        manifests: dict[uuid.UUID, list[ChunkBase]] = {file_id: [] for file_id in file_ids}
+        for start in range(0, len(file_ids), MAX_IN_IDS):
+            statement = (
+                select(ChunkPerFile.file_id, Chunk)
+                .join(ChunkPerFile, col(ChunkPerFile.chunk_hash) == col(Chunk.hash))
+                .where(col(ChunkPerFile.file_id).in_(file_ids[start : start + MAX_IN_IDS]))
+                .order_by(col(ChunkPerFile.file_id), col(ChunkPerFile.index).asc())
+            )
+            for file_id, chunk in (await self.session.exec(statement)).all():
+                manifests[file_id].append(ChunkBase.model_validate(chunk))
+        return manifests
+
+    async def set_file_failed(self, file_id: uuid.UUID) -> None:
+        file_obj = await self.session.get(File, file_id)
         if not file_obj:
             log.info(f"PgSQL file not found: file_id={file_id}")
             return
@@ -57,17 +190,19 @@ class FileRepository:
         if hasattr(file_obj, "is_ready"):
             file_obj.is_ready = False
         self.session.add(file_obj)
-        self.session.commit()
+        await self.session.commit()
         log.info(f"PgSQL set file failed: file_id='{file_id}'")
 
-    def set_file_completed(self, file_id: uuid.UUID) -> None:
-        file_obj = self.session.get(File, file_id)
+    async def set_file_completed(self, file_id: uuid.UUID, size: int | None = None) -> None:
+        file_obj = await self.session.get(File, file_id)
         if not file_obj:
             log.info(f"PgSQL file not found: file_id={file_id}")
             return
         
         if hasattr(file_obj, "is_ready"):
             file_obj.is_ready = True
+        if size is not None:
+            file_obj.size = size
         self.session.add(file_obj)
-        self.session.commit()
+        await self.session.commit()
         log.info(f"PgSQL set file completed: file_id='{file_id}'")
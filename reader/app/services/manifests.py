@@ -0,0 +1,100 @@
+import time
+import uuid
+from collections import OrderedDict
+from logging import getLogger
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.schemas.models import FileManifest
+
+
+log = getLogger(__name__)
+
+
+class ManifestCache:
+    """
+    Cache of ready files' manifests (metadata plus chunk list), keyed by file id.
+
+    A ready file's chunks never change, as a new upload is a new file version,
+    so hot files are served without database queries. Entries are kept in
+    process, least recently used first out once ``max_chunks`` chunks are
+    held in total, and optionally shared between readers through Redis.
+    Inline content is weighed by its size, so small files are bounded in
+    memory like chunk lists are.
+
+    Names and directories can still change and files can be deleted; each
+    tier serves such changes stale for at most ``ttl_s`` seconds, well within
+    the GC grace period, so chunks of a deleted file are still in storage.
+    Redis errors are logged and treated as misses.
+    """
+
+    KEY_PREFIX = "manifest:"
+    # Rough memory taken by a chunk entry; inline content counts as its size in entries.
+    ENTRY_BYTES = 256
+
+    def __init__(self, max_chunks: int, ttl_s: int, redis: Redis | None = None):
+        self.max_chunks = max_chunks
+        self.ttl = ttl_s
+        self.redis = redis
+        self.size = 0
+        self._entries: OrderedDict[uuid.UUID, tuple[float, FileManifest]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, file_id: uuid.UUID) -> FileManifest | None:
+        entry = self._entries.get(file_id)
+        if entry is not None:
+            expires_at, manifest = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(file_id)
+                return manifest
+            self._remove(file_id)
+
+        if self.redis is None:
+            return None
+        try:
+            data = await self.redis.get(self.KEY_PREFIX + str(file_id))
+        except RedisError:
+            log.warning(f"Manifest cache read failed: file_id={file_id}", exc_info=True)
+            return None
+        if data is None:
+            return None
+        manifest = FileManifest.model_validate_json(data)
+        self._store(file_id, manifest)
+        return manifest
+
+    async def put(self, file_id: uuid.UUID, manifest: FileManifest) -> None:
+        if not manifest.file.is_ready:
+            return
+        self._store(file_id, manifest)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.KEY_PREFIX + str(file_id), manifest.model_dump_json(), ex=self.ttl
+            )
+        except RedisError:
+            log.warning(f"Manifest cache write failed: file_id={file_id}", exc_info=True)
+
+    def _store(self, file_id: uuid.UUID, manifest: FileManifest) -> None:
+        weight = self._weight(manifest)
+        if weight > self.max_chunks:
+            return
+        self._remove(file_id)
+        while self._entries and self.size + weight > self.max_chunks:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= self._weight(evicted)
+        self._entries[file_id] = (time.monotonic() + self.ttl, manifest)
+        self.size += weight
+
+    def _remove(self, file_id: uuid.UUID) -> None:
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.size -= self._weight(entry[1])
+
+    @classmethod
+    def _weight(cls, manifest: FileManifest) -> int:
+        content = manifest.file.content
+        return len(manifest.chunks) + 1 + (len(content) // cls.ENTRY_BYTES if content else 0)
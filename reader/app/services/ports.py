@@ -1,25 +1,51 @@
 import uuid
 from typing import AsyncGenerator, Protocol, Sequence
 
-from app.schemas.models import FileCreate
+from app.schemas.models import FileCreate, ChunkBase
 from app.schemas.orm import File, ChunkPerFile
 
 
 class Database(Protocol):
-    def save_file(self, file_create: FileCreate) -> File: ...
-    def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None: ...
-    def get_file_by_id(self, file_id: uuid.UUID) -> File | None: ...
-    def get_filename_by_id(self, file_id: uuid.UUID) -> str: ...
-    def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]: ...
-    def set_file_failed(self, file_id: uuid.UUID) -> None: ...
-    def set_file_completed(self, file_id: uuid.UUID) -> None: ...
+    async def save_file(self, file_create: FileCreate) -> File: ...
+    async def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None: ...
+    async def get_file_by_id(
+        self, file_id: uuid.UUID, with_content: bool = False
+    ) -> File | None: ...
+    async def get_file_versions(self, origin_id: uuid.UUID) -> Sequence[File]: ...
+    async def list_directory(
+        self, parent_id: uuid.UUID | None, after: File | None, limit: int
+    ) -> Sequence[File]: ...
+    async def get_subtree_usage(self, path: str) -> tuple[int, int, int]: ...
+    async def get_files_by_ids(self, file_ids: Sequence[uuid.UUID]) -> Sequence[File]: ...
+    async def get_file_contents(self, file_ids: Sequence[uuid.UUID]) -> dict[uuid.UUID, bytes]: ...
+    async def get_subtree(self, path: str) -> Sequence[File]: ...
+    async def get_filename_by_id(self, file_id: uuid.UUID) -> str: ...
+    async def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]: ...
+    async def get_file_manifest(self, file_id: uuid.UUID) -> list[ChunkBase]: ...
+    async def get_file_manifests(
+        self, file_ids: Sequence[uuid.UUID]
+    ) -> dict[uuid.UUID, list[ChunkBase]]: ...
+    async def set_file_failed(self, file_id: uuid.UUID) -> None: ...
+    async def set_file_completed(self, file_id: uuid.UUID, size: int | None = None) -> None: ...
 
 
 class S3(Protocol):
     async def upload_chunk(self, chunk: bytes, key: str) -> None: ...
-    def get_chunk_stream(self, *, key: str) -> AsyncGenerator[bytes, None]: ...
+    def get_chunk_stream(
+        self, *, key: str, start: int | None = None, end: int | None = None
+    ) -> AsyncGenerator[bytes, None]: ...
+    async def presign_chunk(
+        self,
+        key: str,
+        expires_in: int,
+        content_disposition: str | None = None,
+        content_type: str | None = None,
+    ) -> str: ...
 
 
 class S3Like(Protocol):
     async def put_object(self, *, Bucket: str, Key: str, Body: bytes) -> dict: ...
-    async def get_object(self, *, Bucket: str, Key: str) -> dict: ...
+    async def get_object(self, *, Bucket: str, Key: str, Range: str = ...) -> dict: ...
+    async def generate_presigned_url(
+        self, ClientMethod: str, Params: dict = ..., ExpiresIn: int = ...
+    ) -> str: ...
@@ -29,26 +29,38 @@ class S3ClientManager:
         )
         self._stack: AsyncExitStack | None = None
         self.client: S3Like | None = None
+        self.presign_client: S3Like | None = None
+
+    def _create_client(self, endpoint_url: str):
+        return self.session.create_client(
+            service_name=settings.AWS_SERVICE_NAME,
+            endpoint_url=endpoint_url,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_REGION_NAME,
+            config=self._config
+        )
 
     async def start(self) -> None:
         if self.client is not None:
             return
         self._stack = AsyncExitStack()
         self.client = await self._stack.enter_async_context(
-            self.session.create_client(
-                service_name=settings.AWS_SERVICE_NAME,
-                endpoint_url=settings.AWS_ENDPOINT_URL,
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION_NAME,
-                config=self._config
-            )
+            self._create_client(settings.AWS_ENDPOINT_URL)
         )
+        # Signatures cover the host, so URLs for clients are signed for the
+        # endpoint they reach S3 at.
+        self.presign_client = self.client
+        if settings.AWS_PUBLIC_ENDPOINT_URL:
+            self.presign_client = await self._stack.enter_async_context(
+                self._create_client(settings.AWS_PUBLIC_ENDPOINT_URL)
+            )
 
     async def close(self) -> None:
         if self._stack is not None:
             await self._stack.aclose()
         self.client = None
+        self.presign_client = None
         self._stack = None
 
     def get_client(self) -> S3Like:
@@ -56,6 +68,11 @@ class S3ClientManager:
             raise RuntimeError("S3ClientManager is not started. Call await start()")
         return self.client
 
+    def get_presign_client(self) -> S3Like:
+        if self.presign_client is None:
+            raise RuntimeError("S3ClientManager is not started. Call await start()")
+        return self.presign_client
+
 
 class FileStreamer:
     def __init__(
@@ -86,6 +103,30 @@ class FileStreamer:
                 await asyncio.sleep(delay)
                 delay *= 2
     
+    async def presign_chunk(
+        self,
+        key: str,
+        expires_in: int,
+        content_disposition: str | None = None,
+        content_type: str | None = None,
+    ) -> str:
+        """
+        Return a URL to GET the object ``key`` without credentials for
+        ``expires_in`` seconds; it accepts a ``Range`` header like the object does.
+
+        ``content_disposition`` and ``content_type`` replace the headers S3
+        answers with, e.g. when a client is redirected to the URL.
+        """
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_disposition is not None:
+            params["ResponseContentDisposition"] = content_disposition
+        if content_type is not None:
+            params["ResponseContentType"] = content_type
+        client = self._manager.get_presign_client()
+        return await client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expires_in
+        )
+
     async def _maybe_close_io(self, body):
         try:
             close = getattr(body, "close", None)
@@ -97,13 +138,27 @@ class FileStreamer:
         except Exception:
             pass
 
-    async def get_chunk_stream(self, *, key: str, attempts: int = 3) -> AsyncGenerator[bytes, None]:
+    async def get_chunk_stream(
+            self,
+            *,
+            key: str,
+            start: int | None = None,
+            end: int | None = None,
+            attempts: int = 3,
+        ) -> AsyncGenerator[bytes, None]:
+        """
+        Stream a chunk object, or only bytes ``start..end`` (inclusive) of it
+        through a ranged GET when a bound is given.
+        """
         client = self._manager.get_client()
         delay = 0.1
+        extra = {}
+        if start is not None or end is not None:
+            extra["Range"] = f"bytes={start or 0}-{'' if end is None else end}"
 
         for attempt in range(1, attempts + 1):
             try:
-                response = await client.get_object(Bucket=self.bucket, Key=key)
+                response = await client.get_object(Bucket=self.bucket, Key=key, **extra)
                 body = response["Body"]
 
                 try:
@@ -0,0 +1,106 @@
+import io
+import tarfile
+import uuid
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.schemas.models import FileBase
+from app.services.db import FileRepository
+from app.tests.conftest import CHUNKS, CONTENT, H1, H2, H3, add, add_chunks, mkdir
+
+
+async def add_chunked(repo: FileRepository, name: str, hashes: list[str], parent=None):
+    file = await add(repo, name, parent)
+    await add_chunks(repo, file.id, hashes)
+    return file
+
+
+@pytest.fixture
+async def tree(repo: FileRepository):
+    top = await mkdir(repo, "top")
+    sub = await mkdir(repo, "sub", top)
+    await add_chunked(repo, "a.bin", [H1, H2, H3], top)
+    await add_chunked(repo, "b.bin", [H2], sub)
+    await add_chunked(repo, "b.bin", [H3], sub)
+    content = b"inline"
+    await add(repo, "c.txt", sub, size=len(content), content=content)
+    await add(repo, "outside", size=1)
+    return top
+
+
+def read_zip(data: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        return {info.filename: archive.read(info) for info in archive.infolist()}
+
+
+def read_tar(data: bytes) -> dict[str, bytes]:
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        return {
+            m.name + ("/" if m.isdir() else ""): archive.extractfile(m).read() if m.isfile() else b""
+            for m in archive.getmembers()
+        }
+
+
+EXPECTED = {
+    "top/": b"",
+    "top/a.bin": CONTENT,
+    "top/sub/": b"",
+    "top/sub/c.txt": b"inline",
+}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("format, read", [("zip", read_zip), ("tar", read_tar)])
+async def test_directory_archive(client: TestClient, s3, tree, format, read):
+    response = client.get(f"/api/v1/directories/{tree.id}/archive", params={"format": format})
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(response.content))
+    assert response.headers["content-disposition"] == f"attachment; filename=top.{format}"
+    members = read(response.content)
+    # Entries of the same name are told apart, in no particular order.
+    b1, b2 = members.pop("top/sub/b.bin"), members.pop("top/sub/b (2).bin")
+    assert {b1, b2} == {CHUNKS[H2], CHUNKS[H3]}
+    assert members == EXPECTED
+
+
+@pytest.mark.anyio
+async def test_files_archive(client: TestClient, s3, repo: FileRepository):
+    a = await add_chunked(repo, "a.bin", [H1, H2])
+    b = await add_chunked(repo, "../b.bin", [H3])
+    c = await repo.save_file(FileBase(name="c", content=b"c", size=1, is_ready=True))
+
+    response = client.post(
+        "/api/v1/archive", json={"file_ids": [str(b.id), str(a.id), str(c.id)], "format": "zip"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(response.content))
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == [".._b.bin", "a.bin", "c"]
+        assert archive.read("a.bin") == CHUNKS[H1] + CHUNKS[H2]
+        assert archive.read(".._b.bin") == CHUNKS[H3]
+    # Chunks of all members are read as one stream, in archive order.
+    assert [key for key, _, _ in s3.reads] == [H3, H1, H2]
+
+
+@pytest.mark.anyio
+async def test_archive_errors(client: TestClient, s3, repo: FileRepository):
+    directory = await mkdir(repo, "dir")
+    file = await add(repo, "f")
+    pending = await repo.save_file(FileBase(name="pending"))
+
+    def post(*ids):
+        return client.post("/api/v1/archive", json={"file_ids": [str(i) for i in ids]})
+
+    assert post().status_code == 400
+    assert post(uuid.uuid4()).status_code == 404
+    assert post(directory.id).status_code == 400
+    assert post(pending.id).status_code == 400
+    assert client.get(f"/api/v1/directories/{file.id}/archive").status_code == 400
+    assert client.get(f"/api/v1/directories/{uuid.uuid4()}/archive").status_code == 404
+    response = client.get(f"/api/v1/directories/{directory.id}/archive", params={"format": "7z"})
+    assert response.status_code == 422
@@ -0,0 +1,235 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_chunk_cache
+from app.core.config import settings
+from app.main import app
+from app.schemas.models import ChunkBase, FileBase, FileCreate
+from app.services.cache import ChunkCache
+from app.services.db import FileRepository
+from app.tests.conftest import CHUNKS, CONTENT, H1, H2, H3, FakeS3, add_chunks
+
+
+@pytest.fixture
+async def file_id(repo: FileRepository):
+    file = await repo.save_file(FileCreate(name="file.bin"))
+    await add_chunks(repo, file.id, [H1, H2, H3])
+    await repo.set_file_completed(file.id, size=len(CONTENT))
+    return file.id
+
+
+def download(client: TestClient, file_id, **headers):
+    return client.get(
+        f"/api/v1/download/{file_id}", headers={"Accept": "*/*", **headers}
+    )
+
+
+@pytest.mark.anyio
+async def test_full_download(client: TestClient, s3: FakeS3, file_id):
+    response = download(client, file_id)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert [start for _, start, _ in s3.reads] == [None, None, None]
+
+
+@pytest.mark.anyio
+async def test_single_range_reads_only_overlapping_chunks(
+    client: TestClient, s3: FakeS3, file_id
+):
+    response = download(client, file_id, Range="bytes=8-12")
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[8:13]
+    assert response.headers["content-range"] == f"bytes 8-12/{len(CONTENT)}"
+    assert s3.reads == [(H1, 8, 9), (H2, 0, 2)]
+
+
+@pytest.mark.anyio
+async def test_multi_range(client: TestClient, s3: FakeS3, file_id):
+    response = download(client, file_id, Range="bytes=0-1,-3")
+
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert len(response.content) == int(response.headers["content-length"])
+    assert b"\r\n\r\n01\r\n" in response.content
+    assert b"\r\n\r\nMNO\r\n" in response.content
+
+
+@pytest.mark.anyio
+async def test_unsatisfiable_range(client: TestClient, s3: FakeS3, file_id):
+    response = download(client, file_id, Range="bytes=100-")
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.anyio
+async def test_conditional_requests(client: TestClient, s3: FakeS3, file_id):
+    etag = download(client, file_id).headers["etag"]
+
+    assert download(client, file_id, **{"If-None-Match": etag}).status_code == 304
+
+    stale = download(client, file_id, Range="bytes=0-1", **{"If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+
+@pytest.mark.anyio
+async def test_versions(client: TestClient, s3: FakeS3, repo: FileRepository, file_id):
+    second = await repo.save_file(FileBase(name="file.bin", origin_id=file_id, version=2))
+    await add_chunks(repo, second.id, [H3])
+    await repo.set_file_completed(second.id, size=len(CHUNKS[H3]))
+
+    response = client.get(f"/api/v1/files/{second.id}/versions")
+    assert response.status_code == 200
+    assert [(v["id"], v["version"]) for v in response.json()] == [
+        (str(file_id), 1),
+        (str(second.id), 2),
+    ]
+
+    assert download(client, second.id).content == CHUNKS[H3]
+    response = client.get(
+        f"/api/v1/download/{second.id}", params={"version": 1}, headers={"Accept": "*/*"}
+    )
+    assert response.content == CONTENT
+    response = client.get(f"/api/v1/download/{file_id}", params={"version": 3})
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_inline_file_download(client: TestClient, s3: FakeS3, repo: FileRepository):
+    content = b"small config"
+    file = await repo.save_file(
+        FileBase(name="app.conf", content=content, size=len(content), is_ready=True)
+    )
+
+    response = download(client, file.id)
+    assert response.status_code == 200
+    assert response.content == content
+    assert s3.reads == []
+
+    response = download(client, file.id, Range="bytes=6-", **{"If-Range": response.headers["etag"]})
+    assert response.status_code == 206
+    assert response.content == b"config"
+
+
+@pytest.mark.anyio
+async def test_presigned_download(
+    client: TestClient, s3: FakeS3, repo: FileRepository, file_id, monkeypatch
+):
+    url = f"/api/v1/download/{file_id}/presigned"
+    assert client.get(url).status_code == 404
+
+    monkeypatch.setattr(settings, "PRESIGNED_URLS", True)
+    packed = ChunkBase(
+        hash="f" * 64, size=100, pack_key="pack", pack_offset=40, codec="zstd", stored_size=30
+    )
+    await add_chunks(repo, file_id, [packed], first_index=3)
+    response = client.get(url)
+
+    assert response.status_code == 200
+    download = response.json()
+    ttl = settings.PRESIGNED_URL_TTL_S
+    assert download["size"] == len(CONTENT) + 100
+    assert download["expires_in"] == ttl
+    assert download["parts"][0] == {
+        "url": f"https://s3.test/{H1}?expires={ttl}", "size": 10, "range": None, "codec": None
+    }
+    assert download["parts"][3] == {
+        "url": f"https://s3.test/pack?expires={ttl}",
+        "size": 100,
+        "range": "bytes=40-69",
+        "codec": "zstd",
+    }
+    assert download["next_offset"] is None
+    assert s3.reads == []
+
+    page = client.get(url, params={"offset": 1, "limit": 2}).json()
+    assert [part["url"] for part in page["parts"]] == [
+        f"https://s3.test/{H2}?expires={ttl}",
+        f"https://s3.test/{H3}?expires={ttl}",
+    ]
+    assert (page["size"], page["next_offset"]) == (len(CONTENT) + 100, 3)
+    assert client.get(url, params={"limit": 1001}).status_code == 422
+
+
+@pytest.mark.anyio
+async def test_single_object_download_redirects(
+    client: TestClient, s3: FakeS3, repo: FileRepository, file_id, monkeypatch
+):
+    monkeypatch.setattr(settings, "PRESIGNED_URLS", True)
+    single = await repo.save_file(FileCreate(name="single.bin"))
+    await add_chunks(repo, single.id, [H2])
+    await repo.set_file_completed(single.id, size=len(CHUNKS[H2]))
+
+    response = client.get(
+        f"/api/v1/download/{single.id}", headers={"Accept": "*/*"}, follow_redirects=False
+    )
+    assert response.status_code == 307
+    ttl = settings.PRESIGNED_URL_TTL_S
+    assert response.headers["location"] == (
+        f"https://s3.test/{H2}?expires={ttl}"
+        "&disposition=attachment;%20filename=single.bin&type=application/octet-stream"
+    )
+    etag = response.headers["etag"]
+    assert download(client, single.id, **{"If-None-Match": etag}).status_code == 304
+
+    # Files of several chunks are still streamed.
+    assert download(client, file_id).content == CONTENT
+
+
+@pytest.mark.anyio
+async def test_cached_downloads_are_offloaded_to_nginx(
+    client: TestClient, s3: FakeS3, repo: FileRepository, file_id, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_PREFIX", "/_accel/")
+    cache = ChunkCache(tmp_path, max_bytes=1024)
+    await cache.load()
+    app.dependency_overrides[get_chunk_cache] = lambda: cache
+    single = await repo.save_file(FileCreate(name="single.bin"))
+    await add_chunks(repo, single.id, [H2])
+    await repo.set_file_completed(single.id, size=len(CHUNKS[H2]))
+
+    # The chunk is not cached yet.
+    assert "x-accel-redirect" not in download(client, single.id).headers
+
+    for h in (H1, H2, H3):
+        await cache.put(h, CHUNKS[h])
+    s3.reads.clear()
+    response = download(client, single.id)
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-disposition"] == "attachment; filename=single.bin"
+    assert response.headers["x-accel-redirect"] == f"/_accel/chunks/{H2[:2]}/{H2}"
+    assert s3.reads == []
+    # nginx serves ranges too, matching If-Range against the ETag passed on.
+    ranged = download(client, single.id, Range="bytes=0-1")
+    assert ranged.headers["x-accel-redirect"] == response.headers["x-accel-redirect"]
+    assert ranged.headers["etag"] == response.headers["etag"]
+
+    # A file of several chunks is streamed once and kept whole for the next downloads.
+    response = download(client, file_id)
+    assert "x-accel-redirect" not in response.headers
+    assert (response.content, response.headers["content-length"]) == (CONTENT, str(len(CONTENT)))
+    key = response.headers["etag"].strip('"')
+    assert cache.path(key).read_bytes() == CONTENT
+
+    response = download(client, file_id, Range="bytes=5-")
+    assert response.headers["x-accel-redirect"] == f"/_accel/chunks/{key[:2]}/{key}"
+    assert response.content == b""
+
+
+@pytest.mark.anyio
+async def test_file_without_chunks_is_not_found(
+    client: TestClient, s3: FakeS3, repo: FileRepository, monkeypatch
+):
+    monkeypatch.setattr(settings, "PRESIGNED_URLS", True)
+    file = await repo.save_file(FileCreate(name="lost.bin"))
+    await repo.set_file_completed(file.id, size=10)
+
+    assert download(client, file.id).status_code == 404
+    assert client.get(f"/api/v1/download/{file.id}/presigned").status_code == 404
@@ -0,0 +1,68 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.schemas.models import FileBase
+from app.services.db import FileRepository
+from app.tests.conftest import add, mkdir
+
+
+@pytest.mark.anyio
+async def test_list_directory_pages(client: TestClient, s3, repo: FileRepository):
+    directory = await mkdir(repo, "dir")
+    for name in ("c", "a", "b", "d"):
+        await add(repo, name, directory, size=1)
+    await add(repo, "outside")
+
+    names, cursor = [], None
+    while True:
+        params = {"parent_id": str(directory.id), "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/v1/files", params=params).json()
+        names.append([entry["name"] for entry in page["entries"]])
+        if not (cursor := page["next_cursor"]):
+            break
+
+    assert names == [["a", "b", "c"], ["d"]]
+    root = client.get("/api/v1/files").json()
+    assert [entry["name"] for entry in root["entries"]] == ["dir", "outside"]
+
+
+@pytest.mark.anyio
+async def test_list_directory_shows_current_versions(client: TestClient, s3, repo: FileRepository):
+    first = await add(repo, "f", size=1)
+    second = await add(repo, "f", size=2, origin_id=first.id, version=2)
+    # Still uploading, so version 2 stays current.
+    await repo.save_file(FileBase(name="f", origin_id=first.id, version=3))
+
+    entries = client.get("/api/v1/files").json()["entries"]
+
+    assert [(e["id"], e["version"]) for e in entries] == [(str(second.id), 2)]
+
+
+@pytest.mark.anyio
+async def test_list_directory_errors(client: TestClient, s3, repo: FileRepository):
+    file = await add(repo, "f")
+
+    assert client.get("/api/v1/files", params={"parent_id": str(uuid.uuid4())}).status_code == 404
+    assert client.get("/api/v1/files", params={"parent_id": str(file.id)}).status_code == 400
+    assert client.get("/api/v1/files", params={"cursor": str(uuid.uuid4())}).status_code == 400
+    assert client.get("/api/v1/files", params={"limit": 0}).status_code == 422
+
+
+@pytest.mark.anyio
+async def test_directory_usage_is_recursive(client: TestClient, s3, repo: FileRepository):
+    top = await mkdir(repo, "top")
+    sub = await mkdir(repo, "sub", top)
+    await add(repo, "a", top, size=10)
+    old = await add(repo, "b", sub, size=5)
+    await add(repo, "b", sub, size=7, origin_id=old.id, version=2)
+    await add(repo, "elsewhere", size=100)
+
+    response = client.get(f"/api/v1/directories/{top.id}/usage")
+
+    assert response.json() == {"size": 17, "files": 2, "directories": 1}
+    response = client.get(f"/api/v1/directories/{sub.id}/usage")
+    assert response.json() == {"size": 7, "files": 1, "directories": 0}
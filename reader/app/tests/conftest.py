@@ -3,31 +3,106 @@ import pytest
 
 from fastapi.testclient import TestClient
 
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
+from app.api.deps import get_streamer
 from app.core.db import get_db_session
 from app.main import app
+from app.schemas.models import ChunkBase, FileBase, FileType
+from app.schemas.orm import Chunk, ChunkPerFile, utcnow
 from app.services.db import FileRepository
 from app.services.s3 import FileStreamer, S3ClientManager
 
 
-SQLITE_DATABASE_URL = "sqlite://"
+SQLITE_DATABASE_URL = "sqlite+aiosqlite://"
+
+# Chunk hashes are stored as binary digests, so test hashes must be valid hex.
+H1, H2, H3 = (f"{i:064x}" for i in range(1, 4))
+CHUNKS = {H1: b"0123456789", H2: b"abcdefghij", H3: b"KLMNO"}
+CONTENT = CHUNKS[H1] + CHUNKS[H2] + CHUNKS[H3]
+
+
+class FakeS3:
+    def __init__(self) -> None:
+        self.reads: list[tuple[str, int | None, int | None]] = []
+
+    async def upload_chunk(self, chunk: bytes, key: str) -> None:
+        CHUNKS[key] = chunk
+
+    async def get_chunk_stream(self, *, key: str, start: int | None = None, end: int | None = None):
+        self.reads.append((key, start, end))
+        data = CHUNKS[key]
+        yield data[start or 0 : None if end is None else end + 1]
+
+    async def presign_chunk(
+        self,
+        key: str,
+        expires_in: int,
+        content_disposition: str | None = None,
+        content_type: str | None = None,
+    ) -> str:
+        url = f"https://s3.test/{key}?expires={expires_in}"
+        if content_disposition is not None:
+            url += f"&disposition={content_disposition}&type={content_type}"
+        return url
+
+
+@pytest.fixture
+def s3():
+    fake = FakeS3()
+    app.dependency_overrides[get_streamer] = lambda: fake
+    return fake
+
+
+async def add(repo: FileRepository, name: str, parent=None, size=0, **fields):
+    file = FileBase(name=name, parent_id=parent.id if parent else None, size=size, **fields)
+    return await repo.save_file(file.model_copy(update={"is_ready": True}))
+
+
+async def mkdir(repo: FileRepository, name: str, parent=None):
+    return await add(repo, name, parent, file_type=FileType.DIRECTORY)
+
+
+async def add_chunks(
+    repo: FileRepository, file_id, chunks: list[ChunkBase | str], first_index: int = 0
+) -> None:
+    """
+    Record a file's chunks the way the writer does: a ``Chunk`` row per stored
+    object, counting its references, and the file's ``ChunkPerFile`` rows.
+    A hash stands for the chunk of that hash in ``CHUNKS``.
+    """
+    session = repo.session
+    for index, chunk in enumerate(chunks, first_index):
+        if isinstance(chunk, str):
+            chunk = ChunkBase(hash=chunk, size=len(CHUNKS[chunk]))
+        row = await session.get(Chunk, chunk.hash)
+        if row is None:
+            row = Chunk.model_validate(chunk)
+            session.add(row)
+        row.refcount += 1
+        row.touched_at = utcnow()
+        session.add(ChunkPerFile(file_id=file_id, chunk_hash=chunk.hash, index=index))
+    await session.commit()
 
 
 @pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
+async def session_fixture():
+    engine = create_async_engine(
         SQLITE_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
     )
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
+    await engine.dispose()
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: AsyncSession):
     def get_session_override():
         return session
     
@@ -39,7 +114,7 @@ def client_fixture(session: Session):
 
 
 @pytest.fixture(name="repo")
-def repo_fixture(session: Session):
+def repo_fixture(session: AsyncSession):
     return FileRepository(session)
 
 
@@ -58,4 +133,8 @@ def mock_client():
 
 @pytest.fixture
 def file_streamer(mock_session):
-    return FileStreamer()
\ No newline at end of file
+    return FileStreamer()
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,79 @@
+import io
+import tarfile
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from app.services import archives
+from app.services.archives import ArchiveMember, StreamSplitter, TarArchive, ZipArchive
+
+
+MTIME = datetime(2024, 5, 17, 12, 30, 10)
+CONTENTS = {"a.txt": b"alpha", "dir/b.bin": bytes(range(256)) * 3, "empty": b""}
+MEMBERS = [
+    ArchiveMember("dir", 0, MTIME, is_dir=True),
+    *(ArchiveMember(name, len(data), MTIME) for name, data in CONTENTS.items()),
+]
+
+
+async def build(archive) -> bytes:
+    async def read(member: ArchiveMember):
+        data = CONTENTS[member.name]
+        for offset in range(0, len(data), 100):
+            yield data[offset : offset + 100]
+
+    data = b"".join([bytes(part) async for part in archive.stream(read)])
+    assert len(data) == archive.length()
+    return data
+
+
+@pytest.mark.anyio
+async def test_tar_archive():
+    data = await build(TarArchive(MEMBERS))
+
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == ["dir", *CONTENTS]
+        for name, content in CONTENTS.items():
+            assert archive.extractfile(name).read() == content
+        assert archive.getmember("a.txt").mtime == int(MTIME.timestamp())
+
+
+@pytest.mark.anyio
+async def test_zip_archive():
+    data = await build(ZipArchive(MEMBERS))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["dir/", *CONTENTS]
+        for name, content in CONTENTS.items():
+            assert archive.read(name) == content
+        assert archive.getinfo("a.txt").date_time == (2024, 5, 17, 12, 30, 10)
+
+
+@pytest.mark.anyio
+async def test_zip64_records(monkeypatch):
+    # Offsets past the limit make later members and the end records zip64.
+    monkeypatch.setattr(archives, "ZIP64_LIMIT", 300)
+
+    data = await build(ZipArchive(MEMBERS))
+
+    assert b"PK\x06\x06" in data
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        for name, content in CONTENTS.items():
+            assert archive.read(name) == content
+
+
+@pytest.mark.anyio
+async def test_stream_splitter():
+    async def stream():
+        for part in (b"abc", b"defgh", b"ij"):
+            yield part
+
+    splitter = StreamSplitter(stream())
+    taken = []
+    for size in (2, 0, 5, 3):
+        taken.append(b"".join([bytes(part) async for part in splitter.take(size)]))
+
+    assert taken == [b"ab", b"", b"cdefg", b"hij"]
@@ -0,0 +1,74 @@
+import pytest
+
+from app.services.cache import CachedFileStreamer, ChunkCache
+
+
+class CountingS3:
+    def __init__(self, objects: dict[str, bytes]) -> None:
+        self.objects = objects
+        self.reads = 0
+
+    async def get_chunk_stream(self, *, key: str, start: int | None = None, end: int | None = None):
+        self.reads += 1
+        yield self.objects[key][start or 0 : None if end is None else end + 1]
+
+
+async def read(streamer, key: str, **bounds) -> bytes:
+    return b"".join([bytes(c) async for c in streamer.get_chunk_stream(key=key, **bounds)])
+
+
+@pytest.mark.anyio
+async def test_whole_chunk_reads_fill_the_cache(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=100)
+    await cache.load()
+    s3 = CountingS3({"aa11": b"0123456789"})
+    streamer = CachedFileStreamer(streamer=s3, cache=cache)  # type: ignore[arg-type]
+
+    assert await read(streamer, "aa11", start=2, end=4) == b"234"
+    assert "aa11" not in cache
+
+    assert await read(streamer, "aa11") == b"0123456789"
+    assert await read(streamer, "aa11") == b"0123456789"
+    assert await read(streamer, "aa11", start=7, end=None) == b"789"
+    assert s3.reads == 2
+    assert cache.path("aa11").read_bytes() == b"0123456789"
+
+
+@pytest.mark.anyio
+async def test_eviction_keeps_cache_within_budget(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=25)
+    await cache.load()
+
+    await cache.put("aa01", b"x" * 10)
+    await cache.put("aa02", b"y" * 10)
+    cache.touch("aa01")
+    await cache.put("aa03", b"z" * 10)
+
+    assert "aa01" in cache and "aa03" in cache
+    assert "aa02" not in cache
+    assert not cache.path("aa02").exists()
+    assert cache.size == 20
+
+    reloaded = ChunkCache(tmp_path, max_bytes=25)
+    await reloaded.load()
+    assert reloaded.size == 20
+
+
+@pytest.mark.anyio
+async def test_tee_only_keeps_complete_streams(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=100)
+    await cache.load()
+
+    async def parts():
+        for part in (b"0123", b"4567", b"89"):
+            yield part
+
+    partial = cache.tee("bb01", 10, parts())
+    assert await anext(partial) == b"0123"
+    await partial.aclose()
+    assert "bb01" not in cache
+    assert list((tmp_path / ChunkCache.TMP_DIR).iterdir()) == []
+
+    assert b"".join([p async for p in cache.tee("bb01", 10, parts())]) == b"0123456789"
+    assert cache.path("bb01").read_bytes() == b"0123456789"
+    assert cache.size == 10
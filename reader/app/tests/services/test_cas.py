@@ -0,0 +1,81 @@
+import asyncio
+
+import lz4.frame
+import pytest
+import zstandard
+
+from app.core.config import settings
+from app.schemas.models import ChunkBase
+from app.services.cas import FileStorageService
+
+
+class SlowS3:
+    def __init__(self, objects: dict[str, bytes]) -> None:
+        self.objects = objects
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_chunk_stream(self, *, key: str, start: int | None = None, end: int | None = None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        yield self.objects[key][start or 0 : None if end is None else end + 1]
+
+
+async def read_all(fs: FileStorageService, manifest: list[ChunkBase], start: int, end: int) -> bytes:
+    return b"".join([bytes(chunk) async for chunk in fs.stream_range(manifest, start, end)])
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("read_ahead, max_bytes, expected", [(0, 100, 1), (3, 100, 4), (3, 20, 2)])
+async def test_stream_range_prefetch_window(monkeypatch, read_ahead, max_bytes, expected):
+    monkeypatch.setattr(settings, "READ_AHEAD_CHUNKS", read_ahead)
+    monkeypatch.setattr(settings, "READ_AHEAD_MAX_BYTES", max_bytes)
+    objects = {f"h{i}": bytes([65 + i]) * 10 for i in range(8)}
+    manifest = [ChunkBase(hash=key, size=10) for key in objects]
+    s3 = SlowS3(objects)
+    fs = FileStorageService(db=None, s3=s3)  # type: ignore[arg-type]
+
+    data = await read_all(fs, manifest, 5, 74)
+
+    assert data == b"".join(objects.values())[5:75]
+    assert s3.max_in_flight == expected
+
+
+@pytest.mark.anyio
+async def test_stream_range_reads_packed_chunks():
+    pack = b"xxaaaabbbbyy"
+    manifest = [
+        ChunkBase(hash="ha", size=4, pack_key="packs/p", pack_offset=2),
+        ChunkBase(hash="h0", size=3),
+        ChunkBase(hash="hb", size=4, pack_key="packs/p", pack_offset=6),
+    ]
+    s3 = SlowS3({"packs/p": pack, "h0": b"ccc"})
+    fs = FileStorageService(db=None, s3=s3)  # type: ignore[arg-type]
+
+    assert await read_all(fs, manifest, 0, 10) == b"aaaacccbbbb"
+    assert await read_all(fs, manifest, 3, 8) == b"acccbb"
+
+
+@pytest.mark.anyio
+async def test_stream_range_decompresses_chunks():
+    text = b"0123456789" * 100
+    zstd = zstandard.ZstdCompressor().compress(text)
+    packed = lz4.frame.compress(text)
+    manifest = [
+        ChunkBase(hash="hz", size=1000, codec="zstd", stored_size=len(zstd)),
+        ChunkBase(
+            hash="hl",
+            size=1000,
+            codec="lz4",
+            stored_size=len(packed),
+            pack_key="packs/p",
+            pack_offset=3,
+        ),
+    ]
+    s3 = SlowS3({"hz": zstd, "packs/p": b"xxx" + packed + b"yyy"})
+    fs = FileStorageService(db=None, s3=s3)  # type: ignore[arg-type]
+
+    assert await read_all(fs, manifest, 0, 1999) == text * 2
+    assert await read_all(fs, manifest, 995, 1004) == text[995:] + text[:5]
@@ -1,18 +1,27 @@
 import uuid
 
+import pytest
+from sqlalchemy import inspect
+
 from app.services.db import FileRepository
-from app.schemas.models import FileCreate
+from app.schemas.models import FileCreate, ChunkBase
 from app.schemas.orm import File, ChunkPerFile
+from app.tests.conftest import add, add_chunks
+
+
+# Chunk hashes are stored as binary digests, so test hashes must be valid hex.
+H1, H2, H3 = (f"{i:064x}" for i in range(1, 4))
 
 
-def create_file(repo: FileRepository) -> File:
+async def create_file(repo: FileRepository) -> File:
     fc = FileCreate(name="file.txt")
-    return repo.save_file(fc)
+    return await repo.save_file(fc)
 
 
-def test_create_and_retrieve_file(repo: FileRepository):
-    created_file = create_file(repo)
-    retrieved_file = repo.get_file_by_id(file_id=created_file.id)
+@pytest.mark.anyio
+async def test_create_and_retrieve_file(repo: FileRepository):
+    created_file = await create_file(repo)
+    retrieved_file = await repo.get_file_by_id(file_id=created_file.id)
 
     assert created_file.id is not None
     assert retrieved_file is not None
@@ -22,49 +31,77 @@ def test_create_and_retrieve_file(repo: FileRepository):
     assert created_file.is_ready is False
 
 
-def test_get_nonexistent_file_returns_none(repo: FileRepository):
-    assert repo.get_file_by_id(file_id=uuid.uuid4()) is None
+@pytest.mark.anyio
+async def test_get_nonexistent_file_returns_none(repo: FileRepository):
+    assert await repo.get_file_by_id(file_id=uuid.uuid4()) is None
 
 
-def test_file_failed(repo: FileRepository):
+@pytest.mark.anyio
+async def test_file_failed(repo: FileRepository):
     missing_id = uuid.uuid4()
-    repo.set_file_failed(missing_id)
+    await repo.set_file_failed(missing_id)
 
-    missing_file = repo.get_file_by_id(file_id=missing_id)
+    missing_file = await repo.get_file_by_id(file_id=missing_id)
     assert missing_file is None
 
 
-def test_file_completed(repo: FileRepository):
+@pytest.mark.anyio
+async def test_file_completed(repo: FileRepository):
     missing_id = uuid.uuid4()
-    repo.set_file_completed(missing_id)
+    await repo.set_file_completed(missing_id)
 
-    missing_file = repo.get_file_by_id(file_id=missing_id)
+    missing_file = await repo.get_file_by_id(file_id=missing_id)
     assert missing_file is None
 
 
-def test_save_chunk_and_get_chunks(repo: FileRepository):
-    file = create_file(repo)
+@pytest.mark.anyio
+async def test_save_chunk_and_get_chunks(repo: FileRepository):
+    file = await create_file(repo)
 
-    repo.save_chunk(file_id=file.id, chunk_hash="h3", index=3)
-    repo.save_chunk(file_id=file.id, chunk_hash="h2", index=2)
-    repo.save_chunk(file_id=file.id, chunk_hash="h1", index=1)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H3, index=3)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H2, index=2)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H1, index=1)
 
-    chunks = repo.get_file_chunks(file_id=file.id)
+    chunks = await repo.get_file_chunks(file_id=file.id)
     assert [c.index for c in chunks] == [1, 2, 3]
-    assert [c.chunk_hash for c in chunks] == ["h1", "h2", "h3"]
+    assert [c.chunk_hash for c in chunks] == [H1, H2, H3]
     assert all(isinstance(c, ChunkPerFile) for c in chunks)
 
 
-def test_set_file_failed_and_completed_toggle(repo: FileRepository):
-    f = create_file(repo)
-    repo.set_file_completed(file_id=f.id)
-    fresh_file = repo.get_file_by_id(file_id=f.id)
+@pytest.mark.anyio
+async def test_set_file_failed_and_completed_toggle(repo: FileRepository):
+    f = await create_file(repo)
+    await repo.set_file_completed(file_id=f.id)
+    fresh_file = await repo.get_file_by_id(file_id=f.id)
 
     assert fresh_file is not None
     assert fresh_file.is_ready is True
 
-    repo.set_file_failed(file_id=f.id)
-    fresh_file_2 = repo.get_file_by_id(file_id=f.id)
+    await repo.set_file_failed(file_id=f.id)
+    fresh_file_2 = await repo.get_file_by_id(file_id=f.id)
 
     assert fresh_file_2 is not None
     assert fresh_file.is_ready is False
+
+
+@pytest.mark.anyio
+async def test_get_file_manifest_returns_sizes_in_order(repo: FileRepository):
+    file = await create_file(repo)
+    packed = ChunkBase(hash=H2, size=20, pack_key="p", pack_offset=5)
+    await add_chunks(repo, file.id, [ChunkBase(hash=H1, size=10), packed, packed])
+
+    manifest = await repo.get_file_manifest(file_id=file.id)
+    assert [(c.hash, c.size) for c in manifest] == [(H1, 10), (H2, 20), (H2, 20)]
+    assert (manifest[1].pack_key, manifest[1].pack_offset) == ("p", 5)
+
+
+@pytest.mark.anyio
+async def test_listings_leave_inline_content_unloaded(repo: FileRepository):
+    file = await add(repo, "small.txt", content=b"abc")
+    repo.session.expunge_all()
+
+    [entry] = await repo.list_directory(None, None, limit=10)
+    assert "content" in inspect(entry).unloaded
+
+    assert await repo.get_file_contents([file.id, uuid.uuid4()]) == {file.id: b"abc"}
+    assert (await repo.get_file_by_id(file.id, with_content=True)).content == b"abc"
@@ -0,0 +1,142 @@
+import uuid
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.schemas.models import ChunkBase, FileBase, FileCreate, FileManifest
+from app.services import manifests as manifests_module
+from app.services.cas import FileStorageService
+from app.services.db import FileRepository
+from app.services.manifests import ManifestCache
+from app.tests.conftest import add_chunks
+
+
+def manifest(name: str, chunks: int, is_ready: bool = True) -> FileManifest:
+    return FileManifest(
+        file=FileBase(name=name, is_ready=is_ready),
+        chunks=[ChunkBase(hash=f"{i:064x}", size=1) for i in range(chunks)],
+    )
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, str] = {}
+        self.down = False
+
+    async def get(self, key: str):
+        if self.down:
+            raise ConnectionError("down")
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, ex: int):
+        if self.down:
+            raise ConnectionError("down")
+        self.data[key] = value
+
+
+class CountingRepository(FileRepository):
+    queries = 0
+
+    async def get_file_by_id(self, file_id, with_content=False):
+        self.queries += 1
+        return await super().get_file_by_id(file_id, with_content=with_content)
+
+    async def get_file_manifest(self, file_id):
+        self.queries += 1
+        return await super().get_file_manifest(file_id)
+
+
+@pytest.mark.anyio
+async def test_lru_is_bounded_by_chunk_count():
+    cache = ManifestCache(max_chunks=10, ttl_s=60)
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    await cache.put(a, manifest("a", 3))
+    await cache.put(b, manifest("b", 3))
+    assert await cache.get(a) is not None
+    await cache.put(c, manifest("c", 3))
+
+    assert (await cache.get(b), len(cache), cache.size) == (None, 2, 8)
+    await cache.put(b, manifest("big", 10))
+    assert await cache.get(b) is None
+    await cache.put(b, manifest("not ready", 1, is_ready=False))
+    assert await cache.get(b) is None
+
+
+@pytest.mark.anyio
+async def test_inline_content_is_weighed_by_size():
+    cache = ManifestCache(max_chunks=10, ttl_s=60)
+    small, large = uuid.uuid4(), uuid.uuid4()
+
+    def inline(size: int) -> FileManifest:
+        return FileManifest(file=FileBase(name="f", is_ready=True, content=b"x" * size), chunks=[])
+
+    await cache.put(small, inline(10))
+    assert cache.size == 1
+    await cache.put(large, inline(4 * ManifestCache.ENTRY_BYTES))
+    assert cache.size == 6
+    await cache.put(uuid.uuid4(), manifest("c", 5))
+
+    assert (await cache.get(small), await cache.get(large), cache.size) == (None, None, 6)
+
+
+@pytest.mark.anyio
+async def test_entries_expire(monkeypatch):
+    cache = ManifestCache(max_chunks=10, ttl_s=60)
+    file_id = uuid.uuid4()
+    await cache.put(file_id, manifest("f", 1))
+
+    now = manifests_module.time.monotonic()
+    monkeypatch.setattr(manifests_module.time, "monotonic", lambda: now + 61)
+
+    assert await cache.get(file_id) is None
+    assert cache.size == 0
+
+
+@pytest.mark.anyio
+async def test_redis_tier_is_shared_and_optional():
+    redis = FakeRedis()
+    first = ManifestCache(max_chunks=10, ttl_s=60, redis=redis)  # type: ignore[arg-type]
+    second = ManifestCache(max_chunks=10, ttl_s=60, redis=redis)  # type: ignore[arg-type]
+    file_id, other = uuid.uuid4(), uuid.uuid4()
+
+    await first.put(file_id, manifest("f", 2))
+    cached = await second.get(file_id)
+    assert cached is not None and cached.file.name == "f" and len(cached.chunks) == 2
+    assert len(second) == 1
+
+    redis.down = True
+    await first.put(other, manifest("o", 1))
+    assert await second.get(other) is None
+    assert await first.get(other) is not None
+
+
+@pytest.mark.anyio
+async def test_downloads_of_ready_files_skip_the_database(session):
+    repo = CountingRepository(session)
+    cache = ManifestCache(max_chunks=100, ttl_s=60)
+    fs = FileStorageService(db=repo, s3=None, manifests=cache)  # type: ignore[arg-type]
+    file = await repo.save_file(FileCreate(name="f"))
+    chunk = ChunkBase(hash=f"{1:064x}", size=5)
+    await add_chunks(repo, file.id, [chunk])
+
+    assert (await fs.get_file_object(file.id)).is_ready is False
+    await repo.set_file_completed(file.id, size=5)
+    repo.queries = 0
+
+    for _ in range(3):
+        assert (await fs.get_file_object(file.id)).is_ready
+        assert await fs.get_manifest(file.id) == [chunk]
+    assert repo.queries == 2
+
+
+@pytest.mark.anyio
+async def test_redis_tier_keeps_inline_content():
+    redis = FakeRedis()
+    file_id = uuid.uuid4()
+    inline = FileManifest(file=FileBase(name="f", is_ready=True, content=b"\xff\x00"), chunks=[])
+
+    await ManifestCache(10, ttl_s=60, redis=redis).put(file_id, inline)  # type: ignore[arg-type]
+    cached = await ManifestCache(10, ttl_s=60, redis=redis).get(file_id)  # type: ignore[arg-type]
+
+    assert cached is not None and cached.file.content == b"\xff\x00"
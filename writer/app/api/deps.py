@@ -1,15 +1,19 @@
 from typing import Annotated
 from fastapi import Depends, Request
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.services.ports import Database, S3
+from app.services.buffers import BufferPool
 from app.services.cas import FileStorageService
+from app.services.dedup import KnownChunks
+from app.services.hashing import ChunkHasher
+from app.services.packing import PackWriter
 from app.services.db import FileRepository
 from app.services.s3 import FileStreamer
 from app.core.db import get_db_session
 
 
-SessionDependency = Annotated[Session, Depends(get_db_session)]
+SessionDependency = Annotated[AsyncSession, Depends(get_db_session)]
 
 
 def get_repository(session: SessionDependency) -> Database:
@@ -21,12 +25,46 @@ def get_streamer(request: Request) -> S3:
     return FileStreamer(manager=client_manager)
 
 
+def get_known_chunks(request: Request) -> KnownChunks:
+    return request.app.state.known_chunks
+
+
+def get_hasher(request: Request) -> ChunkHasher:
+    return request.app.state.hasher
+
+
+def get_packer(request: Request) -> PackWriter | None:
+    return request.app.state.packer
+
+
+def get_buffer_pool(request: Request) -> BufferPool:
+    return request.app.state.buffer_pool
+
+
 RepositoryDependency = Annotated[Database, Depends(get_repository)]
 StreamerDependency = Annotated[S3, Depends(get_streamer)]
+KnownChunksDependency = Annotated[KnownChunks, Depends(get_known_chunks)]
+HasherDependency = Annotated[ChunkHasher, Depends(get_hasher)]
+PackerDependency = Annotated[PackWriter | None, Depends(get_packer)]
+BufferPoolDependency = Annotated[BufferPool, Depends(get_buffer_pool)]
 
 
-def get_storage(db: RepositoryDependency, s3: StreamerDependency) -> FileStorageService:
-    return FileStorageService(db=db, s3=s3)
+def get_storage(
+    db: RepositoryDependency,
+    s3: StreamerDependency,
+    known_chunks: KnownChunksDependency,
+    hasher: HasherDependency,
+    packer: PackerDependency,
+    buffers: BufferPoolDependency,
+) -> FileStorageService:
+    return FileStorageService(
+        db=db,
+        s3=s3,
+        known_chunks=known_chunks,
+        hasher=hasher,
+        packer=packer,
+        buffers=buffers,
+    )
 
 
 CASDependency = Annotated[FileStorageService, Depends(get_storage)]
@@ -1,14 +1,239 @@
+import uuid
 from fastapi import (
     APIRouter,
+    HTTPException,
+    Request,
     UploadFile,
+    status,
 )
 
 from app.api.deps import CASDependency
+from app.core.config import settings
+from app.schemas.models import (
+    BatchUploadResult,
+    ChunkHashes,
+    DirectoryCreate,
+    FileEntry,
+    FileMove,
+    FileRename,
+    FileVersion,
+    SessionChunk,
+    UploadResult,
+    UploadSessionCreate,
+    UploadSessionStatus,
+)
+from app.services.cas import DirectoryNotEmpty, UploadIncomplete, UploadSessionNotFound
 
 
 api_router = APIRouter(tags=["writer"])
 
 
+def file_not_found(file_id: uuid.UUID) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File {file_id} not found")
+
+
+def not_a_directory(e: NotADirectoryError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @api_router.post("/upload", name="upload_file")
-async def upload(*, file: UploadFile, fs: CASDependency) -> str:
-    return await fs.upload_file(file)
+async def upload(
+    *,
+    file: UploadFile,
+    fs: CASDependency,
+    version_of: uuid.UUID | None = None,
+    parent_id: uuid.UUID | None = None,
+) -> UploadResult:
+    """
+    Upload a file into directory ``parent_id``, or with ``version_of`` a new
+    version of an existing file.
+    """
+    try:
+        return await fs.upload_file(file, version_of=version_of, parent_id=parent_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise not_a_directory(e)
+
+
+@api_router.post("/upload/batch", name="upload_batch")
+async def upload_batch(
+    *, files: list[UploadFile], fs: CASDependency, parent_id: uuid.UUID | None = None
+) -> list[BatchUploadResult]:
+    """
+    Upload many files (multipart ``files`` fields) into directory ``parent_id``.
+
+    Results are in request order; a failed file carries an ``error`` while the
+    others are stored regardless.
+    """
+    try:
+        return await fs.upload_batch(files, parent_id=parent_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise not_a_directory(e)
+
+
+@api_router.put("/upload/{name}", name="upload_stream")
+async def upload_stream(
+    *,
+    request: Request,
+    name: str,
+    fs: CASDependency,
+    version_of: uuid.UUID | None = None,
+    parent_id: uuid.UUID | None = None,
+) -> UploadResult:
+    """
+    Upload the raw request body (``application/octet-stream``) as file ``name``.
+
+    Unlike the multipart endpoint the body is chunked as it arrives, without
+    being spooled to a temporary file first. With ``version_of`` the body
+    becomes a new version of that file, which keeps its name.
+    """
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    if content_type.split(";")[0].strip() != "application/octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected an application/octet-stream body",
+        )
+    try:
+        return await fs.upload_stream(
+            name, request.stream(), version_of=version_of, parent_id=parent_id
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise not_a_directory(e)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def session_not_found(file_id: uuid.UUID) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"No upload session for file {file_id}",
+    )
+
+
+@api_router.post("/uploads", name="create_upload_session", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    *, upload: UploadSessionCreate, fs: CASDependency
+) -> UploadSessionStatus:
+    try:
+        return await fs.create_upload_session(
+            name=upload.name,
+            chunk_count=upload.chunk_count,
+            version_of=upload.version_of,
+            parent_id=upload.parent_id,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise not_a_directory(e)
+
+
+@api_router.post("/directories", name="create_directory", status_code=status.HTTP_201_CREATED)
+async def create_directory(*, directory: DirectoryCreate, fs: CASDependency) -> FileEntry:
+    try:
+        return await fs.create_directory(directory.name, parent_id=directory.parent_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except NotADirectoryError as e:
+        raise not_a_directory(e)
+
+
+@api_router.post("/files/{file_id}/move", name="move_file")
+async def move_file(*, file_id: uuid.UUID, move: FileMove, fs: CASDependency) -> FileEntry:
+    try:
+        return await fs.move_file(file_id, move.parent_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except (NotADirectoryError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@api_router.patch("/files/{file_id}", name="rename_file")
+async def rename_file(*, file_id: uuid.UUID, rename: FileRename, fs: CASDependency) -> FileVersion:
+    try:
+        return await fs.rename_file(file_id, rename.name)
+    except FileNotFoundError:
+        raise file_not_found(file_id)
+
+
+@api_router.delete(
+    "/files/{file_id}", name="delete_file", status_code=status.HTTP_204_NO_CONTENT
+)
+async def delete_file(
+    *, file_id: uuid.UUID, fs: CASDependency, all_versions: bool = False
+) -> None:
+    """
+    Delete a file version, or with ``all_versions`` the whole file.
+
+    Chunks no remaining file references are removed by the garbage collector.
+    Directories must be empty.
+    """
+    try:
+        await fs.delete_file(file_id, all_versions=all_versions)
+    except FileNotFoundError:
+        raise file_not_found(file_id)
+    except DirectoryNotEmpty as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@api_router.get("/uploads/{file_id}", name="get_upload_session")
+async def get_upload_session(*, file_id: uuid.UUID, fs: CASDependency) -> UploadSessionStatus:
+    try:
+        return await fs.get_upload_session(file_id)
+    except UploadSessionNotFound:
+        raise session_not_found(file_id)
+
+
+@api_router.post("/chunks/missing", name="find_missing_chunks")
+async def find_missing_chunks(*, chunks: ChunkHashes, fs: CASDependency) -> ChunkHashes:
+    return ChunkHashes(hashes=await fs.find_missing_chunks(chunks.hashes))
+
+
+@api_router.put("/uploads/{file_id}/manifest", name="put_upload_manifest")
+async def put_upload_manifest(
+    *, file_id: uuid.UUID, chunks: ChunkHashes, fs: CASDependency
+) -> UploadSessionStatus:
+    try:
+        return await fs.put_session_manifest(file_id, chunks.hashes)
+    except UploadSessionNotFound:
+        raise session_not_found(file_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@api_router.put("/uploads/{file_id}/chunks/{index}", name="put_upload_chunk")
+async def put_upload_chunk(
+    *, request: Request, file_id: uuid.UUID, index: int, fs: CASDependency
+) -> SessionChunk:
+    chunk = bytearray()
+    async for part in request.stream():
+        chunk += part
+        if len(chunk) > settings.SESSION_CHUNK_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Chunks are limited to {settings.SESSION_CHUNK_MAX_SIZE} bytes",
+            )
+
+    try:
+        return await fs.put_session_chunk(file_id, index, bytes(chunk))
+    except UploadSessionNotFound:
+        raise session_not_found(file_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@api_router.post("/uploads/{file_id}/commit", name="commit_upload_session")
+async def commit_upload_session(*, file_id: uuid.UUID, fs: CASDependency) -> UploadResult:
+    try:
+        return await fs.commit_upload_session(file_id)
+    except UploadSessionNotFound:
+        raise session_not_found(file_id)
+    except UploadIncomplete as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Upload is incomplete", "missing": e.missing},
+        )
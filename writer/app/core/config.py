@@ -51,17 +51,21 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100  # prepared statements per connection, 0 disables
 
     @computed_field
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
         return MultiHostUrl.build(
-            scheme="postgresql+psycopg2",
+            scheme="postgresql+asyncpg",
             username=self.POSTGRES_USER,
             password=self.POSTGRES_PASSWORD,
             host=self.POSTGRES_SERVER,
             port=self.POSTGRES_PORT,
             path=self.POSTGRES_DB,
+            query=f"prepared_statement_cache_size={self.POSTGRES_STATEMENT_CACHE_SIZE}",
         )  # type: ignore
 
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
@@ -87,7 +91,36 @@ class Settings(BaseSettings):
         return self
 
     CHUNK_SIZE: int = 1024 * 1024  # 1MB
+    CHUNKING_MODE: Literal["fixed", "fastcdc"] = "fixed"
+    CDC_MIN_SIZE: int = 256 * 1024
+    CDC_AVG_SIZE: int = 1024 * 1024
+    CDC_MAX_SIZE: int = 4 * 1024 * 1024
     READ_CHUNK: int = 256 * 1024
+    UPLOAD_MAX_INFLIGHT_CHUNKS: int = 4  # chunks hashed/uploaded concurrently per upload
+    DEDUP_CACHE_SIZE: int = 50_000  # known chunk hashes kept in memory per worker
+    DEDUP_CACHE_TTL_S: int = 600  # must stay well below GC_GRACE_PERIOD_S
+    CHUNK_FLUSH_ROWS: int = 256  # chunk rows buffered per upload before a bulk INSERT
+    CHUNK_FLUSH_INTERVAL_MS: int = 1000  # max age of buffered chunk rows
+    HASH_WORKERS: int = 4  # threads hashing chunks, shared by all uploads of a worker
+    HASH_CONCURRENCY_PER_UPLOAD: int = 2  # chunks of one upload hashed at once
+    BUFFER_POOL_MAX_BYTES: int = 256 * 1024 * 1024  # chunk buffers shared by all uploads of a worker
+    PACK_SMALL_CHUNKS: bool = False  # store small chunks inside shared pack objects
+    PACK_CHUNK_MAX_SIZE: int = 64 * 1024  # chunks up to this size are packed
+    PACK_TARGET_SIZE: int = 8 * 1024 * 1024  # a pack is written once it reaches this size
+    PACK_MAX_DELAY_MS: int = 200  # ...or this long after its first chunk
+    BATCH_COMMIT_FILES: int = 100  # files of a batch upload marked completed per transaction
+    INLINE_FILE_MAX_SIZE: int = 0  # files up to this size are stored in their row, 0 disables
+    UPLOAD_SESSION_TTL_S: int = 7 * 24 * 3600  # uncommitted upload sessions are dropped after this
+    SESSION_CHUNK_MAX_SIZE: int = 16 * 1024 * 1024  # largest chunk accepted by upload sessions
+    COMPRESSION: Literal["none", "zstd", "lz4"] = "none"  # codec for newly stored chunks
+    COMPRESSION_LEVEL: int = 3
+    COMPRESSION_MAX_ENTROPY: float = 7.5  # bits/byte of a sample above which chunks are stored as-is
+    COMPRESSION_MIN_SAVINGS: float = 0.1  # store as-is unless compression saves this fraction
+    GC_ENABLED: bool = False  # delete unreferenced chunks in the background
+    GC_GRACE_PERIOD_S: int = 24 * 3600  # unreferenced chunks are kept this long
+    GC_BATCH_SIZE: int = 1000  # chunks deleted per batch
+    GC_BATCH_PAUSE_MS: int = 1000  # pause between batches, bounds GC load on the disks
+    GC_INTERVAL_S: int = 600  # pause between GC passes
 
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
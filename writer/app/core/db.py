@@ -1,24 +1,48 @@
-from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from app.core.config import settings
 
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    pool_size=settings.POSTGRES_POOL_SIZE,
+    max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+
+# Advisory lock key serializing table creation between the writer and reader.
+INIT_DB_LOCK_KEY = 0x796F70
 
 
-def init_db() -> None:
+async def init_db() -> None:
     """
     Initialize the database by creating all tables.
     This function should be called at the start of the application.
+
+    Existing tables are left as they are; schema changes to them are applied
+    with the scripts in ``migrations/``.
     """
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Held until commit, so the other service sees the tables once it gets it.
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": INIT_DB_LOCK_KEY}
+            )
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 
-def get_db_session():
+async def get_db_session():
     """
-    Create a new SQLAlchemy session.
+    Create a new SQLAlchemy async session.
+
+    Objects are not expired on commit: an expired attribute would need
+    implicit IO to reload, which async sessions do not allow.
 
     Returns:
-        Session: A new SQLAlchemy session.
+        AsyncSession: A new SQLAlchemy async session.
     """
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
@@ -0,0 +1,25 @@
+from collections import defaultdict
+from threading import Lock
+
+
+class Metrics:
+    """
+    Minimal in-process counters exposed through the ``/metrics`` endpoint.
+
+    Values are per worker process and reset on restart.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._counters: dict[str, int] = defaultdict(int)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
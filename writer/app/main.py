@@ -1,12 +1,22 @@
+import asyncio
 import sentry_sdk
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
+from app.core.db import engine, init_db
+from app.core.metrics import metrics
 from app.api.main import api_router
-from app.services.s3 import S3ClientManager
+from app.services.buffers import BufferPool
+from app.services.chunking import get_chunker
+from app.services.dedup import KnownChunks
+from app.services.gc import ChunkCollector
+from app.services.hashing import ChunkHasher
+from app.services.packing import PackWriter
+from app.services.s3 import FileStreamer, S3ClientManager
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -23,12 +33,44 @@ if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await init_db()
     s3_manager = S3ClientManager()
     await s3_manager.start()
     app.state.s3_manager = s3_manager
+    app.state.known_chunks = KnownChunks(settings.DEDUP_CACHE_SIZE, settings.DEDUP_CACHE_TTL_S)
+    app.state.hasher = ChunkHasher(settings.HASH_WORKERS)
+    app.state.buffer_pool = BufferPool(
+        buffer_size=get_chunker().max_size, max_bytes=settings.BUFFER_POOL_MAX_BYTES
+    )
+    app.state.packer = None
+    if settings.PACK_SMALL_CHUNKS:
+        app.state.packer = PackWriter(
+            s3=FileStreamer(manager=s3_manager),
+            target_size=settings.PACK_TARGET_SIZE,
+            max_delay_ms=settings.PACK_MAX_DELAY_MS,
+        )
+    gc_task = None
+    if settings.GC_ENABLED:
+        collector = ChunkCollector(
+            s3=FileStreamer(manager=s3_manager),
+            grace_period_s=settings.GC_GRACE_PERIOD_S,
+            batch_size=settings.GC_BATCH_SIZE,
+            batch_pause_ms=settings.GC_BATCH_PAUSE_MS,
+            interval_s=settings.GC_INTERVAL_S,
+            session_ttl_s=settings.UPLOAD_SESSION_TTL_S,
+        )
+        gc_task = asyncio.create_task(
+            collector.run(lambda: AsyncSession(engine, expire_on_commit=False))
+        )
     try:
         yield
     finally:
+        if gc_task is not None:
+            gc_task.cancel()
+            await asyncio.gather(gc_task, return_exceptions=True)
+        if app.state.packer is not None:
+            await app.state.packer.close()
+        app.state.hasher.close()
         await s3_manager.close()
 
 
@@ -57,3 +99,8 @@ app = create_app(lifespan=lifespan)
 @app.get("/health-check", tags=["infra"])
 def health_check() -> bool:
     return True
+
+
+@app.get("/metrics", tags=["infra"])
+def get_metrics() -> dict[str, int]:
+    return metrics.snapshot()
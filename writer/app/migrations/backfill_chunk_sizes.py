@@ -0,0 +1,93 @@
+"""
+Fill in chunk and file sizes after migrations/001_manifest_keys_and_refcounts.sql.
+
+Files of the first release recorded only their chunks' hashes. The migration
+gives each of those chunks a row with a size of 0, which is read here from
+its object with a HEAD request. File sizes are then summed from their chunks.
+Running it again only picks up what is still missing.
+
+    docker-compose run --rm writer python -m app.migrations.backfill_chunk_sizes
+"""
+
+import asyncio
+import logging
+
+from botocore.exceptions import ClientError
+from sqlalchemy import func, update
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.db import engine
+from app.schemas.orm import Chunk, ChunkPerFile, File
+from app.services.ports import S3
+from app.services.s3 import FileStreamer, S3ClientManager
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+async def backfill_chunk_sizes(
+    session: AsyncSession, s3: S3, batch_size: int = BATCH_SIZE
+) -> int:
+    """Set the size of every chunk recorded as 0 bytes from S3; returns how many were set."""
+    count = 0
+    after: str | None = None
+    while True:
+        statement = (
+            select(Chunk.hash).where(Chunk.size == 0).order_by(Chunk.hash).limit(batch_size)
+        )
+        if after is not None:
+            statement = statement.where(col(Chunk.hash) > after)
+        hashes = (await session.exec(statement)).all()
+        if not hashes:
+            break
+        after = hashes[-1]
+
+        sizes = await asyncio.gather(
+            *(s3.get_object_size(h) for h in hashes), return_exceptions=True
+        )
+        for chunk_hash, size in zip(hashes, sizes):
+            if isinstance(size, ClientError):
+                log.warning(f"Chunk object missing, size left at 0: hash={chunk_hash}: {size}")
+                continue
+            if isinstance(size, BaseException):
+                raise size
+            await session.exec(update(Chunk).where(Chunk.hash == chunk_hash).values(size=size))
+            count += 1
+        await session.commit()
+        log.info(f"Chunk sizes set: {count}")
+    return count
+
+
+async def backfill_file_sizes(session: AsyncSession) -> None:
+    """Set the size of chunked files recorded as 0 bytes to the sum of their chunks."""
+    chunk_sizes = (
+        select(func.coalesce(func.sum(Chunk.size), 0))
+        .join(ChunkPerFile, col(ChunkPerFile.chunk_hash) == col(Chunk.hash))
+        .where(col(ChunkPerFile.file_id) == col(File.id))
+        .scalar_subquery()
+    )
+    await session.exec(
+        update(File)
+        .where(col(File.size) == 0, col(File.content).is_(None))
+        .values(size=chunk_sizes)
+    )
+    await session.commit()
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    manager = S3ClientManager()
+    await manager.start()
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            await backfill_chunk_sizes(session, FileStreamer(manager=manager))
+            await backfill_file_sizes(session)
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,13 @@
+from datetime import datetime
 from enum import StrEnum
+from typing import Annotated
 import uuid
 
-from sqlmodel import SQLModel
+from pydantic import StringConstraints
+from sqlmodel import Field, SQLModel
+
+
+ChunkHash = Annotated[str, StringConstraints(pattern=r"^[0-9a-f]{64}$")]
 
 
 class FileType(StrEnum):
@@ -14,12 +20,107 @@ class FileCreate(SQLModel):
 
 
 class FileBase(FileCreate):
-    parent_id: int = -1
+    # Directory the entry is in; ``None`` is the root directory.
+    parent_id: uuid.UUID | None = None
     file_type: FileType = FileType.FILE
     is_ready: bool = False
+    size: int = 0
+    # Versions of a file share the id of their first version as ``origin_id``.
+    origin_id: uuid.UUID | None = None
+    version: int = 1
+    # Files up to INLINE_FILE_MAX_SIZE are stored here rather than as chunks.
+    content: bytes | None = None
+
+
+class FileVersion(SQLModel):
+    id: uuid.UUID
+    name: str
+    version: int
+    size: int
+    is_ready: bool
+    created_at: datetime
+
+
+class FileEntry(SQLModel):
+    id: uuid.UUID
+    name: str
+    file_type: FileType
+    parent_id: uuid.UUID | None
+    size: int
+    version: int
+    created_at: datetime
 
 
 class ChunkPerFileBase(SQLModel):
     file_id: uuid.UUID
     chunk_hash: str
     index: int
+
+
+class ChunkBase(SQLModel):
+    hash: str
+    size: int
+    # Set when the chunk is stored inside a pack object rather than on its own.
+    pack_key: str | None = None
+    pack_offset: int | None = None
+    # Set when the stored bytes are compressed; ``size`` is always the plaintext size.
+    codec: str | None = None
+    stored_size: int | None = None
+
+
+class UploadResult(SQLModel):
+    id: uuid.UUID
+    name: str
+    size: int
+    deduplicated_bytes: int = 0
+    version: int = 1
+
+
+class BatchUploadResult(UploadResult):
+    # Set when this file failed; the other files of the batch are unaffected.
+    error: str | None = None
+
+
+class FileRename(SQLModel):
+    name: str = Field(min_length=1)
+
+
+class DirectoryCreate(SQLModel):
+    name: str = Field(min_length=1)
+    parent_id: uuid.UUID | None = None
+
+
+class FileMove(SQLModel):
+    # Target directory; ``None`` moves the entry to the root directory.
+    parent_id: uuid.UUID | None = None
+
+
+class UploadSessionCreate(SQLModel):
+    name: str
+    chunk_count: int = Field(gt=0)
+    parent_id: uuid.UUID | None = None
+    # Upload a new version of this file instead of a new file.
+    version_of: uuid.UUID | None = None
+
+
+class UploadSessionBase(SQLModel):
+    file_id: uuid.UUID
+    chunk_count: int
+
+
+class UploadSessionStatus(SQLModel):
+    id: uuid.UUID
+    name: str
+    chunk_count: int
+    missing: list[int]
+
+
+class SessionChunk(SQLModel):
+    index: int
+    hash: str
+    size: int
+    deduplicated: bool
+
+
+class ChunkHashes(SQLModel):
+    hashes: list[ChunkHash] = Field(max_length=100_000)
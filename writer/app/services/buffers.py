@@ -0,0 +1,101 @@
+import asyncio
+from collections import deque
+
+from app.core.metrics import metrics
+
+
+class BufferPool:
+    """
+    Reusable, fixed-size ``bytearray`` chunk buffers shared by all uploads.
+
+    Chunkers read straight into pooled buffers and hand out ``memoryview``
+    slices of them, which are hashed and compressed in place; the buffer
+    returns to the pool once its chunk is stored. This keeps the allocator
+    from churning through a fresh ``bytes`` per chunk. An uncompressed chunk
+    that fills its whole buffer is uploaded as that buffer, a shorter one is
+    copied once by ``FileStreamer.upload_chunk``.
+
+    At most ``max_bytes`` of buffers exist at once, callers of ``acquire``
+    wait for a release beyond that. A single upload holds at most
+    ``UPLOAD_MAX_INFLIGHT_CHUNKS + 2`` buffers: the chunks in flight, the one
+    being read and, for content-defined chunking, a spare for the bytes after
+    the next cut. A chunker waits for its next spare while holding a buffer,
+    so uploads start with a pair reserved at once, never piecemeal, and a
+    waiter is served as soon as enough buffers are free. Whenever the pool
+    is exhausted, some upload then holds all it needs to hand on a chunk,
+    which its caller releases once stored.
+    Usage is reported as the ``buffer_pool_bytes_in_use`` and
+    ``buffer_pool_bytes_allocated`` metrics.
+    """
+
+    def __init__(self, buffer_size: int, max_bytes: int):
+        self.buffer_size = buffer_size
+        # Two buffers are the least one upload needs to make progress.
+        self._slots = max(max_bytes // buffer_size, 2)
+        self._waiters: deque[tuple[int, asyncio.Future[None]]] = deque()
+        self._free: list[bytearray] = []
+        self._in_use = 0
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    async def acquire(self) -> bytearray:
+        await self._reserve(1)
+        return self._take()
+
+    async def acquire_pair(self) -> tuple[bytearray, bytearray]:
+        """Acquire two buffers at once, waiting until both are free."""
+        await self._reserve(2)
+        return self._take(), self._take()
+
+    def release(self, chunk: bytearray | memoryview) -> None:
+        """Return a buffer, or a ``memoryview`` of one, to the pool."""
+        if isinstance(chunk, memoryview):
+            buffer = chunk.obj
+            chunk.release()
+        else:
+            buffer = chunk
+        self._free.append(buffer)
+        self._in_use -= 1
+        metrics.inc("buffer_pool_bytes_in_use", -self.buffer_size)
+        self._slots += 1
+        self._wake()
+
+    async def _reserve(self, count: int) -> None:
+        if self._slots >= count:
+            self._slots -= count
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (count, waiter)
+        self._waiters.append(entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Served just as it was cancelled: hand the slots on.
+                self._slots += count
+                self._wake()
+            else:
+                self._waiters.remove(entry)
+            raise
+
+    def _wake(self) -> None:
+        # Oldest first, but one that needs a pair does not hold up those
+        # that need a single buffer to carry on.
+        for entry in list(self._waiters):
+            count, waiter = entry
+            if not waiter.done() and count <= self._slots:
+                self._waiters.remove(entry)
+                self._slots -= count
+                waiter.set_result(None)
+
+    def _take(self) -> bytearray:
+        if self._free:
+            buffer = self._free.pop()
+        else:
+            buffer = bytearray(self.buffer_size)
+            metrics.inc("buffer_pool_bytes_allocated", self.buffer_size)
+        self._in_use += 1
+        metrics.inc("buffer_pool_bytes_in_use", self.buffer_size)
+        return buffer
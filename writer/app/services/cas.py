@@ -1,87 +1,707 @@
 """Content Addressable Storage"""
 
+import asyncio
 import logging
-import hashlib
-from typing import AsyncGenerator
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, NamedTuple, Sequence
 import uuid
 import secrets
+import time
 from fastapi import UploadFile
 
 from app.core.config import settings
-from app.schemas.models import FileCreate, FileBase
+from app.core.metrics import metrics
+from app.schemas.models import (
+    BatchUploadResult,
+    ChunkBase,
+    FileBase,
+    FileEntry,
+    FileType,
+    FileVersion,
+    SessionChunk,
+    UploadResult,
+    UploadSessionBase,
+    UploadSessionStatus,
+)
+from app.schemas.orm import File
+from app.services.buffers import BufferPool
+from app.services.chunking import Chunker, ReadInto, StreamReader, fill, get_chunker, prepend
+from app.services.compression import ChunkCompressor, get_compressor
+from app.services.dedup import KnownChunks
+from app.services.hashing import ChunkHasher, sha256_hexdigest
+from app.services.packing import PackWriter
 from app.services.ports import Database, S3
 
 
 log = logging.getLogger(__name__)
 
 
+class UploadSessionNotFound(LookupError):
+    """No open upload session for the file."""
+
+
+class UploadIncomplete(Exception):
+    """An upload session was committed before all of its chunks arrived."""
+
+    def __init__(self, missing: list[int]):
+        super().__init__(f"{len(missing)} chunks missing")
+        self.missing = missing
+
+
+class DirectoryNotEmpty(Exception):
+    """A directory with entries in it was about to be deleted."""
+
+
+class StoredChunk(NamedTuple):
+    meta: ChunkBase
+    deduplicated: bool
+
+
+class ChunkBuffer:
+    """
+    Buffers chunk metadata of a single upload and writes it in bulk.
+
+    Rows are flushed every ``max_rows`` chunks or ``interval_ms`` milliseconds,
+    whichever comes first, instead of one transaction per chunk. Newly stored
+    hashes are published to ``known_chunks`` only once their rows are committed.
+    Writes hold ``db_lock``, as the session is shared with in-flight chunk tasks.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        file_id: uuid.UUID,
+        known_chunks: KnownChunks,
+        db_lock: asyncio.Lock,
+        max_rows: int,
+        interval_ms: int,
+    ):
+        self.db = db
+        self.db_lock = db_lock
+        self.file_id = file_id
+        self.known_chunks = known_chunks
+        self.max_rows = max_rows
+        self.interval = interval_ms / 1000
+        self._rows: list[tuple[str, int]] = []
+        self._new_chunks: list[ChunkBase] = []
+        self._unpublished: list[str] = []
+        self._flushed_at = time.monotonic()
+
+    async def add(self, chunk: StoredChunk, index: int) -> None:
+        self._rows.append((chunk.meta.hash, index))
+        if not chunk.deduplicated:
+            self._new_chunks.append(chunk.meta)
+
+        if (
+            len(self._rows) >= self.max_rows
+            or time.monotonic() - self._flushed_at >= self.interval
+        ):
+            await self.flush()
+
+    async def flush(self, commit: bool = True) -> None:
+        if self._rows:
+            async with self.db_lock:
+                await self.db.register_chunks(self._new_chunks, commit=False)
+                await self.db.save_chunks(self.file_id, self._rows, commit=commit)
+            self._unpublished.extend(chunk.hash for chunk in self._new_chunks)
+            self._rows, self._new_chunks = [], []
+        self._flushed_at = time.monotonic()
+        if commit:
+            self.publish()
+
+    async def discard(self, stored: Sequence[ChunkBase] = ()) -> None:
+        """
+        Drop the unflushed rows of a failed upload.
+
+        Objects were already written for its new chunks and for ``stored``,
+        chunks stored by in-flight tasks; they are registered unreferenced,
+        committed with the file's failure, so the garbage collector reclaims
+        them. Without a row nothing would ever delete them.
+        """
+        new_chunks = [*self._new_chunks, *stored]
+        self._rows, self._new_chunks = [], []
+        if not new_chunks:
+            return
+        try:
+            async with self.db_lock:
+                await self.db.register_chunks(new_chunks, commit=False)
+        except Exception:
+            log.warning(
+                f"Could not register {len(new_chunks)} orphaned chunks: file_id={self.file_id}",
+                exc_info=True,
+            )
+
+    def publish(self) -> None:
+        for chunk_hash in self._unpublished:
+            self.known_chunks.add(chunk_hash)
+        self._unpublished.clear()
+
+
 class FileStorageService:
     """
     Service for managing file storage using a content-addressable storage (CAS) approach.
 
     Responsibilities:
-        - Split uploaded files into fixed-size chunks.
+        - Split uploaded files into chunks (fixed-size or content-defined).
         - Calculate a stable hash for each chunk.
+        - Skip S3 writes for chunks whose hash is already stored (deduplication).
         - Store chunk metadata in the database (mapping file_id -> chunk_hash -> index).
-        - Upload chunks to an S3-compatible object storage.
+        - Upload chunks to an S3-compatible object storage, optionally compressed
+          and optionally packing small chunks into shared pack objects.
         - Stream files back to the client by reading chunks sequentially from storage.
 
     Dependencies:
         db (Database): Abstract interface for file/chunk metadata persistence.
         s3 (S3): Abstract interface for S3-compatible storage operations.
+        known_chunks (KnownChunks): Process-wide cache of hashes already stored.
+        hasher (ChunkHasher): Process-wide thread pool computing chunk hashes.
+        chunker (Chunker): Chunking strategy, ``CHUNKING_MODE`` by default.
+        packer (PackWriter): Process-wide pack writer; small chunks are stored
+            as separate objects without it.
+        compressor (ChunkCompressor): Chunk compression, ``COMPRESSION`` by default.
+        buffers (BufferPool): Process-wide pool of chunk buffers.
     """
-    def __init__(self, db: Database, s3: S3):
+    def __init__(
+        self,
+        db: Database,
+        s3: S3,
+        known_chunks: KnownChunks | None = None,
+        hasher: ChunkHasher | None = None,
+        chunker: Chunker | None = None,
+        packer: PackWriter | None = None,
+        compressor: ChunkCompressor | None = None,
+        buffers: BufferPool | None = None,
+    ):
         self.db = db
         self.s3 = s3
+        # Dependencies are compared with None: an empty KnownChunks is falsy.
+        if known_chunks is None:
+            known_chunks = KnownChunks(settings.DEDUP_CACHE_SIZE, settings.DEDUP_CACHE_TTL_S)
+        self.known_chunks = known_chunks
+        self.hasher = hasher if hasher is not None else ChunkHasher()
+        self.chunker = chunker if chunker is not None else get_chunker()
+        self.packer = packer
+        self.compressor = compressor if compressor is not None else get_compressor()
+        if buffers is None:
+            buffers = BufferPool(self.chunker.max_size, settings.BUFFER_POOL_MAX_BYTES)
+        self.buffers = buffers
+        if self.buffers.buffer_size < self.chunker.max_size:
+            raise ValueError("Pooled buffers are smaller than the largest chunk")
+        # An AsyncSession must not be used concurrently; chunk tasks share it.
+        self._db_lock = asyncio.Lock()
+        # Caps this upload's share of the hashing pool.
+        self._hash_slots = asyncio.Semaphore(settings.HASH_CONCURRENCY_PER_UPLOAD)
+        # Hashes already handled by an earlier chunk of this upload; metadata is
+        # recorded in order, so a later duplicate is only recorded once the first
+        # one has been stored.
+        self._scheduled: set[str] = set()
 
     @staticmethod
     def get_chunk_hash(chunk: bytes) -> str:
-        return hashlib.sha256(chunk).hexdigest()
+        return sha256_hexdigest(chunk)
 
     @staticmethod
     def get_random_string(n: int) -> str:
         return secrets.token_urlsafe(n)
 
-    def get_filename(self, file_id: uuid.UUID) -> str:
-        return self.db.get_filename_by_id(file_id)
+    async def get_filename(self, file_id: uuid.UUID) -> str:
+        return await self.db.get_filename_by_id(file_id)
 
-    def get_file_object(self, file_id: uuid.UUID) -> FileBase:
-        file_obj = self.db.get_file_by_id(file_id)
+    async def get_file_object(self, file_id: uuid.UUID) -> FileBase:
+        file_obj = await self.db.get_file_by_id(file_id)
         return FileBase.model_validate(file_obj)
 
-    async def upload_file(self, file: UploadFile) -> str:
+    async def is_chunk_stored(self, chunk_hash: str) -> bool:
+        if chunk_hash in self.known_chunks:
+            return True
+        async with self._db_lock:
+            exists = await self.db.chunk_exists(chunk_hash)
+        if exists:
+            self.known_chunks.add(chunk_hash)
+            return True
+        return False
+
+    async def _store_chunk(self, chunk: bytes | memoryview) -> StoredChunk:
+        async with self._hash_slots:
+            s3_key = await self.hasher.hash(chunk)
+        meta = ChunkBase(hash=s3_key, size=len(chunk))
+        if s3_key in self._scheduled:
+            return StoredChunk(meta=meta, deduplicated=True)
+
+        self._scheduled.add(s3_key)
+        if await self.is_chunk_stored(s3_key):
+            return StoredChunk(meta=meta, deduplicated=True)
+
+        payload = chunk
+        if self.compressor is not None:
+            payload, meta.codec = await self.compressor.compress(chunk)
+            if meta.codec is not None:
+                meta.stored_size = len(payload)
+
+        if self.packer is not None and len(payload) <= settings.PACK_CHUNK_MAX_SIZE:
+            meta.pack_key, meta.pack_offset = await self.packer.add(payload)
+            return StoredChunk(meta=meta, deduplicated=False)
+
+        await self.s3.upload_chunk(chunk=payload, key=s3_key)
+        return StoredChunk(meta=meta, deduplicated=False)
+
+    async def _get_directory(self, directory_id: uuid.UUID) -> File:
+        directory = await self.db.get_file_by_id(directory_id)
+        if directory is None:
+            raise FileNotFoundError(f"Directory {directory_id} not found")
+        if directory.file_type != FileType.DIRECTORY:
+            raise NotADirectoryError(f"{directory_id} is not a directory")
+        return directory
+
+    async def _new_file(
+        self,
+        name: str,
+        version_of: uuid.UUID | None = None,
+        parent_id: uuid.UUID | None = None,
+    ) -> FileBase:
+        """
+        Describe the file row of an upload, as the next version of ``version_of`` if given.
+
+        A new version keeps the file's name and directory and only records its
+        own list of chunks: unchanged chunks deduplicate against the earlier versions.
+        """
+        if version_of is None:
+            if parent_id is not None:
+                await self._get_directory(parent_id)
+            return FileBase(name=name, parent_id=parent_id)
+
+        previous = await self.db.get_file_by_id(version_of)
+        if previous is None:
+            raise FileNotFoundError(f"File {version_of} not found")
+        origin_id = previous.origin_id or previous.id
+        version = await self.db.get_next_version(origin_id)
+        return FileBase(
+            name=previous.name,
+            parent_id=previous.parent_id,
+            origin_id=origin_id,
+            version=version,
+        )
+
+    async def upload_file(
+        self,
+        file: UploadFile,
+        version_of: uuid.UUID | None = None,
+        parent_id: uuid.UUID | None = None,
+    ) -> UploadResult:
         filename = file.filename or self.get_random_string(20)
         content_type = file.content_type or "application/octet-stream"
 
+        async def readinto(view: memoryview) -> int:
+            return await asyncio.to_thread(file.file.readinto, view)
+
+        file_create = await self._new_file(filename, version_of, parent_id)
+        return await self._upload(file_create, content_type, readinto)
+
+    async def upload_stream(
+        self,
+        filename: str,
+        stream: AsyncIterator[bytes],
+        content_type: str = "application/octet-stream",
+        version_of: uuid.UUID | None = None,
+        parent_id: uuid.UUID | None = None,
+    ) -> UploadResult:
+        """Upload a raw byte stream, e.g. a request body, without spooling it first."""
+        file_create = await self._new_file(filename, version_of, parent_id)
+        return await self._upload(file_create, content_type, StreamReader(stream).readinto)
+
+    async def _upload(
+        self, file_create: FileBase, content_type: str, readinto: ReadInto
+    ) -> UploadResult:
+        """
+        Upload a file as a bounded pipeline of chunks.
+
+        Files of at most ``INLINE_FILE_MAX_SIZE`` bytes skip the pipeline and
+        are stored in their file row instead, with a single INSERT.
+
+        Reading the next chunk overlaps with hashing and uploading of up to
+        ``UPLOAD_MAX_INFLIGHT_CHUNKS`` previous ones. Chunk metadata is recorded
+        strictly in read order, so ``ChunkPerFile.index`` matches the file layout,
+        and written in batches; the last batch commits together with the file's
+        completion. Chunks already in storage are referenced without uploading.
+
+        Chunks are read into buffers of the pool and passed down as views, so
+        an upload holds at most ``UPLOAD_MAX_INFLIGHT_CHUNKS + 2`` buffers (see
+        ``BufferPool``).
+        """
+        if settings.INLINE_FILE_MAX_SIZE:
+            head = memoryview(bytearray(settings.INLINE_FILE_MAX_SIZE + 1))
+            filled = await fill(readinto, head)
+            if filled <= settings.INLINE_FILE_MAX_SIZE:
+                return await self._save_inline(file_create, head[:filled].tobytes(), content_type)
+            readinto = prepend(head, readinto)
+
+        file_obj = await self.db.save_file(file_create)
+        buffer = self._chunk_buffer(file_obj.id)
+        try:
+            size, deduplicated = await self._store_chunks(readinto, buffer)
+            await self.db.set_file_completed(file_obj.id, size=size)
+        except Exception:
+            await self.db.set_file_failed(file_obj.id)
+            raise
+        buffer.publish()
+
+        metrics.inc("upload_files_total")
+        metrics.inc("upload_bytes_total", size)
+        metrics.inc("upload_bytes_deduplicated_total", deduplicated)
+        log.info(
+            f"File uploaded: {file_obj.id}, content_type={content_type}, "
+            f"size={size}, deduplicated={deduplicated}"
+        )
+        return UploadResult(
+            id=file_obj.id,
+            name=file_obj.name,
+            size=size,
+            deduplicated_bytes=deduplicated,
+            version=file_obj.version,
+        )
+
+    def _chunk_buffer(self, file_id: uuid.UUID) -> ChunkBuffer:
+        return ChunkBuffer(
+            db=self.db,
+            file_id=file_id,
+            known_chunks=self.known_chunks,
+            db_lock=self._db_lock,
+            max_rows=settings.CHUNK_FLUSH_ROWS,
+            interval_ms=settings.CHUNK_FLUSH_INTERVAL_MS,
+        )
+
+    async def _store_chunks(self, readinto: ReadInto, buffer: ChunkBuffer) -> tuple[int, int]:
+        """
+        Store the chunks of ``readinto`` and record them through ``buffer``.
+
+        The last rows are flushed without a commit, to be committed with the
+        file's completion. Returns the file size and the deduplicated bytes.
+        """
         index = 0
+        size = 0
+        deduplicated = 0
+        in_flight: deque[asyncio.Task[StoredChunk]] = deque()
+        chunks = self.chunker.split(readinto, self.buffers)
 
         try:
-            file_obj = self.db.save_file(file_create=FileCreate(name=filename))
-            file_id = file_obj.id
+            eof = False
+            while not eof or in_flight:
+                if not eof and len(in_flight) < settings.UPLOAD_MAX_INFLIGHT_CHUNKS:
+                    if chunk := await anext(chunks, None):
+                        task = asyncio.create_task(self._store_chunk(chunk))
+                        # Also runs for tasks cancelled before they started.
+                        task.add_done_callback(lambda _, chunk=chunk: self.buffers.release(chunk))
+                        in_flight.append(task)
+                    else:
+                        eof = True
+                    continue
 
-            while chunk := await file.read(settings.CHUNK_SIZE):
-                s3_key = self.get_chunk_hash(chunk)
-                await self.s3.upload_chunk(chunk=chunk, key=s3_key)
-                self.db.save_chunk(file_id=file_id, chunk_hash=s3_key, index=index)
+                stored = await in_flight.popleft()
+                await buffer.add(stored, index)
                 index += 1
+                size += stored.meta.size
+                deduplicated += stored.meta.size if stored.deduplicated else 0
 
             if index == 0:
-                self.db.set_file_failed(file_id)
                 raise ValueError("Empty file upload is not allowed")
-
-            self.db.set_file_completed(file_id)
-            log.info(f"File uploaded: {file_id}, content_type={content_type}")
-            return str(file_id)
+            await buffer.flush(commit=False)
+            return size, deduplicated
 
         except Exception:
-            try:
-                self.db.set_file_failed(file_id)
-            finally:
-                pass
+            # In-flight chunks are let finish rather than cancelled: a cancelled
+            # PUT may still have stored its object, and a task cancelled in the
+            # middle of a query would leave the shared session unusable.
+            results = await asyncio.gather(*in_flight, return_exceptions=True)
+            await buffer.discard(
+                [r.meta for r in results if isinstance(r, StoredChunk) and not r.deduplicated]
+            )
             raise
 
+        finally:
+            await chunks.aclose()
+
+    async def upload_batch(
+        self, files: Sequence[UploadFile], parent_id: uuid.UUID | None = None
+    ) -> list[BatchUploadResult]:
+        """
+        Upload many files at once, amortizing per-file database round trips.
+
+        All file rows are created with one INSERT; files small enough to be
+        stored inline are complete with it. The others are chunked one after
+        another like single uploads, committing their chunk rows per flush, so
+        reference count locks are held no longer than by a single upload. Only
+        their completion is deferred and committed ``BATCH_COMMIT_FILES`` files
+        at a time. A file that fails is marked failed and reported in its
+        result, without affecting the rest of the batch.
+        """
+        if parent_id is not None:
+            await self._get_directory(parent_id)
+
+        file_creates = []
+        for file in files:
+            file_create = FileBase(
+                name=file.filename or self.get_random_string(20), parent_id=parent_id
+            )
+            if file.size is not None and 0 < file.size <= settings.INLINE_FILE_MAX_SIZE:
+                content = await file.read()
+                inline = {"content": content, "size": len(content), "is_ready": True}
+                file_create = file_create.model_copy(update=inline)
+            file_creates.append(file_create)
+        file_objs = await self.db.save_files(file_creates)
+
+        results: list[BatchUploadResult] = []
+        completed: list[tuple[uuid.UUID, int]] = []
+        for file, file_obj in zip(files, file_objs):
+            if file_obj.is_ready:
+                results.append(
+                    BatchUploadResult(id=file_obj.id, name=file_obj.name, size=file_obj.size)
+                )
+                continue
+
+            async def readinto(view: memoryview, file: UploadFile = file) -> int:
+                return await asyncio.to_thread(file.file.readinto, view)
+
+            buffer = self._chunk_buffer(file_obj.id)
+            try:
+                size, deduplicated = await self._store_chunks(readinto, buffer)
+                # The last rows, which a single upload commits with its completion.
+                await self.db.commit()
+            except Exception as e:
+                log.warning(f"Batch member failed: {file_obj.id}: {e!r}")
+                # Unflushed chunks of the member were never recorded. A broken
+                # session fails here again and aborts the batch.
+                self._scheduled.clear()
+                await self.db.set_file_failed(file_obj.id)
+                results.append(
+                    BatchUploadResult(id=file_obj.id, name=file_obj.name, size=0, error=str(e))
+                )
+                continue
+            buffer.publish()
+
+            completed.append((file_obj.id, size))
+            results.append(
+                BatchUploadResult(
+                    id=file_obj.id, name=file_obj.name, size=size, deduplicated_bytes=deduplicated
+                )
+            )
+            if len(completed) >= settings.BATCH_COMMIT_FILES:
+                await self._complete_files(completed)
+        await self._complete_files(completed)
+
+        uploaded = [result for result in results if result.error is None]
+        metrics.inc("upload_files_total", len(uploaded))
+        metrics.inc("upload_bytes_total", sum(result.size for result in uploaded))
+        metrics.inc(
+            "upload_bytes_deduplicated_total",
+            sum(result.deduplicated_bytes for result in uploaded),
+        )
+        log.info(f"Batch uploaded: files={len(uploaded)}, failed={len(results) - len(uploaded)}")
+        return results
+
+    async def _complete_files(self, completed: list[tuple[uuid.UUID, int]]) -> None:
+        """Mark files whose chunks are committed as completed, in one transaction."""
+        for file_id, size in completed:
+            await self.db.set_file_completed(file_id, size=size, commit=False)
+        await self.db.commit()
+        completed.clear()
+
+    async def _save_inline(
+        self, file_create: FileBase, content: bytes, content_type: str
+    ) -> UploadResult:
+        if not content:
+            raise ValueError("Empty file upload is not allowed")
+        inline = {"content": content, "size": len(content), "is_ready": True}
+        file_obj = await self.db.save_file(file_create.model_copy(update=inline))
+        metrics.inc("upload_files_total")
+        metrics.inc("upload_files_inline_total")
+        metrics.inc("upload_bytes_total", len(content))
+        log.info(
+            f"File uploaded inline: {file_obj.id}, content_type={content_type}, "
+            f"size={len(content)}"
+        )
+        return UploadResult(
+            id=file_obj.id, name=file_obj.name, size=len(content), version=file_obj.version
+        )
+
+    async def create_directory(self, name: str, parent_id: uuid.UUID | None = None) -> FileEntry:
+        if parent_id is not None:
+            await self._get_directory(parent_id)
+        directory = await self.db.save_file(
+            FileBase(name=name, parent_id=parent_id, file_type=FileType.DIRECTORY, is_ready=True)
+        )
+        log.info(f"Directory created: {directory.id}")
+        return FileEntry.model_validate(directory)
+
+    async def move_file(self, file_id: uuid.UUID, parent_id: uuid.UUID | None) -> FileEntry:
+        """Move a file with all of its versions, or a directory with its subtree."""
+        file_obj = await self.db.get_file_by_id(file_id)
+        if file_obj is None:
+            raise FileNotFoundError(f"File {file_id} not found")
+        parent = None
+        if parent_id is not None:
+            parent = await self._get_directory(parent_id)
+            if parent.subtree_path.startswith(file_obj.subtree_path):
+                raise ValueError("A directory cannot be moved into itself")
+
+        await self.db.move_file(file_obj, parent)
+        file_obj.parent_id = parent_id
+        log.info(f"File moved: {file_id}, parent_id={parent_id}")
+        return FileEntry.model_validate(file_obj)
+
+    async def rename_file(self, file_id: uuid.UUID, name: str) -> FileVersion:
+        """Rename a file; the name is shared by all of its versions."""
+        file_obj = await self.db.get_file_by_id(file_id)
+        if file_obj is None:
+            raise FileNotFoundError(f"File {file_id} not found")
+        await self.db.rename_file(file_obj.origin_id or file_obj.id, name)
+        file_obj.name = name
+        log.info(f"File renamed: {file_id}")
+        return FileVersion.model_validate(file_obj)
+
+    async def delete_file(self, file_id: uuid.UUID, all_versions: bool = False) -> int:
+        """
+        Delete a file version, or every version of the file.
+
+        Only rows are deleted here: chunks no other file references are
+        reclaimed by the garbage collector. Returns the number of versions deleted.
+        """
+        file_obj = await self.db.get_file_by_id(file_id)
+        if file_obj is None:
+            raise FileNotFoundError(f"File {file_id} not found")
+        if file_obj.file_type == FileType.DIRECTORY and await self.db.has_children(file_id):
+            raise DirectoryNotEmpty(f"Directory {file_id} is not empty")
+        if all_versions:
+            versions = await self.db.get_file_versions(file_obj.origin_id or file_obj.id)
+            file_ids = [version.id for version in versions]
+        else:
+            file_ids = [file_id]
+
+        for version_id in file_ids:
+            await self.db.delete_file(version_id, commit=version_id == file_ids[-1])
+        metrics.inc("deleted_files_total", len(file_ids))
+        return len(file_ids)
+
+    async def create_upload_session(
+        self,
+        name: str,
+        chunk_count: int,
+        version_of: uuid.UUID | None = None,
+        parent_id: uuid.UUID | None = None,
+    ) -> UploadSessionStatus:
+        """
+        Start a resumable upload of ``chunk_count`` chunks.
+
+        The client then PUTs chunks by index in any order (and concurrently),
+        checks ``get_upload_session`` for missing ones after a dropped
+        connection, and finally calls ``commit_upload_session``.
+        """
+        file_obj = await self.db.save_file(await self._new_file(name, version_of, parent_id))
+        await self.db.save_upload_session(
+            UploadSessionBase(file_id=file_obj.id, chunk_count=chunk_count)
+        )
+        log.info(f"Upload session created: {file_obj.id}, chunks={chunk_count}")
+        return UploadSessionStatus(
+            id=file_obj.id,
+            name=file_obj.name,
+            chunk_count=chunk_count,
+            missing=list(range(chunk_count)),
+        )
+
+    async def get_upload_session(self, file_id: uuid.UUID) -> UploadSessionStatus:
+        upload = await self.db.get_upload_session(file_id)
+        if upload is None:
+            raise UploadSessionNotFound(f"No upload session for file {file_id}")
+        filename = await self.db.get_filename_by_id(file_id)
+        received = set(await self.db.get_chunk_indices(file_id))
+        missing = [index for index in range(upload.chunk_count) if index not in received]
+        return UploadSessionStatus(
+            id=file_id, name=filename, chunk_count=upload.chunk_count, missing=missing
+        )
+
+    async def put_session_chunk(
+        self, file_id: uuid.UUID, index: int, chunk: bytes
+    ) -> SessionChunk:
+        """
+        Store chunk ``index`` of an upload session.
+
+        Re-sending an index replaces the earlier chunk, so retries are safe;
+        chunks already in storage are only referenced.
+        """
+        upload = await self.db.get_upload_session(file_id)
+        if upload is None:
+            raise UploadSessionNotFound(f"No upload session for file {file_id}")
+        if not 0 <= index < upload.chunk_count:
+            raise ValueError(f"Chunk index {index} is out of range 0..{upload.chunk_count - 1}")
+        if not chunk:
+            raise ValueError("Empty chunks are not allowed")
+
+        stored = await self._store_chunk(chunk)
+        if not stored.deduplicated:
+            await self.db.register_chunks([stored.meta], commit=False)
+        await self.db.replace_chunks(file_id, [(stored.meta.hash, index)])
+        self.known_chunks.add(stored.meta.hash)
+
+        metrics.inc("upload_bytes_total", stored.meta.size)
+        if stored.deduplicated:
+            metrics.inc("upload_bytes_deduplicated_total", stored.meta.size)
+        return SessionChunk(
+            index=index,
+            hash=stored.meta.hash,
+            size=stored.meta.size,
+            deduplicated=stored.deduplicated,
+        )
+
+    async def find_missing_chunks(self, hashes: Sequence[str]) -> list[str]:
+        """
+        Return the hashes, out of ``hashes``, that storage does not hold yet.
+
+        Clients chunk and hash locally (with the server's chunking settings)
+        and then send only these, instead of the whole file.
+        """
+        unknown = [h for h in dict.fromkeys(hashes) if h not in self.known_chunks]
+        stored = await self.db.get_stored_hashes(unknown)
+        for chunk_hash in stored:
+            self.known_chunks.add(chunk_hash)
+        return [h for h in unknown if h not in stored]
+
+    async def put_session_manifest(
+        self, file_id: uuid.UUID, hashes: Sequence[str]
+    ) -> UploadSessionStatus:
+        """
+        Declare the hash of every chunk of an upload session, in order.
+
+        Chunks already in storage are attached right away; the returned
+        status lists the indices the client still has to PUT.
+        """
+        upload = await self.db.get_upload_session(file_id)
+        if upload is None:
+            raise UploadSessionNotFound(f"No upload session for file {file_id}")
+        if len(hashes) != upload.chunk_count:
+            raise ValueError(f"Expected {upload.chunk_count} hashes, got {len(hashes)}")
+
+        missing = set(await self.find_missing_chunks(hashes))
+        known = [(h, index) for index, h in enumerate(hashes) if h not in missing]
+        await self.db.replace_chunks(file_id, known)
+        metrics.inc("negotiated_chunks_total", len(hashes))
+        metrics.inc("negotiated_chunks_skipped_total", len(known))
+        return await self.get_upload_session(file_id)
+
+    async def commit_upload_session(self, file_id: uuid.UUID) -> UploadResult:
+        """Mark the file ready once every chunk of its session has arrived."""
+        upload = await self.get_upload_session(file_id)
+        if upload.missing:
+            raise UploadIncomplete(upload.missing)
+
+        manifest = await self.db.get_file_manifest(file_id)
+        size = sum(chunk.size for chunk in manifest)
+        await self.db.delete_upload_session(file_id, commit=False)
+        await self.db.set_file_completed(file_id, size=size)
+        metrics.inc("upload_files_total")
+        log.info(f"Upload session committed: {file_id}, size={size}")
+        return UploadResult(id=file_id, name=upload.name, size=size)
+
     async def stream_file(self, file_id: uuid.UUID) -> AsyncGenerator[bytes, None]:
-        chunks = self.db.get_file_chunks(file_id)
+        chunks = await self.db.get_file_chunks(file_id)
 
         if not chunks:
             raise FileNotFoundError(f"No chunks for file {file_id}")
@@ -0,0 +1,173 @@
+"""Strategies for splitting an upload into chunks."""
+
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Protocol
+
+from pyfastcdc import FastCDC
+
+from app.core.config import settings
+from app.services.buffers import BufferPool
+
+
+# Fills the given buffer as far as possible, returns the number of bytes read (0 at EOF).
+ReadInto = Callable[[memoryview], Awaitable[int]]
+
+
+class Chunker(Protocol):
+    max_size: int
+
+    def split(self, readinto: ReadInto, pool: BufferPool) -> AsyncGenerator[memoryview, None]:
+        """
+        Yield chunks as views of buffers from ``pool``; the caller releases
+        each of them back to the pool once the chunk is stored.
+        """
+        ...
+
+
+async def fill(readinto: ReadInto, view: memoryview) -> int:
+    filled = 0
+    while filled < len(view) and (n := await readinto(view[filled:])):
+        filled += n
+    return filled
+
+
+def prepend(head: memoryview, readinto: ReadInto) -> ReadInto:
+    """Return a ``ReadInto`` that reads ``head`` before reading from ``readinto``."""
+    offset = 0
+
+    async def read(view: memoryview) -> int:
+        nonlocal offset
+        if offset == len(head):
+            return await readinto(view)
+        n = min(len(view), len(head) - offset)
+        view[:n] = head[offset : offset + n]
+        offset += n
+        return n
+
+    return read
+
+
+class StreamReader:
+    """
+    Adapts an async byte stream, such as ``Request.stream()``, to ``ReadInto``.
+
+    Network parts (typically 64KB) are copied straight into the caller's
+    chunk buffer, so a chunk is never rebuilt by concatenating parts.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes]):
+        self._stream = stream
+        self._pending = memoryview(b"")
+
+    async def readinto(self, view: memoryview) -> int:
+        filled = 0
+        while filled < len(view):
+            if not self._pending:
+                part = await anext(self._stream, None)
+                if part is None:
+                    break
+                self._pending = memoryview(part)
+            n = min(len(view) - filled, len(self._pending))
+            view[filled : filled + n] = self._pending[:n]
+            self._pending = self._pending[n:]
+            filled += n
+        return filled
+
+
+class FixedSizeChunker:
+    """Cuts the input every ``size`` bytes."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    @property
+    def max_size(self) -> int:
+        return self.size
+
+    async def split(self, readinto: ReadInto, pool: BufferPool) -> AsyncGenerator[memoryview, None]:
+        while True:
+            buffer = await pool.acquire()
+            try:
+                filled = await fill(readinto, memoryview(buffer)[: self.size])
+            except BaseException:
+                pool.release(buffer)
+                raise
+            if not filled:
+                pool.release(buffer)
+                return
+            yield memoryview(buffer)[:filled]
+
+
+class FastCDCChunker:
+    """
+    Content-defined chunking (FastCDC with normalized chunking).
+
+    A rolling Gear hash over the data picks cut points, so boundaries follow
+    content instead of offsets: inserting bytes only changes the chunks
+    around the edit and later chunks still deduplicate. Chunk sizes stay
+    within ``min_size..max_size`` and cluster around ``avg_size``.
+
+    The scan is pyfastcdc's compiled implementation of the FastCDC 2020
+    paper with its standard Gear table, so any client using the same sizes
+    reproduces the same cuts. It releases the GIL and runs in a worker
+    thread. Each chunk is a view of a pooled buffer. An upload keeps a spare
+    buffer reserved: the bytes after a cut, up to ``max_size - min_size``,
+    are copied to its start and reading continues there, and a new spare is
+    acquired once the chunk has been handed on.
+    """
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int):
+        if not 0 < min_size < avg_size < max_size:
+            raise ValueError("FastCDC requires 0 < min_size < avg_size < max_size")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self._cdc = FastCDC(avg_size, min_size=min_size, max_size=max_size)
+
+    def cut_point(self, data: bytes | bytearray | memoryview) -> int:
+        """Length of the first chunk in ``data`` (all of it if no cut is found)."""
+        if len(data) <= self.min_size:
+            return len(data)
+        return next(iter(self._cdc.cut_buf(data))).length
+
+    async def split(self, readinto: ReadInto, pool: BufferPool) -> AsyncGenerator[memoryview, None]:
+        buffer: bytearray | None
+        spare: bytearray | None
+        buffer, spare = await pool.acquire_pair()
+        filled = 0
+        eof = False
+        try:
+            while True:
+                view = memoryview(buffer)
+                if not eof and filled < self.max_size:
+                    n = await fill(readinto, view[filled : self.max_size])
+                    eof = filled + n < self.max_size
+                    filled += n
+                if not filled:
+                    return
+
+                cut = await asyncio.to_thread(self.cut_point, view[:filled])
+                # The bytes after the cut move to the spare, which reads on
+                # while the chunk is handed on.
+                carry = filled - cut
+                spare[:carry] = view[cut:filled]
+                buffer, spare = spare, None
+                yield view[:cut]
+                if eof and not carry:
+                    return
+                spare = await pool.acquire()
+                filled = carry
+        finally:
+            for held in (buffer, spare):
+                if held is not None:
+                    pool.release(held)
+
+
+def get_chunker() -> Chunker:
+    if settings.CHUNKING_MODE == "fastcdc":
+        return FastCDCChunker(
+            min_size=settings.CDC_MIN_SIZE,
+            avg_size=settings.CDC_AVG_SIZE,
+            max_size=settings.CDC_MAX_SIZE,
+        )
+    return FixedSizeChunker(settings.CHUNK_SIZE)
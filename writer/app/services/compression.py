@@ -0,0 +1,77 @@
+import asyncio
+import math
+from collections import Counter
+from typing import Literal
+
+import lz4.frame
+import zstandard
+
+from app.core.config import settings
+
+
+Codec = Literal["zstd", "lz4"]
+
+
+def sample_entropy(chunk: bytes, sample_size: int) -> float:
+    """
+    Shannon entropy, in bits per byte, of up to three ``sample_size`` windows
+    taken from the start, middle and end of ``chunk``.
+    """
+    if len(chunk) <= 3 * sample_size:
+        sample = chunk
+    else:
+        middle = (len(chunk) - sample_size) // 2
+        sample = b"".join(
+            (chunk[:sample_size], chunk[middle : middle + sample_size], chunk[-sample_size:])
+        )
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(n / total * math.log2(n / total) for n in Counter(sample).values())
+
+
+class ChunkCompressor:
+    """
+    Compresses chunks before they are written to S3.
+
+    Chunks are hashed before compression, so their CAS identity stays the
+    plaintext hash whatever codec stored them. Chunks whose sampled entropy
+    exceeds ``max_entropy`` (media, archives, encrypted data) are stored as-is
+    without trying, and so are chunks that compress by less than
+    ``min_savings``. Both zstd and lz4 release the GIL, so compression runs
+    in a worker thread.
+    """
+
+    SAMPLE_SIZE = 4 * 1024
+
+    def __init__(self, codec: Codec, level: int, max_entropy: float, min_savings: float):
+        self.codec = codec
+        self.level = level
+        self.max_entropy = max_entropy
+        self.min_savings = min_savings
+
+    def _compress(self, chunk: bytes) -> bytes:
+        if self.codec == "zstd":
+            # ZstdCompressor instances are not thread-safe, one per call.
+            return zstandard.ZstdCompressor(level=self.level).compress(chunk)
+        return lz4.frame.compress(chunk, compression_level=self.level)
+
+    async def compress(self, chunk: bytes) -> tuple[bytes, Codec | None]:
+        """Return the bytes to store and the codec they were compressed with."""
+        if sample_entropy(chunk, self.SAMPLE_SIZE) > self.max_entropy:
+            return chunk, None
+        compressed = await asyncio.to_thread(self._compress, chunk)
+        if len(compressed) > len(chunk) * (1 - self.min_savings):
+            return chunk, None
+        return compressed, self.codec
+
+
+def get_compressor() -> ChunkCompressor | None:
+    if settings.COMPRESSION == "none":
+        return None
+    return ChunkCompressor(
+        codec=settings.COMPRESSION,
+        level=settings.COMPRESSION_LEVEL,
+        max_entropy=settings.COMPRESSION_MAX_ENTROPY,
+        min_savings=settings.COMPRESSION_MIN_SAVINGS,
+    )
@@ -1,55 +1,350 @@
 import logging
+from collections import Counter
+from datetime import datetime
 from typing import Sequence
 import uuid
-from sqlmodel import Session, select, col
+from sqlalchemy import bindparam, delete, func, insert, literal, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.schemas.models import FileCreate, ChunkPerFileBase
-from app.schemas.orm import File, ChunkPerFile
+from app.schemas.models import (
+    ChunkBase,
+    ChunkPerFileBase,
+    FileCreate,
+    FileType,
+    UploadSessionBase,
+)
+from app.schemas.orm import File, ChunkPerFile, Chunk, UploadSession, utcnow
 
 
 log = logging.getLogger(__name__)
 
+# Keeps statements below the bind parameter limits of asyncpg and SQLite.
+MAX_BATCH_ROWS = 1000
+# Inserts of a new file version before giving up on a contended number.
+VERSION_ATTEMPTS = 5
+
 
 class FileRepository:
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    def save_file(self, file_create: FileCreate) -> File:
-        file_obj = File.model_validate(file_create)
-        self.session.add(file_obj)
-        self.session.commit()
-        self.session.refresh(file_obj)
+    async def save_file(self, file_create: FileCreate) -> File:
+        """
+        Insert a file row. A new version of a file whose number another upload
+        took in the meantime is renumbered and inserted again.
+        """
+        for attempt in range(1, VERSION_ATTEMPTS + 1):
+            try:
+                # A savepoint, so a conflict leaves the rest of the session intact.
+                async with self.session.begin_nested():
+                    (file_obj,) = await self._add_files([file_create])
+                break
+            except IntegrityError:
+                origin_id = getattr(file_create, "origin_id", None)
+                if origin_id is None or attempt == VERSION_ATTEMPTS:
+                    raise
+                version = await self.get_next_version(origin_id)
+                log.info(f"PgSQL version taken, retrying: origin_id={origin_id}, version={version}")
+                file_create = file_create.model_copy(update={"version": version})
+        await self.session.commit()
         return file_obj
 
-    def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None:
+    async def save_files(self, file_creates: Sequence[FileCreate]) -> list[File]:
+        """Insert file rows in one transaction; the INSERTs are batched by SQLAlchemy."""
+        file_objs = await self._add_files(file_creates)
+        await self.session.commit()
+        return file_objs
+
+    async def _add_files(self, file_creates: Sequence[FileCreate]) -> list[File]:
+        file_objs = [File.model_validate(file_create) for file_create in file_creates]
+        parents: dict[uuid.UUID, File] = {}
+        for file_obj in file_objs:
+            file_obj.origin_id = file_obj.origin_id or file_obj.id
+            if file_obj.parent_id is not None:
+                if file_obj.parent_id not in parents:
+                    parents[file_obj.parent_id] = await self.session.get(File, file_obj.parent_id)
+                file_obj.path = parents[file_obj.parent_id].subtree_path
+        self.session.add_all(file_objs)
+        await self.session.flush()
+        return file_objs
+
+    async def commit(self) -> None:
+        await self.session.commit()
+
+    async def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None:
         chunk_create = ChunkPerFileBase(
             file_id=file_id, chunk_hash=chunk_hash, index=index
         )
         chunk_obj = ChunkPerFile.model_validate(chunk_create)
         self.session.add(chunk_obj)
-        self.session.commit()
+        await self.session.commit()
+
+    async def chunk_exists(self, chunk_hash: str) -> bool:
+        """
+        Check whether a chunk is stored, before referencing it instead of uploading.
+
+        An unreferenced chunk is touched, which keeps the garbage collector
+        away from it for a grace period, enough to record the new reference.
+        """
+        statement = select(Chunk.refcount).where(Chunk.hash == chunk_hash)
+        refcount = (await self.session.exec(statement)).first()
+        if refcount is None:
+            return False
+        if refcount == 0:
+            return chunk_hash in await self._touch_unreferenced([chunk_hash])
+        return True
 
-    def get_file_by_id(self, file_id: uuid.UUID) -> File | None:
+    async def _touch_unreferenced(self, hashes: Sequence[str]) -> set[str]:
+        """
+        Touch unreferenced chunks and return the hashes still present.
+
+        A chunk the garbage collector deleted since it was looked up is gone
+        and must be stored again rather than referenced. Once touched, a
+        concurrent collection re-checks ``touched_at`` and keeps the row.
+
+        The touch is committed right away: callers remember the hashes in
+        ``KnownChunks`` for up to ``DEDUP_CACHE_TTL_S``, whether or not the
+        request goes on to commit a reference.
+        """
+        if not hashes:
+            return set()
+        result = await self.session.exec(
+            update(Chunk)
+            .where(col(Chunk.hash).in_(hashes))
+            .values(touched_at=utcnow())
+            .returning(col(Chunk.hash))
+        )
+        touched = set(result.scalars().all())
+        await self.session.commit()
+        return touched
+
+    async def _add_references(self, counts: Counter[str]) -> None:
+        """
+        Adjust ``Chunk.refcount`` by ``counts`` (negative to release).
+
+        Either way ``touched_at`` is reset, so a chunk released now is only
+        collected a grace period later. Rows are updated in hash order to
+        avoid lock-order deadlocks between concurrent uploads.
+        """
+        if not counts:
+            return
+        table = Chunk.__table__
+        statement = (
+            update(table)
+            .where(table.c.hash == bindparam("b_hash"))
+            .values(refcount=table.c.refcount + bindparam("b_delta"), touched_at=utcnow())
+        )
+        params = [{"b_hash": h, "b_delta": counts[h]} for h in sorted(counts) if counts[h]]
+        if params:
+            await self.session.exec(statement, params=params)
+
+    async def release_file_chunks(self, file_id: uuid.UUID, commit: bool = True) -> None:
+        """Drop all chunk references of a file."""
+        result = await self.session.exec(
+            delete(ChunkPerFile)
+            .where(col(ChunkPerFile.file_id) == file_id)
+            .returning(col(ChunkPerFile.chunk_hash))
+        )
+        released = Counter(result.scalars().all())
+        await self._add_references(Counter({h: -n for h, n in released.items()}))
+        if commit:
+            await self.session.commit()
+
+    async def save_chunks(
+        self,
+        file_id: uuid.UUID,
+        chunks: Sequence[tuple[str, int]],
+        commit: bool = True,
+    ) -> None:
+        """
+        Insert ``(chunk_hash, index)`` rows for a file with multi-row INSERTs
+        of up to ``MAX_BATCH_ROWS`` rows.
+
+        With ``commit=False`` the rows stay in the current transaction, e.g. to
+        be committed together with ``set_file_completed``.
+        """
+        for start in range(0, len(chunks), MAX_BATCH_ROWS):
+            rows = [
+                {"file_id": file_id, "chunk_hash": chunk_hash, "index": index}
+                for chunk_hash, index in chunks[start : start + MAX_BATCH_ROWS]
+            ]
+            await self.session.exec(insert(ChunkPerFile).values(rows))
+        await self._add_references(Counter(chunk_hash for chunk_hash, _ in chunks))
+        if commit:
+            await self.session.commit()
+
+    async def replace_chunks(
+        self, file_id: uuid.UUID, chunks: Sequence[tuple[str, int]], commit: bool = True
+    ) -> None:
+        """Point ``(chunk_hash, index)`` rows of a file at new hashes, replacing earlier rows."""
+        for start in range(0, len(chunks), MAX_BATCH_ROWS):
+            batch = chunks[start : start + MAX_BATCH_ROWS]
+            result = await self.session.exec(
+                delete(ChunkPerFile)
+                .where(
+                    col(ChunkPerFile.file_id) == file_id,
+                    col(ChunkPerFile.index).in_([index for _, index in batch]),
+                )
+                .returning(col(ChunkPerFile.chunk_hash))
+            )
+            released = Counter(result.scalars().all())
+            await self._add_references(Counter({h: -n for h, n in released.items()}))
+            await self.save_chunks(file_id, batch, commit=False)
+        if commit:
+            await self.session.commit()
+
+    async def get_chunk_indices(self, file_id: uuid.UUID) -> list[int]:
+        statement = select(ChunkPerFile.index).where(ChunkPerFile.file_id == file_id)
+        return list((await self.session.exec(statement)).all())
+
+    async def get_stored_hashes(self, hashes: Sequence[str]) -> set[str]:
+        """Return the subset of ``hashes`` with a stored chunk object, touching unreferenced ones."""
+        stored: set[str] = set()
+        for start in range(0, len(hashes), MAX_BATCH_ROWS):
+            batch = hashes[start : start + MAX_BATCH_ROWS]
+            statement = select(Chunk.hash, Chunk.refcount).where(col(Chunk.hash).in_(batch))
+            rows = (await self.session.exec(statement)).all()
+            touched = await self._touch_unreferenced([h for h, refcount in rows if refcount == 0])
+            stored.update(h for h, refcount in rows if refcount or h in touched)
+        return stored
+
+    async def register_chunks(self, chunks: Sequence[ChunkBase], commit: bool = True) -> None:
+        """Record stored chunk objects, ignoring already known hashes."""
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        for start in range(0, len(chunks), MAX_BATCH_ROWS):
+            statement = (
+                dialect.insert(Chunk)
+                .values(
+                    [
+                        {**chunk.model_dump(), "refcount": 0, "touched_at": utcnow()}
+                        for chunk in chunks[start : start + MAX_BATCH_ROWS]
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["hash"])
+            )
+            await self.session.exec(statement)
+        if commit:
+            await self.session.commit()
+
+    async def get_file_by_id(self, file_id: uuid.UUID) -> File | None:
         statement = select(File).where(File.id == file_id)
-        file_obj = self.session.exec(statement).first()
+        file_obj = (await self.session.exec(statement)).first()
         return file_obj
 
-    def get_filename_by_id(self, file_id: uuid.UUID) -> str:
+    async def get_file_versions(self, origin_id: uuid.UUID) -> Sequence[File]:
+        statement = (
+            select(File)
+            # Files stored before versioning have no ``origin_id``.
+            .where(or_(col(File.origin_id) == origin_id, col(File.id) == origin_id))
+            .order_by(col(File.version).asc())
+        )
+        return (await self.session.exec(statement)).all()
+
+    async def get_next_version(self, origin_id: uuid.UUID) -> int:
+        statement = select(func.max(File.version)).where(
+            # Files stored before versioning have no ``origin_id``.
+            or_(col(File.origin_id) == origin_id, col(File.id) == origin_id)
+        )
+        return ((await self.session.exec(statement)).one() or 0) + 1
+
+    async def rename_file(self, origin_id: uuid.UUID, name: str) -> None:
+        """Rename a file, i.e. every version of it."""
+        await self.session.exec(
+            update(File)
+            .where(or_(col(File.origin_id) == origin_id, col(File.id) == origin_id))
+            .values(name=name)
+        )
+        await self.session.commit()
+
+    async def move_file(self, file_obj: File, parent: File | None) -> None:
+        """
+        Move a file, i.e. every version of it, or a directory into ``parent``.
+
+        Moving a directory rewrites the ``path`` prefix of its whole subtree
+        with a single range update.
+        """
+        origin_id = file_obj.origin_id or file_obj.id
+        path = parent.subtree_path if parent else "/"
+        # Read before the update below refreshes ``file_obj.path``.
+        old_prefix = file_obj.subtree_path
+        await self.session.exec(
+            update(File)
+            .where(or_(col(File.origin_id) == origin_id, col(File.id) == origin_id))
+            .values(parent_id=parent.id if parent else None, path=path)
+        )
+        if file_obj.file_type == FileType.DIRECTORY:
+            new_prefix = f"{path}{file_obj.id}/"
+            await self.session.exec(
+                update(File)
+                .where(col(File.path).startswith(old_prefix))
+                .values(
+                    path=literal(new_prefix).concat(
+                        func.substr(col(File.path), len(old_prefix) + 1)
+                    )
+                )
+            )
+        await self.session.commit()
+
+    async def has_children(self, directory_id: uuid.UUID) -> bool:
+        statement = select(File.id).where(File.parent_id == directory_id).limit(1)
+        return (await self.session.exec(statement)).first() is not None
+
+    async def delete_file(self, file_id: uuid.UUID, commit: bool = True) -> None:
+        """Delete one file version; its chunks are left to the garbage collector."""
+        await self.release_file_chunks(file_id, commit=False)
+        await self.delete_upload_session(file_id, commit=False)
+        await self.session.exec(delete(File).where(col(File.id) == file_id))
+        if commit:
+            await self.session.commit()
+        log.info(f"PgSQL file deleted: file_id='{file_id}'")
+
+    async def get_filename_by_id(self, file_id: uuid.UUID) -> str:
         statement = select(File.name).where(File.id == file_id)
-        filename = self.session.exec(statement).one()
+        filename = (await self.session.exec(statement)).one()
         return filename
 
-    def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]:
+    async def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]:
         statement = (
             select(ChunkPerFile)
             .where(ChunkPerFile.file_id == file_id)
             .order_by(col(ChunkPerFile.index).asc())
         )
-        chunks = self.session.exec(statement).all()
+        chunks = (await self.session.exec(statement)).all()
         return chunks
 
-    def set_file_failed(self, file_id: uuid.UUID) -> None:
-        file_obj = self.session.get(File, file_id)
+    async def get_file_manifest(self, file_id: uuid.UUID) -> list[ChunkBase]:
+        """Return the file's chunks (hash, size, location), in file order."""
+        statement = (
+            select(Chunk)
+            .join(ChunkPerFile, col(ChunkPerFile.chunk_hash) == col(Chunk.hash))
+            .where(ChunkPerFile.file_id == file_id)
+            .order_by(col(ChunkPerFile.index).asc())
+        )
+        chunks = (await self.session.exec(statement)).all()
+        return [ChunkBase.model_validate(chunk) for chunk in chunks]
+
+    async def save_upload_session(self, upload: UploadSessionBase) -> UploadSession:
+        upload_obj = UploadSession.model_validate(upload)
+        self.session.add(upload_obj)
+        await self.session.commit()
+        await self.session.refresh(upload_obj)
+        return upload_obj
+
+    async def get_upload_session(self, file_id: uuid.UUID) -> UploadSession | None:
+        return await self.session.get(UploadSession, file_id)
+
+    async def delete_upload_session(self, file_id: uuid.UUID, commit: bool = True) -> None:
+        await self.session.exec(
+            delete(UploadSession).where(col(UploadSession.file_id) == file_id)
+        )
+        if commit:
+            await self.session.commit()
+
+    async def set_file_failed(self, file_id: uuid.UUID, commit: bool = True) -> None:
+        file_obj = await self.session.get(File, file_id)
         if not file_obj:
             log.info(f"PgSQL file not found: file_id={file_id}")
             return
@@ -57,17 +352,59 @@ class FileRepository:
         if hasattr(file_obj, "is_ready"):
             file_obj.is_ready = False
         self.session.add(file_obj)
-        self.session.commit()
+        await self.release_file_chunks(file_id, commit=False)
+        if commit:
+            await self.session.commit()
         log.info(f"PgSQL set file failed: file_id='{file_id}'")
 
-    def set_file_completed(self, file_id: uuid.UUID) -> None:
-        file_obj = self.session.get(File, file_id)
+    async def set_file_completed(
+        self, file_id: uuid.UUID, size: int | None = None, commit: bool = True
+    ) -> None:
+        file_obj = await self.session.get(File, file_id)
         if not file_obj:
             log.info(f"PgSQL file not found: file_id={file_id}")
             return
         
         if hasattr(file_obj, "is_ready"):
             file_obj.is_ready = True
+        if size is not None:
+            file_obj.size = size
         self.session.add(file_obj)
-        self.session.commit()
+        if commit:
+            await self.session.commit()
         log.info(f"PgSQL set file completed: file_id='{file_id}'")
+
+    async def get_expired_upload_sessions(self, before: datetime, limit: int) -> list[uuid.UUID]:
+        statement = (
+            select(UploadSession.file_id)
+            .where(col(UploadSession.created_at) < before)
+            .limit(limit)
+        )
+        return list((await self.session.exec(statement)).all())
+
+    async def collect_unreferenced_chunks(self, before: datetime, limit: int) -> list[ChunkBase]:
+        """
+        Delete up to ``limit`` chunk rows unreferenced and untouched since ``before``.
+
+        The conditions are repeated on the DELETE itself: a concurrent upload
+        that references or touches a candidate first wins, and the row is
+        re-checked and kept. Returns the deleted chunks, whose objects are
+        then removed from S3.
+        """
+        unreferenced = (col(Chunk.refcount) == 0, col(Chunk.touched_at) < before)
+        candidates = select(Chunk.hash).where(*unreferenced).limit(limit)
+        result = await self.session.exec(
+            delete(Chunk)
+            .where(col(Chunk.hash).in_(candidates), *unreferenced)
+            .returning(*(Chunk.__table__.c[name] for name in ChunkBase.model_fields))
+        )
+        chunks = [ChunkBase.model_validate(row._mapping) for row in result.all()]
+        await self.session.commit()
+        return chunks
+
+    async def get_live_pack_keys(self, pack_keys: Sequence[str]) -> set[str]:
+        """Return the pack objects, out of ``pack_keys``, still holding a known chunk."""
+        if not pack_keys:
+            return set()
+        statement = select(Chunk.pack_key).where(col(Chunk.pack_key).in_(pack_keys)).distinct()
+        return set((await self.session.exec(statement)).all())
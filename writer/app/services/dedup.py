@@ -0,0 +1,41 @@
+import time
+from collections import OrderedDict
+
+
+class KnownChunks:
+    """
+    Process-wide LRU of chunk hashes confirmed to exist in S3.
+
+    It fronts the ``chunk`` table so repeated chunks skip both the S3 PUT and
+    the database lookup. Only positive answers are cached: a miss always falls
+    back to the database, so a cold or evicted entry costs a query, never a
+    lost chunk.
+
+    Entries expire ``ttl`` seconds after they were confirmed. The garbage
+    collector only deletes chunks untouched for longer than its grace period,
+    so with a shorter ``ttl`` a cached hash never outlives its chunk.
+    """
+
+    def __init__(self, capacity: int, ttl: float | None = None) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self._hashes: OrderedDict[str, float] = OrderedDict()
+
+    def __contains__(self, chunk_hash: str) -> bool:
+        added_at = self._hashes.get(chunk_hash)
+        if added_at is None:
+            return False
+        if self.ttl is not None and time.monotonic() - added_at > self.ttl:
+            del self._hashes[chunk_hash]
+            return False
+        self._hashes.move_to_end(chunk_hash)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, chunk_hash: str) -> None:
+        self._hashes[chunk_hash] = time.monotonic()
+        self._hashes.move_to_end(chunk_hash)
+        while len(self._hashes) > self.capacity:
+            self._hashes.popitem(last=False)
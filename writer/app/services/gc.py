@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Callable
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.metrics import metrics
+from app.services.db import FileRepository
+from app.services.ports import Database, S3
+
+
+log = getLogger(__name__)
+
+
+class ChunkCollector:
+    """
+    Background garbage collector for chunk objects no file references.
+
+    ``Chunk.refcount`` counts the ChunkPerFile rows pointing at a chunk. A
+    pass first drops upload sessions older than ``session_ttl_s``, releasing
+    their chunks, then deletes chunk rows that have been unreferenced and
+    untouched for ``grace_period_s`` and removes their objects with S3
+    DeleteObjects. Pack objects are deleted once none of their chunks is left.
+
+    Uploads in progress are protected by the grace period: a chunk an upload
+    decides to reuse is touched first, and its reference is recorded well
+    within the grace period. Rows are deleted before objects, so a crash in
+    between leaks an object rather than losing a referenced one.
+
+    Chunks are deleted ``batch_size`` at a time with ``batch_pause_ms`` in
+    between, so a large backlog does not starve foreground I/O.
+    """
+
+    def __init__(
+        self,
+        s3: S3,
+        grace_period_s: int,
+        batch_size: int,
+        batch_pause_ms: int,
+        interval_s: int,
+        session_ttl_s: int,
+    ):
+        self.s3 = s3
+        self.grace_period = timedelta(seconds=grace_period_s)
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause_ms / 1000
+        self.interval = interval_s
+        self.session_ttl = timedelta(seconds=session_ttl_s)
+
+    async def expire_upload_sessions(self, db: Database) -> int:
+        before = datetime.now(timezone.utc) - self.session_ttl
+        expired = await db.get_expired_upload_sessions(before, self.batch_size)
+        for file_id in expired:
+            await db.delete_upload_session(file_id, commit=False)
+            await db.set_file_failed(file_id)
+            log.info(f"Upload session expired: {file_id}")
+        return len(expired)
+
+    async def collect(self, db: Database) -> int:
+        """Run one pass; returns the number of chunks deleted."""
+        await self.expire_upload_sessions(db)
+
+        before = datetime.now(timezone.utc) - self.grace_period
+        deleted = 0
+        while chunks := await db.collect_unreferenced_chunks(before, self.batch_size):
+            packs = {chunk.pack_key for chunk in chunks if chunk.pack_key is not None}
+            dead_packs = packs - await db.get_live_pack_keys(sorted(packs))
+            keys = [chunk.hash for chunk in chunks if chunk.pack_key is None]
+            await self.s3.delete_chunks(keys + sorted(dead_packs))
+
+            deleted += len(chunks)
+            metrics.inc("gc_chunks_deleted_total", len(chunks))
+            freed = sum(c.stored_size or c.size for c in chunks if c.pack_key is None)
+            metrics.inc("gc_bytes_freed_total", freed)
+            log.info(f"GC deleted {len(chunks)} chunks and {len(dead_packs)} packs")
+            if len(chunks) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return deleted
+
+    async def run(self, session_factory: Callable[[], AsyncSession]) -> None:
+        while True:
+            try:
+                async with session_factory() as session:
+                    await self.collect(FileRepository(session))
+            except Exception:
+                log.exception("GC pass failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,40 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+def sha256_hexdigest(chunk: bytes) -> str:
+    return hashlib.sha256(chunk).hexdigest()
+
+
+class ChunkHasher:
+    """
+    Computes chunk hashes on a thread pool instead of the event loop.
+
+    hashlib releases the GIL while hashing large buffers, so several chunks
+    (from one or many uploads) are hashed in parallel across CPU cores while
+    the loop keeps serving other requests. Chunks smaller than
+    ``INLINE_MAX_BYTES`` are hashed inline, where a thread hop costs more
+    than the hash itself.
+
+    Without ``workers`` the event loop's default executor is used.
+    """
+
+    INLINE_MAX_BYTES = 64 * 1024
+
+    def __init__(self, workers: int | None = None):
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk-hash")
+            if workers
+            else None
+        )
+
+    async def hash(self, chunk: bytes) -> str:
+        if len(chunk) <= self.INLINE_MAX_BYTES:
+            return sha256_hexdigest(chunk)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, sha256_hexdigest, chunk)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,87 @@
+import asyncio
+import uuid
+from logging import getLogger
+from typing import NamedTuple
+
+from app.services.ports import S3
+
+
+log = getLogger(__name__)
+
+
+class PackLocation(NamedTuple):
+    key: str
+    offset: int
+
+
+class Pack:
+    def __init__(self, key: str):
+        self.key = key
+        self.data = bytearray()
+        self.stored: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class PackWriter:
+    """
+    Appends small chunks from all uploads of a worker into shared pack objects.
+
+    Storing every small chunk as its own S3 object floods MinIO with tiny
+    objects; instead chunks are concatenated into ``packs/<id>`` objects and
+    located by ``(pack_key, pack_offset, size)``. A pack is written once it
+    reaches ``target_size`` or ``max_delay_ms`` after its first chunk, and
+    ``add`` returns only after the pack holding the chunk is stored.
+    """
+
+    KEY_PREFIX = "packs/"
+
+    def __init__(self, s3: S3, target_size: int, max_delay_ms: int):
+        self.s3 = s3
+        self.target_size = target_size
+        self.max_delay = max_delay_ms / 1000
+        self._current: Pack | None = None
+        self._uploads: set[asyncio.Task[None]] = set()
+
+    async def add(self, chunk: bytes) -> PackLocation:
+        pack = self._current or self._open()
+        offset = len(pack.data)
+        pack.data += chunk
+        if len(pack.data) >= self.target_size:
+            self._seal(pack)
+
+        # Shielded: a cancelled upload must not cancel the pack for the others.
+        await asyncio.shield(pack.stored)
+        return PackLocation(key=pack.key, offset=offset)
+
+    def _open(self) -> Pack:
+        pack = Pack(key=f"{self.KEY_PREFIX}{uuid.uuid4().hex}")
+        pack.timer = asyncio.get_running_loop().call_later(self.max_delay, self._seal, pack)
+        self._current = pack
+        return pack
+
+    def _seal(self, pack: Pack) -> None:
+        if self._current is not pack:
+            return
+        self._current = None
+        if pack.timer is not None:
+            pack.timer.cancel()
+        task = asyncio.create_task(self._upload(pack))
+        self._uploads.add(task)
+        task.add_done_callback(self._uploads.discard)
+
+    async def _upload(self, pack: Pack) -> None:
+        try:
+            await self.s3.upload_chunk(chunk=bytes(pack.data), key=pack.key)
+        except Exception as e:
+            log.exception(f"Failed to store pack: {pack.key}")
+            pack.stored.set_exception(e)
+            # Waiters may all be gone already; don't warn about it.
+            pack.stored.exception()
+            return
+        pack.stored.set_result(None)
+        log.info(f"Pack stored: key={pack.key}, size={len(pack.data)}")
+
+    async def close(self) -> None:
+        if self._current is not None:
+            self._seal(self._current)
+        await asyncio.gather(*self._uploads, return_exceptions=True)
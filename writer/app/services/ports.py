@@ -1,25 +1,64 @@
 import uuid
+from datetime import datetime
 from typing import AsyncGenerator, Protocol, Sequence
 
-from app.schemas.models import FileCreate
-from app.schemas.orm import File, ChunkPerFile
+from app.schemas.models import FileCreate, ChunkBase, UploadSessionBase
+from app.schemas.orm import File, ChunkPerFile, UploadSession
 
 
 class Database(Protocol):
-    def save_file(self, file_create: FileCreate) -> File: ...
-    def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None: ...
-    def get_file_by_id(self, file_id: uuid.UUID) -> File | None: ...
-    def get_filename_by_id(self, file_id: uuid.UUID) -> str: ...
-    def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]: ...
-    def set_file_failed(self, file_id: uuid.UUID) -> None: ...
-    def set_file_completed(self, file_id: uuid.UUID) -> None: ...
+    async def save_file(self, file_create: FileCreate) -> File: ...
+    async def save_files(self, file_creates: Sequence[FileCreate]) -> list[File]: ...
+    async def commit(self) -> None: ...
+    async def save_chunk(self, file_id: uuid.UUID, chunk_hash: str, index: int) -> None: ...
+    async def chunk_exists(self, chunk_hash: str) -> bool: ...
+    async def get_stored_hashes(self, hashes: Sequence[str]) -> set[str]: ...
+    async def save_chunks(
+        self, file_id: uuid.UUID, chunks: Sequence[tuple[str, int]], commit: bool = True
+    ) -> None: ...
+    async def replace_chunks(
+        self, file_id: uuid.UUID, chunks: Sequence[tuple[str, int]], commit: bool = True
+    ) -> None: ...
+    async def get_chunk_indices(self, file_id: uuid.UUID) -> list[int]: ...
+    async def register_chunks(self, chunks: Sequence[ChunkBase], commit: bool = True) -> None: ...
+    async def get_file_by_id(self, file_id: uuid.UUID) -> File | None: ...
+    async def get_file_versions(self, origin_id: uuid.UUID) -> Sequence[File]: ...
+    async def get_next_version(self, origin_id: uuid.UUID) -> int: ...
+    async def rename_file(self, origin_id: uuid.UUID, name: str) -> None: ...
+    async def move_file(self, file_obj: File, parent: File | None) -> None: ...
+    async def has_children(self, directory_id: uuid.UUID) -> bool: ...
+    async def delete_file(self, file_id: uuid.UUID, commit: bool = True) -> None: ...
+    async def get_filename_by_id(self, file_id: uuid.UUID) -> str: ...
+    async def get_file_chunks(self, file_id: uuid.UUID) -> Sequence[ChunkPerFile]: ...
+    async def get_file_manifest(self, file_id: uuid.UUID) -> list[ChunkBase]: ...
+    async def save_upload_session(self, upload: UploadSessionBase) -> UploadSession: ...
+    async def get_upload_session(self, file_id: uuid.UUID) -> UploadSession | None: ...
+    async def delete_upload_session(self, file_id: uuid.UUID, commit: bool = True) -> None: ...
+    async def release_file_chunks(self, file_id: uuid.UUID, commit: bool = True) -> None: ...
+    async def set_file_failed(self, file_id: uuid.UUID, commit: bool = True) -> None: ...
+    async def set_file_completed(
+        self, file_id: uuid.UUID, size: int | None = None, commit: bool = True
+    ) -> None: ...
+    async def get_expired_upload_sessions(
+        self, before: datetime, limit: int
+    ) -> list[uuid.UUID]: ...
+    async def collect_unreferenced_chunks(
+        self, before: datetime, limit: int
+    ) -> list[ChunkBase]: ...
+    async def get_live_pack_keys(self, pack_keys: Sequence[str]) -> set[str]: ...
 
 
 class S3(Protocol):
-    async def upload_chunk(self, chunk: bytes, key: str) -> None: ...
-    def get_chunk_stream(self, *, key: str) -> AsyncGenerator[bytes, None]: ...
+    async def upload_chunk(self, chunk: bytes | memoryview, key: str) -> None: ...
+    async def delete_chunks(self, keys: Sequence[str]) -> None: ...
+    async def get_object_size(self, key: str) -> int: ...
+    def get_chunk_stream(
+        self, *, key: str, start: int | None = None, end: int | None = None
+    ) -> AsyncGenerator[bytes, None]: ...
 
 
 class S3Like(Protocol):
     async def put_object(self, *, Bucket: str, Key: str, Body: bytes) -> dict: ...
-    async def get_object(self, *, Bucket: str, Key: str) -> dict: ...
+    async def get_object(self, *, Bucket: str, Key: str, Range: str = ...) -> dict: ...
+    async def delete_objects(self, *, Bucket: str, Delete: dict) -> dict: ...
+    async def head_object(self, *, Bucket: str, Key: str) -> dict: ...
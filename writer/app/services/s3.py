@@ -1,5 +1,5 @@
 import asyncio
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Sequence
 from aiobotocore.session import get_session, AioSession
 from aiohttp import ClientError
 from botocore.config import Config
@@ -12,6 +12,9 @@ from app.core.config import settings
 
 log = getLogger(__name__)
 
+# DeleteObjects accepts at most 1000 keys per request.
+DELETE_BATCH_SIZE = 1000
+
 
 class S3ClientManager:
     def __init__(
@@ -66,16 +69,25 @@ class FileStreamer:
         self._manager = manager or S3ClientManager()
         self.bucket = bucket or settings.AWS_BUCKET_NAME
 
-    async def upload_chunk(self, chunk: bytes, key: str, attempts: int = 3) -> None:
+    async def upload_chunk(
+        self, chunk: bytes | memoryview, key: str, attempts: int = 3
+    ) -> None:
         client = self._manager.get_client()
         delay = 0.1
+        body = chunk
+        if isinstance(chunk, memoryview):
+            # botocore only takes bytes/bytearray bodies: a view covering its
+            # whole buffer is sent as that buffer, shorter ones are copied. That
+            # is the last chunk of a file, or nearly every content-defined one.
+            full = chunk.nbytes == len(chunk.obj)
+            body = chunk.obj if full else chunk.tobytes()
 
         for attempt in range(1, attempts + 1):
             try:
                 await client.put_object(
                     Bucket=settings.AWS_BUCKET_NAME,
                     Key=key,
-                    Body=chunk,
+                    Body=body,
                 )
                 return
             except ClientError as e:
@@ -86,6 +98,26 @@ class FileStreamer:
                 await asyncio.sleep(delay)
                 delay *= 2
     
+    async def delete_chunks(self, keys: Sequence[str]) -> None:
+        """Delete objects with DeleteObjects, up to 1000 keys per request."""
+        client = self._manager.get_client()
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start : start + DELETE_BATCH_SIZE]
+            response = await client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            for error in response.get("Errors", []):
+                log.warning(
+                    f"S3 delete_objects failed: key={error.get('Key')}, "
+                    f"code={error.get('Code')}"
+                )
+
+    async def get_object_size(self, key: str) -> int:
+        client = self._manager.get_client()
+        response = await client.head_object(Bucket=self.bucket, Key=key)
+        return response["ContentLength"]
+
     async def _maybe_close_io(self, body):
         try:
             close = getattr(body, "close", None)
@@ -97,13 +129,27 @@ class FileStreamer:
         except Exception:
             pass
 
-    async def get_chunk_stream(self, *, key: str, attempts: int = 3) -> AsyncGenerator[bytes, None]:
+    async def get_chunk_stream(
+            self,
+            *,
+            key: str,
+            start: int | None = None,
+            end: int | None = None,
+            attempts: int = 3,
+        ) -> AsyncGenerator[bytes, None]:
+        """
+        Stream a chunk object, or only bytes ``start..end`` (inclusive) of it
+        through a ranged GET when a bound is given.
+        """
         client = self._manager.get_client()
         delay = 0.1
+        extra = {}
+        if start is not None or end is not None:
+            extra["Range"] = f"bytes={start or 0}-{'' if end is None else end}"
 
         for attempt in range(1, attempts + 1):
             try:
-                response = await client.get_object(Bucket=self.bucket, Key=key)
+                response = await client.get_object(Bucket=self.bucket, Key=key, **extra)
                 body = response["Body"]
 
                 try:
@@ -0,0 +1,135 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.schemas.orm import Chunk
+from app.services.hashing import sha256_hexdigest
+from app.tests.conftest import FakeS3
+
+
+def upload(client: TestClient, name: str, data: bytes, **params: str):
+    return client.put(
+        f"/api/v1/upload/{name}",
+        content=data,
+        params=params,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+
+@pytest.mark.anyio
+async def test_new_version_shares_unchanged_chunks(
+    client: TestClient, s3: FakeS3, repo, monkeypatch
+):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    first = upload(client, "backup.tar", b"aaaabbbbcccc").json()
+
+    response = upload(client, "ignored", b"aaaaxxxxcccc", version_of=first["id"])
+
+    assert response.status_code == 200
+    second = response.json()
+    assert (second["name"], second["version"]) == ("backup.tar", 2)
+    assert second["deduplicated_bytes"] == 8
+    assert len(s3.objects) == 4
+    versions = await repo.get_file_versions(uuid.UUID(first["id"]))
+    assert [(str(v.id), v.version) for v in versions] == [(first["id"], 1), (second["id"], 2)]
+
+    # Versioning a later version extends the same history.
+    third = upload(client, "x", b"aaaa", version_of=second["id"]).json()
+    assert third["version"] == 3
+
+
+@pytest.mark.anyio
+async def test_version_of_unknown_file(client: TestClient, s3: FakeS3):
+    response = upload(client, "f", b"data", version_of=str(uuid.uuid4()))
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_rename_renames_all_versions(client: TestClient, s3: FakeS3, repo):
+    first = upload(client, "old.txt", b"one").json()
+    second = upload(client, "old.txt", b"two", version_of=first["id"]).json()
+
+    response = client.patch(f"/api/v1/files/{second['id']}", json={"name": "new.txt"})
+
+    assert response.status_code == 200
+    assert (response.json()["name"], response.json()["version"]) == ("new.txt", 2)
+    versions = await repo.get_file_versions(uuid.UUID(first["id"]))
+    assert [v.name for v in versions] == ["new.txt", "new.txt"]
+    assert client.patch(f"/api/v1/files/{uuid.uuid4()}", json={"name": "x"}).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_delete_releases_chunks(client: TestClient, s3: FakeS3, repo, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    first = upload(client, "f", b"aaaabbbb").json()
+    second = upload(client, "f", b"aaaacccc", version_of=first["id"]).json()
+
+    response = client.delete(f"/api/v1/files/{first['id']}")
+
+    assert response.status_code == 204
+    assert await repo.get_file_by_id(uuid.UUID(first["id"])) is None
+    refcounts = {
+        data: (await repo.session.get(Chunk, sha256_hexdigest(data))).refcount
+        for data in (b"aaaa", b"bbbb", b"cccc")
+    }
+    assert refcounts == {b"aaaa": 1, b"bbbb": 0, b"cccc": 1}
+
+    response = client.delete(f"/api/v1/files/{second['id']}", params={"all_versions": True})
+    assert response.status_code == 204
+    assert await repo.get_file_versions(uuid.UUID(first["id"])) == []
+    assert client.delete(f"/api/v1/files/{second['id']}").status_code == 404
+
+
+def mkdir(client: TestClient, name: str, parent_id: str | None = None) -> dict:
+    response = client.post("/api/v1/directories", json={"name": name, "parent_id": parent_id})
+    assert response.status_code == 201
+    return response.json()
+
+
+@pytest.mark.anyio
+async def test_move_directory_rewrites_subtree_paths(client: TestClient, s3: FakeS3, repo):
+    a = mkdir(client, "a")
+    b = mkdir(client, "b", a["id"])
+    c = mkdir(client, "c")
+    file = upload(client, "f", b"data", parent_id=b["id"]).json()
+    assert (await repo.get_file_by_id(uuid.UUID(file["id"]))).path == f"/{a['id']}/{b['id']}/"
+
+    response = client.post(f"/api/v1/files/{a['id']}/move", json={"parent_id": c["id"]})
+
+    assert response.status_code == 200
+    assert response.json()["parent_id"] == c["id"]
+    moved = await repo.get_file_by_id(uuid.UUID(file["id"]))
+    assert moved.path == f"/{c['id']}/{a['id']}/{b['id']}/"
+    assert moved.parent_id == uuid.UUID(b["id"])
+
+    response = client.post(f"/api/v1/files/{c['id']}/move", json={"parent_id": b["id"]})
+    assert response.status_code == 400
+    response = client.post(f"/api/v1/files/{a['id']}/move", json={"parent_id": file["id"]})
+    assert response.status_code == 400
+
+    response = client.post(f"/api/v1/files/{a['id']}/move", json={"parent_id": None})
+    assert response.status_code == 200
+    assert (await repo.get_file_by_id(uuid.UUID(file["id"]))).path == f"/{a['id']}/{b['id']}/"
+
+
+@pytest.mark.anyio
+async def test_new_version_stays_in_directory(client: TestClient, s3: FakeS3, repo):
+    directory = mkdir(client, "docs")
+    first = upload(client, "f", b"one", parent_id=directory["id"]).json()
+    second = upload(client, "f", b"two", version_of=first["id"]).json()
+
+    file = await repo.get_file_by_id(uuid.UUID(second["id"]))
+    assert (file.parent_id, file.path) == (uuid.UUID(directory["id"]), f"/{directory['id']}/")
+    assert upload(client, "f", b"x", parent_id=str(uuid.uuid4())).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_delete_directory_must_be_empty(client: TestClient, s3: FakeS3):
+    directory = mkdir(client, "d")
+    file = upload(client, "f", b"data", parent_id=directory["id"]).json()
+
+    assert client.delete(f"/api/v1/files/{directory['id']}").status_code == 409
+    assert client.delete(f"/api/v1/files/{file['id']}").status_code == 204
+    assert client.delete(f"/api/v1/files/{directory['id']}").status_code == 204
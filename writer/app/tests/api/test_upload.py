@@ -0,0 +1,150 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services.hashing import sha256_hexdigest
+from app.tests.conftest import FakeS3
+
+
+def put_chunk(client: TestClient, file_id: str, index: int, data: bytes):
+    return client.put(
+        f"/api/v1/uploads/{file_id}/chunks/{index}",
+        content=data,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+
+@pytest.mark.anyio
+async def test_resumable_upload(client: TestClient, s3: FakeS3):
+    response = client.post("/api/v1/uploads", json={"name": "file.bin", "chunk_count": 3})
+    assert response.status_code == 201
+    session = response.json()
+    file_id = session["id"]
+    assert session["missing"] == [0, 1, 2]
+
+    assert put_chunk(client, file_id, 2, b"cccc").status_code == 200
+    assert put_chunk(client, file_id, 0, b"aaaa").status_code == 200
+    assert client.get(f"/api/v1/uploads/{file_id}").json()["missing"] == [1]
+
+    response = client.post(f"/api/v1/uploads/{file_id}/commit")
+    assert response.status_code == 409
+    assert response.json()["detail"]["missing"] == [1]
+
+    # A retried chunk replaces the earlier one.
+    put_chunk(client, file_id, 1, b"xxxx")
+    response = put_chunk(client, file_id, 1, b"aaaa")
+    assert response.json() == {
+        "index": 1,
+        "hash": sha256_hexdigest(b"aaaa"),
+        "size": 4,
+        "deduplicated": True,
+    }
+
+    response = client.post(f"/api/v1/uploads/{file_id}/commit")
+    assert response.status_code == 200
+    assert response.json()["size"] == 12
+    assert client.get(f"/api/v1/uploads/{file_id}").status_code == 404
+
+
+@pytest.mark.anyio
+async def test_upload_session_rejects_bad_chunks(client: TestClient, s3: FakeS3):
+    file_id = client.post("/api/v1/uploads", json={"name": "f", "chunk_count": 1}).json()["id"]
+
+    assert put_chunk(client, file_id, 1, b"a").status_code == 400
+    assert put_chunk(client, file_id, 0, b"").status_code == 400
+    missing = "00000000-0000-0000-0000-000000000000"
+    assert put_chunk(client, missing, 0, b"a").status_code == 404
+
+
+@pytest.mark.anyio
+async def test_negotiated_upload_sends_only_new_chunks(client: TestClient, s3: FakeS3):
+    first = client.post("/api/v1/uploads", json={"name": "v1", "chunk_count": 2}).json()["id"]
+    put_chunk(client, first, 0, b"aaaa")
+    put_chunk(client, first, 1, b"bbbb")
+    client.post(f"/api/v1/uploads/{first}/commit")
+    hashes = [sha256_hexdigest(data) for data in (b"aaaa", b"cccc", b"bbbb")]
+
+    response = client.post("/api/v1/chunks/missing", json={"hashes": hashes})
+    assert response.json() == {"hashes": [hashes[1]]}
+
+    second = client.post("/api/v1/uploads", json={"name": "v2", "chunk_count": 3}).json()["id"]
+    response = client.put(f"/api/v1/uploads/{second}/manifest", json={"hashes": hashes})
+    assert response.json()["missing"] == [1]
+    put_chunk(client, second, 1, b"cccc")
+
+    response = client.post(f"/api/v1/uploads/{second}/commit")
+    assert response.json()["size"] == 12
+    assert len(s3.objects) == 3
+
+
+@pytest.mark.anyio
+async def test_negotiation_validates_hashes(client: TestClient, s3: FakeS3):
+    file_id = client.post("/api/v1/uploads", json={"name": "f", "chunk_count": 2}).json()["id"]
+    valid = sha256_hexdigest(b"a")
+
+    assert client.post("/api/v1/chunks/missing", json={"hashes": ["../x"]}).status_code == 422
+    response = client.put(f"/api/v1/uploads/{file_id}/manifest", json={"hashes": [valid]})
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_raw_stream_upload(client: TestClient, s3: FakeS3, repo, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+
+    def body():
+        yield b"aaa"
+        yield b"abbbbc"
+
+    response = client.put(
+        "/api/v1/upload/notes.txt",
+        content=body(),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["name"], result["size"]) == ("notes.txt", 9)
+    chunks = await repo.get_file_chunks(file_id=uuid.UUID(result["id"]))
+    assert [s3.objects[c.chunk_hash] for c in chunks] == [b"aaaa", b"bbbb", b"c"]
+
+
+@pytest.mark.anyio
+async def test_raw_stream_upload_requires_octet_stream(client: TestClient, s3: FakeS3):
+    response = client.put("/api/v1/upload/f", json={"a": 1})
+    assert response.status_code == 415
+    response = client.put(
+        "/api/v1/upload/f", content=b"", headers={"Content-Type": "application/octet-stream"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_batch_upload(client: TestClient, s3: FakeS3, repo, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "BATCH_COMMIT_FILES", 2)
+    monkeypatch.setattr(settings, "INLINE_FILE_MAX_SIZE", 2)
+    files = [
+        ("files", ("a.txt", b"aaaabbbb")),
+        ("files", ("empty.txt", b"")),
+        ("files", ("b.txt", b"bbbbcc")),
+        ("files", ("tiny.txt", b"t")),
+    ]
+
+    response = client.post("/api/v1/upload/batch", files=files)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [(r["name"], r["size"], r["error"] is None) for r in results] == [
+        ("a.txt", 8, True),
+        ("empty.txt", 0, False),
+        ("b.txt", 6, True),
+        ("tiny.txt", 1, True),
+    ]
+    assert results[2]["deduplicated_bytes"] == 4
+    assert len(s3.objects) == 3
+    chunks = await repo.get_file_chunks(file_id=uuid.UUID(results[2]["id"]))
+    assert b"".join(s3.objects[c.chunk_hash] for c in chunks) == b"bbbbcc"
+    assert (await repo.get_file_by_id(uuid.UUID(results[3]["id"]))).content == b"t"
+    assert (await repo.get_file_by_id(uuid.UUID(results[1]["id"]))).is_ready is False
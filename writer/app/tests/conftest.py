@@ -1,33 +1,72 @@
+import asyncio
+import random
 from unittest.mock import AsyncMock, MagicMock
 import pytest
 
 from fastapi.testclient import TestClient
 
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
+from app.api.deps import (
+    get_buffer_pool,
+    get_hasher,
+    get_known_chunks,
+    get_packer,
+    get_streamer,
+)
 from app.core.db import get_db_session
 from app.main import app
 from app.services.db import FileRepository
+from app.services.dedup import KnownChunks
+from app.services.hashing import ChunkHasher
 from app.services.s3 import FileStreamer, S3ClientManager
 
 
-SQLITE_DATABASE_URL = "sqlite://"
+SQLITE_DATABASE_URL = "sqlite+aiosqlite://"
+
+
+class FakeS3:
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def upload_chunk(self, chunk: bytes, key: str) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        self.objects[key] = bytes(chunk)
+        self.in_flight -= 1
+
+    async def delete_chunks(self, keys) -> None:
+        for key in keys:
+            del self.objects[key]
+
+    async def get_object_size(self, key: str) -> int:
+        return len(self.objects[key])
+
+    async def get_chunk_stream(self, *, key: str):
+        yield self.objects[key]
 
 
 @pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
+async def session_fixture():
+    engine = create_async_engine(
         SQLITE_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
     )
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
+    await engine.dispose()
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: AsyncSession):
     def get_session_override():
         return session
     
@@ -38,8 +77,19 @@ def client_fixture(session: Session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def s3():
+    fake = FakeS3()
+    app.dependency_overrides[get_streamer] = lambda: fake
+    app.dependency_overrides[get_known_chunks] = lambda: KnownChunks(100)
+    app.dependency_overrides[get_hasher] = lambda: ChunkHasher()
+    app.dependency_overrides[get_packer] = lambda: None
+    app.dependency_overrides[get_buffer_pool] = lambda: None
+    return fake
+
+
 @pytest.fixture(name="repo")
-def repo_fixture(session: Session):
+def repo_fixture(session: AsyncSession):
     return FileRepository(session)
 
 
@@ -58,4 +108,8 @@ def mock_client():
 
 @pytest.fixture
 def file_streamer(mock_session):
-    return FileStreamer()
\ No newline at end of file
+    return FileStreamer()
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,39 @@
+import pytest
+from botocore.exceptions import ClientError
+from sqlmodel import select
+
+from app.migrations.backfill_chunk_sizes import backfill_chunk_sizes, backfill_file_sizes
+from app.schemas.models import ChunkBase, FileBase, FileCreate
+from app.schemas.orm import Chunk
+from app.services.db import FileRepository
+from app.tests.conftest import FakeS3
+
+
+H1, H2, H3 = (f"{i:064x}" for i in range(1, 4))
+
+
+@pytest.mark.anyio
+async def test_sizes_are_read_from_objects(repo: FileRepository):
+    s3 = FakeS3()
+    s3.objects = {H1: b"0123", H2: b"45"}
+    get_object_size = s3.get_object_size
+
+    async def head(key: str) -> int:
+        if key not in s3.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return await get_object_size(key)
+
+    s3.get_object_size = head
+    # As left by the migration: chunks and the file without sizes.
+    await repo.register_chunks([ChunkBase(hash=h, size=0) for h in (H1, H2, H3)])
+    file = await repo.save_file(FileCreate(name="old.bin"))
+    await repo.save_chunks(file.id, [(H1, 0), (H2, 1), (H1, 2)])
+    inline = await repo.save_file(FileBase(name="inline.bin", content=b"x", size=1))
+
+    assert await backfill_chunk_sizes(repo.session, s3, batch_size=2) == 2
+    await backfill_file_sizes(repo.session)
+
+    chunks = (await repo.session.exec(select(Chunk))).all()
+    assert {c.hash: c.size for c in chunks} == {H1: 4, H2: 2, H3: 0}
+    assert (await repo.get_file_by_id(file.id)).size == 10
+    assert (await repo.get_file_by_id(inline.id)).size == 1
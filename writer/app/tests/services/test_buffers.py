@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.core.metrics import metrics
+from app.services.buffers import BufferPool
+
+
+@pytest.mark.anyio
+async def test_buffers_are_reused():
+    pool = BufferPool(buffer_size=8, max_bytes=64)
+
+    first = await pool.acquire()
+    pool.release(memoryview(first)[:3])
+
+    assert await pool.acquire() is first
+    assert pool.in_use == 1
+
+
+@pytest.mark.anyio
+async def test_acquire_waits_for_release_at_capacity():
+    pool = BufferPool(buffer_size=8, max_bytes=16)
+    before = metrics.snapshot().get("buffer_pool_bytes_in_use", 0)
+    held = [await pool.acquire(), await pool.acquire()]
+    assert metrics.snapshot()["buffer_pool_bytes_in_use"] - before == 16
+
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    pool.release(held[0])
+    assert await asyncio.wait_for(waiter, timeout=1) is held[0]
+
+
+@pytest.mark.anyio
+async def test_waiting_pair_does_not_hold_up_a_single_buffer():
+    pool = BufferPool(buffer_size=8, max_bytes=16)
+    held = await pool.acquire_pair()
+
+    pair = asyncio.create_task(pool.acquire_pair())
+    await asyncio.sleep(0.01)
+    single = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.01)
+
+    pool.release(held[0])
+    assert await asyncio.wait_for(single, timeout=1) is held[0]
+    assert not pair.done()
+
+    pool.release(held[1])
+    pool.release(single.result())
+    assert set(map(id, await asyncio.wait_for(pair, timeout=1))) == set(map(id, held))
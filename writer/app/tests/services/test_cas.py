@@ -0,0 +1,219 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+import zstandard
+from fastapi import UploadFile
+from sqlalchemy import update
+from sqlmodel import select
+
+from app.core.config import settings
+from app.schemas.models import ChunkBase
+from app.schemas.orm import Chunk
+from app.services.cas import FileStorageService
+from app.services.compression import ChunkCompressor
+from app.services.db import FileRepository
+from app.services.dedup import KnownChunks
+from app.services.packing import PackWriter
+from app.tests.conftest import FakeS3
+
+
+def make_upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="file.bin")
+
+
+@pytest.mark.anyio
+async def test_upload_file_keeps_chunk_order(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_INFLIGHT_CHUNKS", 3)
+    monkeypatch.setattr(settings, "CHUNK_FLUSH_ROWS", 4)
+    s3 = FakeS3()
+    fs = FileStorageService(db=repo, s3=s3)
+    data = b"".join(bytes([i]) * 4 for i in range(10))
+
+    result = await fs.upload_file(make_upload(data))
+
+    chunks = await repo.get_file_chunks(file_id=result.id)
+    assert [c.index for c in chunks] == list(range(10))
+    assert b"".join(s3.objects[c.chunk_hash] for c in chunks) == data
+    assert 1 < s3.max_in_flight <= 3
+    assert fs.buffers.in_use == 0
+    assert (await fs.get_file_object(result.id)).is_ready is True
+    assert result.size == len(data)
+
+
+@pytest.mark.anyio
+async def test_upload_file_skips_stored_chunks(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    s3 = FakeS3()
+    s3.upload_chunk = AsyncMock(wraps=s3.upload_chunk)
+    data = b"aaaabbbbaaaacccc"
+
+    first = await FileStorageService(db=repo, s3=s3).upload_file(make_upload(data))
+    assert s3.upload_chunk.await_count == 3
+    assert first.deduplicated_bytes == 4
+
+    second = await FileStorageService(db=repo, s3=s3).upload_file(make_upload(data))
+    assert s3.upload_chunk.await_count == 3
+    assert second.deduplicated_bytes == len(data)
+    assert [c.chunk_hash for c in await repo.get_file_chunks(second.id)] == [
+        c.chunk_hash for c in await repo.get_file_chunks(first.id)
+    ]
+
+
+@pytest.mark.anyio
+async def test_services_share_the_dedup_cache(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    s3 = FakeS3()
+    known_chunks = KnownChunks(10, 600)
+    first = FileStorageService(db=repo, s3=s3, known_chunks=known_chunks)
+    second = FileStorageService(db=repo, s3=s3, known_chunks=known_chunks)
+    assert first.known_chunks is second.known_chunks is known_chunks
+
+    await first.upload_file(make_upload(b"aaaabbbb"))
+
+    assert len(known_chunks) == 2
+    assert all(key in second.known_chunks for key in s3.objects)
+
+
+@pytest.mark.anyio
+async def test_missing_chunk_lookup_commits_its_touch(repo: FileRepository):
+    chunk_hash = "1" * 64
+    await repo.register_chunks([ChunkBase(hash=chunk_hash, size=4)])
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    await repo.session.exec(update(Chunk).values(touched_at=past))
+    await repo.session.commit()
+    fs = FileStorageService(db=repo, s3=FakeS3())
+
+    assert await fs.find_missing_chunks([chunk_hash]) == []
+    # The request ends without a commit of its own.
+    await repo.session.rollback()
+
+    # The hash is cached as stored, so the chunk must stay out of GC's reach.
+    assert chunk_hash in fs.known_chunks
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=30)
+    assert await repo.collect_unreferenced_chunks(cutoff, 10) == []
+
+
+@pytest.mark.anyio
+async def test_upload_empty_file_fails(repo: FileRepository):
+    fs = FileStorageService(db=repo, s3=FakeS3())
+
+    with pytest.raises(ValueError):
+        await fs.upload_file(make_upload(b""))
+
+
+@pytest.mark.anyio
+async def test_failed_upload_registers_stored_chunks(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "CHUNK_FLUSH_ROWS", 100)
+    s3 = FakeS3()
+    upload_chunk = s3.upload_chunk
+    calls = 0
+
+    async def fail_fifth(chunk: bytes, key: str) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 5:
+            raise ConnectionError("S3 is gone")
+        await upload_chunk(chunk, key)
+
+    s3.upload_chunk = fail_fifth
+    fs = FileStorageService(db=repo, s3=s3)
+    data = b"".join(bytes([i]) * 4 for i in range(8))
+
+    with pytest.raises(ConnectionError):
+        await fs.upload_file(make_upload(data))
+
+    # No rows were flushed, yet every stored object is known for GC to collect.
+    chunks = (await repo.session.exec(select(Chunk))).all()
+    assert {c.hash: c.refcount for c in chunks} == {key: 0 for key in s3.objects}
+    assert len(s3.objects) >= 4
+
+
+@pytest.mark.anyio
+async def test_batch_commits_chunk_rows_per_file(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "CHUNK_FLUSH_ROWS", 100)
+    monkeypatch.setattr(settings, "BATCH_COMMIT_FILES", 100)
+    fs = FileStorageService(db=repo, s3=FakeS3())
+    events = []
+    commit, set_file_completed = repo.session.commit, repo.set_file_completed
+
+    async def record_commit():
+        events.append("commit")
+        await commit()
+
+    async def record_completed(file_id, **kwargs):
+        events.append("completed")
+        await set_file_completed(file_id, **kwargs)
+
+    monkeypatch.setattr(repo.session, "commit", record_commit)
+    monkeypatch.setattr(repo, "set_file_completed", record_completed)
+
+    results = await fs.upload_batch([make_upload(b"aaaabbbb"), make_upload(b"ccccdddd")])
+
+    # File rows, then each file's chunk rows on their own, then both completions.
+    assert events == ["commit", "commit", "commit", "completed", "completed", "commit"]
+    for result in results:
+        assert (await repo.get_file_by_id(result.id)).is_ready is True
+
+
+@pytest.mark.anyio
+async def test_small_files_are_stored_inline(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "INLINE_FILE_MAX_SIZE", 10)
+    s3 = FakeS3()
+    fs = FileStorageService(db=repo, s3=s3)
+
+    small = await fs.upload_file(make_upload(b"0123456789"))
+    large = await fs.upload_file(make_upload(b"0123456789a"))
+
+    file = await repo.get_file_by_id(small.id)
+    assert (file.content, file.size, file.is_ready) == (b"0123456789", 10, True)
+    assert await repo.get_file_chunks(small.id) == []
+    chunks = await repo.get_file_chunks(large.id)
+    assert b"".join(s3.objects[c.chunk_hash] for c in chunks) == b"0123456789a"
+    assert (await repo.get_file_by_id(large.id)).content is None
+    with pytest.raises(ValueError):
+        await fs.upload_file(make_upload(b""))
+
+
+@pytest.mark.anyio
+async def test_upload_file_packs_small_chunks(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "PACK_CHUNK_MAX_SIZE", 4)
+    s3 = FakeS3()
+    packer = PackWriter(s3=s3, target_size=1024, max_delay_ms=10)
+    fs = FileStorageService(db=repo, s3=s3, packer=packer)
+    data = b"aaaabbbbaaaacc"
+
+    result = await fs.upload_file(make_upload(data))
+
+    manifest = await repo.get_file_manifest(result.id)
+    (pack_key,) = s3.objects
+    assert pack_key.startswith(PackWriter.KEY_PREFIX)
+    assert {c.pack_key for c in manifest} == {pack_key}
+    pack = s3.objects[pack_key]
+    assert b"".join(
+        pack[c.pack_offset : c.pack_offset + c.size] for c in manifest
+    ) == data
+
+
+@pytest.mark.anyio
+async def test_upload_file_compresses_chunks(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 4096)
+    s3 = FakeS3()
+    compressor = ChunkCompressor(codec="zstd", level=3, max_entropy=7.5, min_savings=0.1)
+    fs = FileStorageService(db=repo, s3=s3, compressor=compressor)
+    data = b"a" * 4096 + os.urandom(4096)
+
+    result = await fs.upload_file(make_upload(data))
+
+    text, noise = await repo.get_file_manifest(result.id)
+    assert (text.codec, text.size, text.stored_size) == ("zstd", 4096, len(s3.objects[text.hash]))
+    assert zstandard.ZstdDecompressor().decompress(s3.objects[text.hash]) == data[:4096]
+    assert (noise.codec, noise.stored_size) == (None, None)
+    assert s3.objects[noise.hash] == data[4096:]
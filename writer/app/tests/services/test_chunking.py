@@ -0,0 +1,118 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+from app.services.buffers import BufferPool
+from app.services.chunking import FastCDCChunker, FixedSizeChunker, StreamReader
+
+
+async def split(chunker, data: bytes) -> list[bytes]:
+    source = io.BytesIO(data)
+    pool = BufferPool(chunker.max_size, max_bytes=0)
+
+    async def readinto(view: memoryview) -> int:
+        return source.readinto(view)
+
+    chunks = []
+    async for chunk in chunker.split(readinto, pool):
+        chunks.append(bytes(chunk))
+        pool.release(chunk)
+    assert pool.in_use == 0
+    return chunks
+
+
+@pytest.mark.anyio
+async def test_fixed_size_chunker():
+    assert await split(FixedSizeChunker(4), b"0123456789") == [b"0123", b"4567", b"89"]
+
+
+@pytest.mark.anyio
+async def test_fastcdc_respects_size_bounds():
+    data = random.Random(1).randbytes(64 * 1024)
+    chunker = FastCDCChunker(min_size=256, avg_size=1024, max_size=4096)
+
+    chunks = await split(chunker, data)
+
+    assert b"".join(chunks) == data
+    assert all(256 <= len(c) <= 4096 for c in chunks[:-1])
+    assert 16 < len(chunks) < 256
+
+
+@pytest.mark.anyio
+async def test_fastcdc_boundaries_survive_insertion():
+    data = random.Random(2).randbytes(64 * 1024)
+    chunker = FastCDCChunker(min_size=256, avg_size=1024, max_size=4096)
+
+    original = await split(chunker, data)
+    edited = await split(chunker, data[:100] + b"!" + data[100:])
+
+    assert len(set(original) & set(edited)) >= len(original) - 2
+
+
+@pytest.mark.anyio
+async def test_stream_reader_regroups_parts():
+    async def parts():
+        for part in (b"ab", b"cdefg", b"", b"h"):
+            yield part
+
+    reader = StreamReader(parts())
+    buffer = bytearray(3)
+
+    reads = []
+    for _ in range(4):
+        n = await reader.readinto(memoryview(buffer))
+        reads.append(bytes(buffer[:n]))
+
+    assert reads == [b"abc", b"def", b"gh", b""]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "chunker",
+    [FixedSizeChunker(4), FastCDCChunker(min_size=256, avg_size=1024, max_size=4096)],
+)
+async def test_closed_split_returns_buffers(chunker):
+    pool = BufferPool(chunker.max_size, max_bytes=0)
+
+    async def readinto(view: memoryview) -> int:
+        view[:] = b"x" * len(view)
+        return len(view)
+
+    chunks = chunker.split(readinto, pool)
+    chunk = await anext(chunks)
+    await chunks.aclose()
+    pool.release(chunk)
+
+    assert pool.in_use == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "chunker",
+    [FixedSizeChunker(64), FastCDCChunker(min_size=256, avg_size=1024, max_size=4096)],
+)
+async def test_more_concurrent_splits_than_buffers(chunker):
+    pool = BufferPool(chunker.max_size, max_bytes=2 * chunker.max_size)
+    data = random.Random(3).randbytes(64 * 1024)
+
+    async def upload() -> bytes:
+        source = io.BytesIO(data)
+
+        async def readinto(view: memoryview) -> int:
+            return source.readinto(view)
+
+        async def store(chunk: memoryview) -> bytes:
+            await asyncio.sleep(0)
+            stored = bytes(chunk)
+            pool.release(chunk)
+            return stored
+
+        tasks = [asyncio.create_task(store(c)) async for c in chunker.split(readinto, pool)]
+        return b"".join(await asyncio.gather(*tasks))
+
+    uploads = await asyncio.wait_for(asyncio.gather(*(upload() for _ in range(5))), timeout=10)
+
+    assert uploads == [data] * 5
+    assert pool.in_use == 0
@@ -0,0 +1,40 @@
+import os
+
+import lz4.frame
+import pytest
+import zstandard
+
+from app.services.compression import ChunkCompressor, sample_entropy
+
+
+def test_sample_entropy():
+    assert sample_entropy(b"a" * 100_000, 4096) == 0
+    assert sample_entropy(bytes(range(256)) * 16, 4096) == 8
+    assert sample_entropy(os.urandom(100_000), 4096) > 7.9
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "codec, decompress",
+    [("zstd", zstandard.ZstdDecompressor().decompress), ("lz4", lz4.frame.decompress)],
+)
+async def test_compress_round_trip(codec, decompress):
+    compressor = ChunkCompressor(codec=codec, level=3, max_entropy=7.5, min_savings=0.1)
+    chunk = b"2024-01-01 INFO request served\n" * 1000
+
+    payload, used = await compressor.compress(chunk)
+
+    assert used == codec
+    assert len(payload) < len(chunk) // 10
+    assert decompress(payload) == chunk
+
+
+@pytest.mark.anyio
+async def test_incompressible_chunks_are_stored_as_is():
+    chunk = os.urandom(64 * 1024)
+    high_entropy = ChunkCompressor(codec="zstd", level=3, max_entropy=7.5, min_savings=0.1)
+    # Passes the entropy check, but compressing gains nothing.
+    low_savings = ChunkCompressor(codec="zstd", level=3, max_entropy=8, min_savings=0.1)
+
+    assert await high_entropy.compress(chunk) == (chunk, None)
+    assert await low_savings.compress(chunk) == (chunk, None)
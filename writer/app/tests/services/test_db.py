@@ -1,18 +1,29 @@
 import uuid
+from datetime import datetime, timedelta, timezone
 
+import pytest
+from sqlalchemy import Select, delete, text, update
+from sqlmodel import select
+
+from app.services import db as db_module
 from app.services.db import FileRepository
-from app.schemas.models import FileCreate
-from app.schemas.orm import File, ChunkPerFile
+from app.schemas.models import FileBase, FileCreate, ChunkBase
+from app.schemas.orm import File, ChunkPerFile, Chunk
+
+
+# Chunk hashes are stored as binary digests, so test hashes must be valid hex.
+H0, H1, H2, H3 = (f"{i:064x}" for i in range(0, 4))
 
 
-def create_file(repo: FileRepository) -> File:
+async def create_file(repo: FileRepository) -> File:
     fc = FileCreate(name="file.txt")
-    return repo.save_file(fc)
+    return await repo.save_file(fc)
 
 
-def test_create_and_retrieve_file(repo: FileRepository):
-    created_file = create_file(repo)
-    retrieved_file = repo.get_file_by_id(file_id=created_file.id)
+@pytest.mark.anyio
+async def test_create_and_retrieve_file(repo: FileRepository):
+    created_file = await create_file(repo)
+    retrieved_file = await repo.get_file_by_id(file_id=created_file.id)
 
     assert created_file.id is not None
     assert retrieved_file is not None
@@ -22,49 +33,205 @@ def test_create_and_retrieve_file(repo: FileRepository):
     assert created_file.is_ready is False
 
 
-def test_get_nonexistent_file_returns_none(repo: FileRepository):
-    assert repo.get_file_by_id(file_id=uuid.uuid4()) is None
+@pytest.mark.anyio
+async def test_get_nonexistent_file_returns_none(repo: FileRepository):
+    assert await repo.get_file_by_id(file_id=uuid.uuid4()) is None
 
 
-def test_file_failed(repo: FileRepository):
+@pytest.mark.anyio
+async def test_file_failed(repo: FileRepository):
     missing_id = uuid.uuid4()
-    repo.set_file_failed(missing_id)
+    await repo.set_file_failed(missing_id)
 
-    missing_file = repo.get_file_by_id(file_id=missing_id)
+    missing_file = await repo.get_file_by_id(file_id=missing_id)
     assert missing_file is None
 
 
-def test_file_completed(repo: FileRepository):
+@pytest.mark.anyio
+async def test_file_completed(repo: FileRepository):
     missing_id = uuid.uuid4()
-    repo.set_file_completed(missing_id)
+    await repo.set_file_completed(missing_id)
 
-    missing_file = repo.get_file_by_id(file_id=missing_id)
+    missing_file = await repo.get_file_by_id(file_id=missing_id)
     assert missing_file is None
 
 
-def test_save_chunk_and_get_chunks(repo: FileRepository):
-    file = create_file(repo)
+@pytest.mark.anyio
+async def test_save_chunk_and_get_chunks(repo: FileRepository):
+    file = await create_file(repo)
 
-    repo.save_chunk(file_id=file.id, chunk_hash="h3", index=3)
-    repo.save_chunk(file_id=file.id, chunk_hash="h2", index=2)
-    repo.save_chunk(file_id=file.id, chunk_hash="h1", index=1)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H3, index=3)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H2, index=2)
+    await repo.save_chunk(file_id=file.id, chunk_hash=H1, index=1)
 
-    chunks = repo.get_file_chunks(file_id=file.id)
+    chunks = await repo.get_file_chunks(file_id=file.id)
     assert [c.index for c in chunks] == [1, 2, 3]
-    assert [c.chunk_hash for c in chunks] == ["h1", "h2", "h3"]
+    assert [c.chunk_hash for c in chunks] == [H1, H2, H3]
     assert all(isinstance(c, ChunkPerFile) for c in chunks)
 
 
-def test_set_file_failed_and_completed_toggle(repo: FileRepository):
-    f = create_file(repo)
-    repo.set_file_completed(file_id=f.id)
-    fresh_file = repo.get_file_by_id(file_id=f.id)
+@pytest.mark.anyio
+async def test_set_file_failed_and_completed_toggle(repo: FileRepository):
+    f = await create_file(repo)
+    await repo.set_file_completed(file_id=f.id)
+    fresh_file = await repo.get_file_by_id(file_id=f.id)
 
     assert fresh_file is not None
     assert fresh_file.is_ready is True
 
-    repo.set_file_failed(file_id=f.id)
-    fresh_file_2 = repo.get_file_by_id(file_id=f.id)
+    await repo.set_file_failed(file_id=f.id)
+    fresh_file_2 = await repo.get_file_by_id(file_id=f.id)
 
     assert fresh_file_2 is not None
     assert fresh_file.is_ready is False
+
+
+@pytest.mark.anyio
+async def test_register_chunk_is_idempotent(repo: FileRepository):
+    assert await repo.chunk_exists(H1) is False
+
+    await repo.register_chunks([ChunkBase(hash=H1, size=10)])
+    await repo.register_chunks([ChunkBase(hash=H1, size=10), ChunkBase(hash=H2, size=20)])
+
+    assert await repo.chunk_exists(H1) is True
+    assert await repo.chunk_exists(H2) is True
+
+
+@pytest.mark.anyio
+async def test_save_chunks_commits_with_file_completion(repo: FileRepository):
+    file = await create_file(repo)
+
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0), (H2, 1)])
+    await repo.save_chunks(file_id=file.id, chunks=[(H3, 2)], commit=False)
+    await repo.set_file_completed(file_id=file.id, size=30)
+
+    chunks = await repo.get_file_chunks(file_id=file.id)
+    assert [(c.chunk_hash, c.index) for c in chunks] == [(H1, 0), (H2, 1), (H3, 2)]
+    assert (await repo.get_file_by_id(file_id=file.id)).size == 30
+
+
+@pytest.mark.anyio
+async def test_chunk_hashes_are_stored_as_binary(repo: FileRepository):
+    file = await create_file(repo)
+    await repo.register_chunks([ChunkBase(hash=H1, size=1)])
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0)])
+
+    row = (await repo.session.exec(text("SELECT chunk_hash FROM chunkperfile"))).one()
+    assert row.chunk_hash == bytes.fromhex(H1)
+    assert (await repo.get_file_chunks(file_id=file.id))[0].chunk_hash == H1
+
+
+@pytest.mark.anyio
+async def test_get_file_manifest_returns_sizes_in_order(repo: FileRepository):
+    file = await create_file(repo)
+    await repo.register_chunks(
+        [ChunkBase(hash=H1, size=10), ChunkBase(hash=H2, size=20, pack_key="p", pack_offset=5)]
+    )
+    await repo.save_chunks(file_id=file.id, chunks=[(H2, 1), (H1, 0), (H2, 2)])
+
+    manifest = await repo.get_file_manifest(file_id=file.id)
+    assert [(c.hash, c.size) for c in manifest] == [(H1, 10), (H2, 20), (H2, 20)]
+    assert (manifest[1].pack_key, manifest[1].pack_offset) == ("p", 5)
+
+
+@pytest.mark.anyio
+async def test_replace_chunk_keeps_one_row_per_index(repo: FileRepository):
+    file = await create_file(repo)
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0), (H2, 1)])
+
+    await repo.replace_chunks(file_id=file.id, chunks=[(H3, 1)])
+
+    chunks = await repo.get_file_chunks(file_id=file.id)
+    assert [(c.chunk_hash, c.index) for c in chunks] == [(H1, 0), (H3, 1)]
+    assert sorted(await repo.get_chunk_indices(file_id=file.id)) == [0, 1]
+
+
+@pytest.mark.anyio
+async def test_get_stored_hashes(repo: FileRepository):
+    await repo.register_chunks([ChunkBase(hash=H1, size=1), ChunkBase(hash=H2, size=1)])
+
+    assert await repo.get_stored_hashes([H0, H1, H2]) == {H1, H2}
+    assert await repo.get_stored_hashes([]) == set()
+
+
+@pytest.mark.anyio
+async def test_chunk_collected_after_lookup_is_not_stored(repo: FileRepository, monkeypatch):
+    await repo.register_chunks([ChunkBase(hash=H1, size=1), ChunkBase(hash=H2, size=1)])
+    exec_ = repo.session.exec
+
+    async def exec_then_collect(statement, *args, **kwargs):
+        result = await exec_(statement, *args, **kwargs)
+        if isinstance(statement, Select):
+            # The garbage collector deletes the chunks right after the lookup.
+            await exec_(delete(Chunk))
+        return result
+
+    monkeypatch.setattr(repo.session, "exec", exec_then_collect)
+
+    assert not await repo.chunk_exists(H1)
+    assert await repo.get_stored_hashes([H1, H2]) == set()
+
+
+async def refcounts(repo: FileRepository) -> dict[str, int]:
+    chunks = (await repo.session.exec(select(Chunk))).all()
+    return {c.hash: c.refcount for c in chunks}
+
+
+@pytest.mark.anyio
+async def test_refcounts_follow_chunk_rows(repo: FileRepository):
+    file = await create_file(repo)
+    await repo.register_chunks([ChunkBase(hash=h, size=1) for h in (H1, H2, H3)])
+
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0), (H2, 1), (H1, 2)])
+    assert await refcounts(repo) == {H1: 2, H2: 1, H3: 0}
+
+    await repo.replace_chunks(file_id=file.id, chunks=[(H3, 2)])
+    assert await refcounts(repo) == {H1: 1, H2: 1, H3: 1}
+
+    await repo.set_file_failed(file_id=file.id)
+    assert await refcounts(repo) == {H1: 0, H2: 0, H3: 0}
+    assert await repo.get_file_chunks(file_id=file.id) == []
+
+
+@pytest.mark.anyio
+async def test_chunk_rows_are_inserted_in_batches(repo: FileRepository, monkeypatch):
+    monkeypatch.setattr(db_module, "MAX_BATCH_ROWS", 2)
+    file = await create_file(repo)
+    await repo.register_chunks([ChunkBase(hash=h, size=1) for h in (H1, H2, H3)])
+
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0), (H2, 1), (H3, 2), (H1, 3), (H1, 4)])
+
+    chunks = await repo.get_file_chunks(file_id=file.id)
+    assert [c.chunk_hash for c in chunks] == [H1, H2, H3, H1, H1]
+    assert await refcounts(repo) == {H1: 3, H2: 1, H3: 1}
+
+
+@pytest.mark.anyio
+async def test_collect_unreferenced_chunks_respects_grace_period(repo: FileRepository):
+    file = await create_file(repo)
+    await repo.register_chunks([ChunkBase(hash=h, size=1) for h in (H1, H2, H3)])
+    await repo.save_chunks(file_id=file.id, chunks=[(H1, 0)])
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    await repo.session.exec(update(Chunk).where(Chunk.hash != H3).values(touched_at=past))
+
+    # h2 is about to be reused by an upload, which touches it.
+    assert await repo.chunk_exists(H2)
+
+    grace_cutoff = datetime.now(timezone.utc) - timedelta(minutes=30)
+    assert await repo.collect_unreferenced_chunks(grace_cutoff, 10) == []
+    later = datetime.now(timezone.utc) + timedelta(seconds=1)
+    collected = await repo.collect_unreferenced_chunks(later, 10)
+    assert sorted(c.hash for c in collected) == [H2, H3]
+    assert await repo.chunk_exists(H1)
+
+
+@pytest.mark.anyio
+async def test_taken_version_is_renumbered(repo: FileRepository):
+    origin_id = (await create_file(repo)).id
+    # Both uploads read the same latest version before inserting.
+    version = await repo.get_next_version(origin_id)
+    a = await repo.save_file(FileBase(name="f", origin_id=origin_id, version=version))
+    b = await repo.save_file(FileBase(name="f", origin_id=origin_id, version=version))
+
+    assert (a.version, b.version) == (2, 3)
+    assert [v.version for v in await repo.get_file_versions(origin_id)] == [1, 2, 3]
@@ -0,0 +1,25 @@
+from app.services.dedup import KnownChunks
+
+
+def test_known_chunks_evicts_least_recently_used():
+    known = KnownChunks(capacity=2)
+    known.add("a")
+    known.add("b")
+    assert "a" in known
+    known.add("c")
+
+    assert "b" not in known
+    assert "a" in known and "c" in known
+
+
+def test_known_chunks_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.services.dedup.time.monotonic", lambda: now[0])
+    known = KnownChunks(capacity=10, ttl=60)
+    known.add("a")
+
+    now[0] += 59
+    assert "a" in known
+    now[0] += 2
+    assert "a" not in known
+    assert len(known) == 0
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.schemas.models import ChunkBase, FileCreate, UploadSessionBase
+from app.schemas.orm import Chunk, UploadSession
+from app.services.db import FileRepository
+from app.services.gc import ChunkCollector
+from app.tests.conftest import FakeS3
+
+
+# Chunk hashes are stored as binary digests, so test hashes must be valid hex.
+H1, H2, H3, H4, H5, H6 = (f"{i:064x}" for i in range(1, 7))
+
+
+def make_collector(s3: FakeS3, batch_size: int = 10) -> ChunkCollector:
+    return ChunkCollector(
+        s3=s3,
+        grace_period_s=60,
+        batch_size=batch_size,
+        batch_pause_ms=0,
+        interval_s=60,
+        session_ttl_s=3600,
+    )
+
+
+async def age(repo: FileRepository, model, column, hours: int = 2) -> None:
+    past = datetime.now(timezone.utc) - timedelta(hours=hours)
+    await repo.session.exec(update(model).values({column: past}))
+    await repo.session.commit()
+
+
+@pytest.mark.anyio
+async def test_collect_deletes_unreferenced_chunks_and_dead_packs(repo: FileRepository):
+    s3 = FakeS3()
+    s3.objects = {H1: b"1", H2: b"2", "packs/a": b"34", "packs/b": b"56"}
+    file = await repo.save_file(FileCreate(name="f"))
+    await repo.register_chunks(
+        [
+            ChunkBase(hash=H1, size=1),
+            ChunkBase(hash=H2, size=1),
+            ChunkBase(hash=H3, size=1, pack_key="packs/a", pack_offset=0),
+            ChunkBase(hash=H4, size=1, pack_key="packs/a", pack_offset=1),
+            ChunkBase(hash=H5, size=1, pack_key="packs/b", pack_offset=0),
+            ChunkBase(hash=H6, size=1, pack_key="packs/b", pack_offset=1),
+        ]
+    )
+    await repo.save_chunks(file.id, [(H1, 0), (H5, 1)])
+    await age(repo, Chunk, "touched_at")
+
+    deleted = await make_collector(s3, batch_size=2).collect(repo)
+
+    assert deleted == 4
+    assert s3.objects == {H1: b"1", "packs/b": b"56"}
+    assert await repo.get_stored_hashes([H1, H2, H5, H6]) == {H1, H5}
+
+
+@pytest.mark.anyio
+async def test_collect_expires_stale_upload_sessions(repo: FileRepository):
+    s3 = FakeS3()
+    s3.objects = {H1: b"1"}
+    file = await repo.save_file(FileCreate(name="f"))
+    await repo.save_upload_session(UploadSessionBase(file_id=file.id, chunk_count=2))
+    await repo.register_chunks([ChunkBase(hash=H1, size=1)])
+    await repo.replace_chunks(file.id, [(H1, 0)])
+    await age(repo, UploadSession, "created_at", hours=24 * 30)
+    collector = make_collector(s3)
+
+    # The chunk was released just now and is still within the grace period.
+    assert await collector.collect(repo) == 0
+    assert await repo.get_upload_session(file.id) is None
+    assert await repo.get_file_chunks(file.id) == []
+
+    await age(repo, Chunk, "touched_at")
+    assert await collector.collect(repo) == 1
+    assert s3.objects == {}
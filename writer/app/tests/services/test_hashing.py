@@ -0,0 +1,17 @@
+import hashlib
+
+import pytest
+
+from app.services.hashing import ChunkHasher
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("size", [10, ChunkHasher.INLINE_MAX_BYTES + 1])
+async def test_hash_matches_sha256(size: int):
+    hasher = ChunkHasher(workers=2)
+    chunk = bytes(range(256)) * (size // 256 + 1)
+
+    try:
+        assert await hasher.hash(chunk) == hashlib.sha256(chunk).hexdigest()
+    finally:
+        hasher.close()
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.services.packing import PackWriter
+from app.tests.conftest import FakeS3
+
+
+@pytest.mark.anyio
+async def test_concurrent_chunks_share_pack():
+    s3 = FakeS3()
+    packer = PackWriter(s3=s3, target_size=1024, max_delay_ms=10)
+
+    first, second = await asyncio.gather(packer.add(b"aaaa"), packer.add(b"bb"))
+
+    assert first.key == second.key
+    assert (first.offset, second.offset) == (0, 4)
+    assert s3.objects == {first.key: b"aaaabb"}
+
+
+@pytest.mark.anyio
+async def test_full_pack_is_stored_without_delay():
+    s3 = FakeS3()
+    packer = PackWriter(s3=s3, target_size=4, max_delay_ms=60_000)
+
+    first = await asyncio.wait_for(packer.add(b"aaaa"), timeout=1)
+    second = asyncio.create_task(packer.add(b"b"))
+    await asyncio.sleep(0)
+    await packer.close()
+
+    assert (await second).key != first.key
+    assert len(s3.objects) == 2
+
+
+@pytest.mark.anyio
+async def test_failed_pack_fails_all_chunks():
+    s3 = FakeS3()
+
+    async def fail(chunk: bytes, key: str) -> None:
+        raise OSError("boom")
+
+    s3.upload_chunk = fail
+    packer = PackWriter(s3=s3, target_size=1024, max_delay_ms=1)
+
+    results = await asyncio.gather(
+        packer.add(b"a"), packer.add(b"b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, OSError) for r in results)
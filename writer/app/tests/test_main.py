@@ -1,7 +1,9 @@
+import pytest
 from fastapi.testclient import TestClient
 
 
-def test_healthy(client: TestClient):
+@pytest.mark.anyio
+async def test_healthy(client: TestClient):
     response = client.get("/health-check")
     assert response.status_code == 200
     assert response.content == b"true"